@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from data_loader import DataLoader
+from event_log import RegistroEventos
+from instrumentation import Instrumentacion
+from results_io import crear_registro, guardar_tabla, leer_tabla
+from simulation import (ARCHIVO_MULTAS, ARCHIVO_POT, ARCHIVO_RUTAS, cargar_servicio, cargar_servicios,
+                        construir_configuracion, construir_red, simular)
+
+# ----------------------------------------------------------
+# BENCHMARKS
+#
+# Mide los pasos principales a varios tamaños:
+# - carga_datos: DataLoader.load_all_data, sin caché y con la caché en disco;
+# - parseo_pot: sólo el parseo del POT (_parse_pot_data, con el Excel ya leído);
+# - simulacion: una corrida completa de Bus/Parada (1, 7 y 30 días; un
+#   servicio o la red completa; base o flota_aumentada);
+# - salida: simulación escribiendo los datos_* en CSV más los gráficos de main.py.
+#
+# Cada caso corre en un proceso nuevo (el pico de RSS es del caso y no de los
+# anteriores) y reporta tiempo de reloj (mínimo y mediana de las
+# repeticiones), eventos procesados, pico de RSS y, con --asignaciones, el
+# pico de memoria asignada por Python (tracemalloc, en una corrida aparte
+# porque encarece el tiempo).
+#
+# Uso:
+#   python benchmarks.py --salida bench_base.json
+#   python benchmarks.py --filtro simulacion --comparar bench_base.json
+# ----------------------------------------------------------
+
+DIAS = [1, 7, 30]
+ESCENARIOS_BENCH = ['base', 'flota_aumentada']
+VERSION_FORMATO = 1
+COLUMNAS_COMPARACION = ['caso', 'segundos_ref', 'segundos', 'razon', 'rss_razon', 'estado']
+
+
+def casos():
+    """Lista de casos: (nombre, tipo, parámetros)."""
+    lista = [
+        ('carga_datos/sin_cache', 'carga_datos', {'cache': False}),
+        ('carga_datos/con_cache', 'carga_datos', {'cache': True}),
+        ('parseo_pot', 'parseo_pot', {}),
+    ]
+    for red in (False, True):
+        for escenario in ESCENARIOS_BENCH:
+            for dias in DIAS:
+                alcance = 'red' if red else '80J'
+                lista.append((f'simulacion/{alcance}/{escenario}/{dias}d', 'simulacion',
+                              {'red': red, 'escenario': escenario, 'dias': dias}))
+    for dias in (1, 7):
+        lista.append((f'salida/80J/base/{dias}d', 'salida', {'dias': dias}))
+    return lista
+
+
+def _configuracion(red, escenario, dias, modo_detencion, modo_llegadas):
+    parametros = dict(tiempo_simulacion=dias * 24 * 3600, modo_detencion=modo_detencion,
+                      modo_llegadas=modo_llegadas)
+    if red:
+        return construir_red(cargar_servicios(), escenario, **parametros)
+    return construir_configuracion(cargar_servicio(), escenario, **parametros)
+
+
+def _preparar(tipo, parametros, opciones, temporal):
+    """
+    Hace lo que no se mide (lectura de datos, configuración, directorios) y
+    devuelve la función a medir, que retorna el número de eventos o None.
+    temporal: directorio para la caché y las salidas del caso.
+    """
+    if tipo == 'carga_datos':
+        cache_dir = os.path.join(temporal, 'cache') if parametros['cache'] else None
+        if cache_dir is not None:
+            calentar = DataLoader(ARCHIVO_MULTAS, ARCHIVO_POT, ARCHIVO_RUTAS, cache_dir=cache_dir)
+            calentar.set_print_options(print_data=False)
+            calentar.load_all_data()
+
+        def medir():
+            loader = DataLoader(ARCHIVO_MULTAS, ARCHIVO_POT, ARCHIVO_RUTAS, cache_dir=cache_dir)
+            loader.set_print_options(print_data=False)
+            loader.load_all_data()
+        return medir
+
+    if tipo == 'parseo_pot':
+        loader = DataLoader(file_pot=ARCHIVO_POT, cache_dir=None)
+        loader.set_print_options(print_data=False)
+        pot_data = loader._cargar_excel(ARCHIVO_POT)
+
+        def medir():
+            loader.pot_data = pot_data
+            loader.pot_parsed = {}
+            loader._parse_pot_data()
+        return medir
+
+    if tipo == 'simulacion':
+        config = _configuracion(parametros['red'], parametros['escenario'], parametros['dias'],
+                                opciones['modo_detencion'], opciones['modo_llegadas'])
+
+        def medir():
+            instrumentacion = Instrumentacion(intervalo_reporte=None, contar_eventos=False)
+            simular(config, 42, registro=RegistroEventos(), instrumentacion=instrumentacion)
+            return instrumentacion.eventos
+        return medir
+
+    if tipo == 'salida':
+        config = _configuracion(False, 'base', parametros['dias'],
+                                opciones['modo_detencion'], opciones['modo_llegadas'])
+        directorio = os.path.join(temporal, 'salida')
+
+        def medir():
+            instrumentacion = Instrumentacion(intervalo_reporte=None, contar_eventos=False)
+            resultado = simular(config, 42, registro=crear_registro('csv', directorio),
+                                instrumentacion=instrumentacion)
+            guardar_tabla(pd.DataFrame({'tiempo_espera_min': [t/60 for t in resultado['tiempos_espera']]}),
+                          directorio, 'tiempos_espera')
+            _graficos(directorio, resultado['tiempos_espera'])
+            return instrumentacion.eventos
+        return medir
+
+    raise ValueError(f"Tipo de caso desconocido: {tipo}")
+
+
+def _graficos(directorio, tiempos_espera):
+    """Los gráficos de main.py, leyendo los CSV recién escritos."""
+    df_ocupacion = leer_tabla(directorio, 'ocupacion', 'csv', ['parada', 'ocupacion'])
+    df_multas = leer_tabla(directorio, 'multas', 'csv', ['parada'])
+    graficos = [
+        ('ocupacion', lambda: df_ocupacion.groupby('parada', observed=True)['ocupacion'].mean().plot(kind='bar')),
+        ('espera', lambda: plt.hist([t/60 for t in tiempos_espera], bins=50, edgecolor='black')),
+        ('multas', lambda: df_multas['parada'].astype(str).value_counts().plot(kind='bar')),
+    ]
+    for nombre, graficar in graficos:
+        plt.figure()
+        graficar()
+        plt.tight_layout()
+        plt.savefig(os.path.join(directorio, f'{nombre}.png'), bbox_inches='tight')
+        plt.close()
+
+
+def _rss_maximo_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB; macOS, bytes
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+def ejecutar_caso(tipo, parametros, opciones):
+    """Corre un caso (en el proceso actual) y devuelve sus mediciones."""
+    with tempfile.TemporaryDirectory() as temporal:
+        return _medir_caso(_preparar(tipo, parametros, opciones, temporal), opciones)
+
+
+def _medir_caso(medir, opciones):
+    tiempos = []
+    eventos = None
+    for _ in range(opciones['repeticiones']):
+        inicio = time.perf_counter()
+        eventos = medir()
+        tiempos.append(time.perf_counter() - inicio)
+
+    resultado = {
+        'segundos_min': min(tiempos),
+        'segundos_mediana': statistics.median(tiempos),
+        'repeticiones': len(tiempos),
+        'eventos': eventos,
+        'eventos_por_segundo': eventos / min(tiempos) if eventos else None,
+        'rss_max_mb': _rss_maximo_mb(),
+    }
+    if opciones['asignaciones']:
+        tracemalloc.start()
+        medir()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultado['asignaciones_pico_mb'] = pico / 2**20
+    return resultado
+
+
+def _commit_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(filtro=None, repeticiones=3, asignaciones=False, modo_detencion='lote',
+                   modo_llegadas='vectorizado', salida=sys.stdout):
+    """
+    Corre los casos cuyo nombre contiene 'filtro', cada uno en un proceso
+    nuevo, y devuelve el diccionario que se guarda como JSON.
+    """
+    opciones = {'repeticiones': repeticiones, 'asignaciones': asignaciones,
+                'modo_detencion': modo_detencion, 'modo_llegadas': modo_llegadas}
+    resultados = {}
+    for nombre, tipo, parametros in casos():
+        if filtro and filtro not in nombre:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            resultados[nombre] = executor.submit(ejecutar_caso, tipo, parametros, opciones).result()
+        r = resultados[nombre]
+        print(f"{nombre:40s} {r['segundos_min']:8.3f} s"
+              + (f" {r['eventos']:>11,} eventos" if r['eventos'] else "")
+              + (f" {r['rss_max_mb']:8.1f} MB RSS" if r['rss_max_mb'] is not None else ""),
+              file=salida, flush=True)
+    return {
+        'version': VERSION_FORMATO,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_git(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'opciones': opciones,
+        'casos': resultados,
+    }
+
+
+def comparar(actual, referencia, umbral=0.10):
+    """
+    Tabla de tiempos y memoria de 'actual' frente a 'referencia' (dos
+    resultados de run_benchmarks) para los casos presentes en ambos (sin
+    filas si no comparten ninguno). Un caso es 'regresion' si su tiempo mínimo
+    crece más que umbral (fracción).
+    """
+    filas = []
+    for nombre, r in actual['casos'].items():
+        base = referencia['casos'].get(nombre)
+        if base is None:
+            continue
+        razon = r['segundos_min'] / base['segundos_min']
+        fila = {'caso': nombre, 'segundos_ref': base['segundos_min'], 'segundos': r['segundos_min'],
+                'razon': razon}
+        if r.get('rss_max_mb') is not None and base.get('rss_max_mb') is not None:
+            fila['rss_razon'] = r['rss_max_mb'] / base['rss_max_mb']
+        fila['estado'] = 'regresion' if razon > 1 + umbral else ('mejora' if razon < 1 - umbral else '')
+        filas.append(fila)
+    return pd.DataFrame(filas, columns=COLUMNAS_COMPARACION)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de carga de datos, simulación y salida.")
+    parser.add_argument('--filtro', default=None, help="sólo los casos cuyo nombre contiene este texto")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--asignaciones', action='store_true',
+                        help="medir además el pico de memoria asignada (tracemalloc)")
+    parser.add_argument('--modo-detencion', choices=['pasajero', 'lote'], default='lote')
+    parser.add_argument('--modo-llegadas', choices=['proceso', 'vectorizado'], default='vectorizado')
+    parser.add_argument('--salida', default=None, help="archivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, metavar='JSON', help="resultados de referencia")
+    parser.add_argument('--umbral', type=float, default=0.10)
+    parser.add_argument('--listar', action='store_true', help="sólo listar los casos")
+    args = parser.parse_args()
+
+    if args.listar:
+        for nombre, _, _ in casos():
+            print(nombre)
+        return
+
+    resultados = run_benchmarks(args.filtro, args.repeticiones, args.asignaciones,
+                                args.modo_detencion, args.modo_llegadas)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Resultados en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        df = comparar(resultados, referencia, args.umbral)
+        print(f"\nComparación con {args.comparar} (commit {referencia.get('commit')}):")
+        if df.empty:
+            print("sin casos comunes")
+            return
+        print(df.to_string(index=False))
+        if (df['estado'] == 'regresion').any():
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
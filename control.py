@@ -0,0 +1,128 @@
+import pandas as pd
+
+from metrics import Welford
+
+# ----------------------------------------------------------
+# CONTROL DE INTERVALOS ENTRE BUSES
+#
+# Sin control los buses avanzan a ciegas: en flota_aumentada salen 2-3 buses
+# en el mismo instante y el primero lleva a todos los pasajeros mientras los
+# que le siguen van vacíos. ControlIntervalos aplica reglas basadas en el
+# intervalo con el bus anterior de la misma línea, leído de RegistroPasos
+# (último paso por línea y parada, O(1) por consulta y por registro):
+# - retención: al terminar la detención, el bus espera hasta que el intervalo
+#   con el anterior llegue a alfa * H (en el origen, a H: despacho parejo de
+#   los buses que salen juntos), con un máximo de retencion_maxima * H;
+# - salto: un bus muy atrasado respecto del anterior (intervalo mayor que
+#   umbral_salto * H) no sube pasajeros en las paradas donde nadie baja, para
+#   recuperar el intervalo; esos pasajeros los lleva el bus siguiente.
+# H es el intervalo objetivo del bus: el intervalo programado de su línea
+# dividido por el número de buses que salen en esa salida.
+# 'ninguna' no interviene, sólo mide los intervalos (línea base).
+#
+# Uso:
+#   config = construir_configuracion(serv, 'flota_aumentada', control={'estrategia': 'retencion'})
+#   resultado = simular(config, 42); print(resultado['control'].resumen())
+# ----------------------------------------------------------
+
+ESTRATEGIAS = ['ninguna', 'retencion', 'salto', 'retencion_salto']
+
+
+class RegistroPasos:
+    """
+    Último instante de salida de cada línea en cada parada, y la distribución
+    (Welford) de los intervalos observados por línea. Todo en O(1).
+    """
+    def __init__(self):
+        self._ultimo = {}
+        self.intervalos = {}
+
+    def ultimo(self, linea, parada):
+        """Instante en que el último bus de 'linea' salió de 'parada' (None si ninguno)."""
+        return self._ultimo.get((linea, parada))
+
+    def registrar(self, linea, parada, tiempo):
+        clave = (linea, parada)
+        anterior = self._ultimo.get(clave)
+        self._ultimo[clave] = tiempo
+        if anterior is not None:
+            if linea not in self.intervalos:
+                self.intervalos[linea] = Welford()
+            self.intervalos[linea].agregar(tiempo - anterior)
+
+
+class ControlIntervalos:
+    """
+    Reglas de retención y salto de paradas para una corrida (ver el
+    encabezado). Se crea uno por corrida (simular lo arma desde
+    config['control']) y cada bus recibe su ControlBus con para_bus.
+    """
+    def __init__(self, estrategia='retencion', alfa=0.8, retencion_maxima=1.0, umbral_salto=1.5):
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia de control desconocida: {estrategia}. Opciones: {ESTRATEGIAS}")
+        self.estrategia = estrategia
+        self.retener = estrategia in ('retencion', 'retencion_salto')
+        self.saltar = estrategia in ('salto', 'retencion_salto')
+        self.alfa = alfa
+        self.retencion_maxima = retencion_maxima
+        self.umbral_salto = umbral_salto
+        self.pasos = RegistroPasos()
+        self.n_retenciones = 0
+        self.tiempo_retenido = 0.0
+        self.n_saltos = 0
+
+    def para_bus(self, linea, intervalo_objetivo):
+        return ControlBus(self, linea, intervalo_objetivo)
+
+    def resumen(self):
+        """Intervalo medio, desviación y coeficiente de variación por línea, y acciones de control."""
+        filas = []
+        for linea, w in self.pasos.intervalos.items():
+            filas.append({'linea': linea, 'intervalos': w.n, 'intervalo_medio_min': w.media / 60,
+                          'desv_intervalo_min': w.desv_estandar / 60,
+                          'cv_intervalo': w.desv_estandar / w.media if w.media > 0 else float('nan')})
+        df = pd.DataFrame(filas, columns=['linea', 'intervalos', 'intervalo_medio_min',
+                                          'desv_intervalo_min', 'cv_intervalo'])
+        df.attrs.update({'retenciones': self.n_retenciones, 'saltos': self.n_saltos,
+                         'tiempo_retenido_min': float(self.tiempo_retenido) / 60})
+        return df
+
+
+class ControlBus:
+    """Vista de ControlIntervalos para un bus: su línea y su intervalo objetivo H (s)."""
+    __slots__ = ('control', 'linea', 'intervalo')
+
+    def __init__(self, control, linea, intervalo):
+        self.control = control
+        self.linea = linea
+        self.intervalo = intervalo
+
+    def retencion(self, parada, es_origen, ahora):
+        """Segundos que el bus debe esperar en 'parada' antes de salir (0 si ninguno)."""
+        control = self.control
+        if not control.retener:
+            return 0.0
+        anterior = control.pasos.ultimo(self.linea, parada)
+        if anterior is None:
+            return 0.0
+        alfa = 1.0 if es_origen else control.alfa
+        espera = min(anterior + alfa * self.intervalo - ahora, control.retencion_maxima * self.intervalo)
+        if espera <= 0:
+            return 0.0
+        control.n_retenciones += 1
+        control.tiempo_retenido += espera
+        return espera
+
+    def saltar_parada(self, parada, ahora):
+        """True si el bus no debe subir pasajeros en 'parada' (va muy atrás del anterior)."""
+        control = self.control
+        if not control.saltar:
+            return False
+        anterior = control.pasos.ultimo(self.linea, parada)
+        if anterior is None or ahora - anterior <= control.umbral_salto * self.intervalo:
+            return False
+        control.n_saltos += 1
+        return True
+
+    def registrar_salida(self, parada, ahora):
+        self.control.pasos.registrar(self.linea, parada, ahora)
@@ -1,5 +1,63 @@
+import hashlib
+import os
+import pickle
+import re
+from collections.abc import Mapping
+
+import numpy as np
 import pandas as pd
 
+# Se incrementa cuando cambia el formato de lo que se guarda en caché
+# (p. ej. el resultado del parser del POT), para invalidar cachés antiguas.
+VERSION_CACHE = 2
+
+class LibroExcel(Mapping):
+    """
+    Hojas de un libro Excel que se leen recién al primer acceso (libro[hoja]).
+
+    Se mantiene un único pd.ExcelFile abierto para todas las hojas del libro, y
+    cada hoja leída pasa por la caché en disco del DataLoader, de modo que una
+    simulación que sólo usa una hoja no paga la lectura de las demás.
+    """
+    def __init__(self, loader, filename):
+        self._loader = loader
+        self.filename = filename
+        self._xls = None
+        self._nombres = None
+        self._hojas = {}
+
+    def _excel(self):
+        if self._xls is None:
+            self._xls = pd.ExcelFile(self.filename)
+        return self._xls
+
+    @property
+    def sheet_names(self):
+        if self._nombres is None:
+            self._nombres = self._loader._cargar_con_cache(
+                self.filename, lambda f: list(self._excel().sheet_names), parte='hojas')
+        return self._nombres
+
+    def __getitem__(self, hoja):
+        if hoja not in self._hojas:
+            if hoja not in self.sheet_names:
+                raise KeyError(hoja)
+            self._hojas[hoja] = self._loader._cargar_con_cache(
+                self.filename, lambda f: self._excel().parse(hoja), parte=f"hoja_{hoja}")
+        return self._hojas[hoja]
+
+    def __iter__(self):
+        return iter(self.sheet_names)
+
+    def __len__(self):
+        return len(self.sheet_names)
+
+    def cerrar(self):
+        if self._xls is not None:
+            self._xls.close()
+            self._xls = None
+
+
 class DataLoader:
     """
     DataLoader final, con configuración de impresión y corrección de warnings.
@@ -9,16 +67,34 @@ class DataLoader:
     - self.print_all (bool): si True, imprime todas las filas de las tablas.
     - self.print_limit (int): número de filas máximas a imprimir si print_all es False.
 
+    Caché en disco:
+    - Lo cargado y parseado de cada archivo (multas_data, pot_data + pot_parsed,
+      rutas_data) se guarda con pickle en self.cache_dir, con una clave formada
+      por la ruta, la fecha de modificación, el tamaño y el hash SHA-256 del
+      contenido del Excel.
+    - En la siguiente carga se reutiliza si la ruta, fecha y tamaño coinciden; si
+      sólo cambió la fecha (p. ej. archivo copiado), se compara el hash. Si el
+      contenido cambió, se vuelve a leer el Excel y se reemplaza la caché.
+    - cache_dir=None desactiva la caché.
+
+    Carga perezosa:
+    - Sin llamar a load_*, get_multas_data() y get_rutas_data() devuelven un
+      LibroExcel que lee cada hoja recién cuando se accede a ella
+      (p. ej. get_rutas_data()["Servicios"] no lee "Programa_Operacion").
+    - get_pot_data() / get_pot_parsed() cargan y parsean el POT al primer uso.
+
     Uso:
     data_loader = DataLoader(file_multas='...', file_pot='...', file_rutas='...')
     data_loader.set_print_options(print_data=True, print_all=False, print_limit=5)
     data_loader.load_all_data()
     """
 
-    def __init__(self, file_multas=None, file_pot=None, file_rutas=None):
+    def __init__(self, file_multas=None, file_pot=None, file_rutas=None, cache_dir='.cache_datos'):
         self.file_multas = file_multas
         self.file_pot = file_pot
         self.file_rutas = file_rutas
+        self.cache_dir = cache_dir
+        self._libros = {}
 
         self.multas_data = {}
         self.pot_data = {}
@@ -38,12 +114,79 @@ class DataLoader:
 
     def _cargar_excel(self, filename):
         data = {}
-        xls = pd.ExcelFile(filename)
-        for sheet in xls.sheet_names:
-            df = pd.read_excel(filename, sheet_name=sheet)
-            data[sheet] = df
+        # Un solo ExcelFile para todas las hojas (read_excel reabriría el libro cada vez)
+        with pd.ExcelFile(filename) as xls:
+            for sheet in xls.sheet_names:
+                data[sheet] = xls.parse(sheet)
         return data
 
+    def _hash_archivo(self, filename):
+        h = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+        return h.hexdigest()
+
+    def _ruta_cache(self, filename, parte=None):
+        nombre = hashlib.sha256(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+        if parte is not None:
+            nombre += "_" + hashlib.sha256(parte.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f"{nombre}.pkl")
+
+    def _cargar_con_cache(self, filename, cargar, parte=None):
+        """
+        Devuelve cargar(filename), reutilizando la caché en disco si el archivo
+        no cambió desde que se guardó. 'parte' distingue varias cachés de un
+        mismo archivo (p. ej. una por hoja).
+        """
+        if self.cache_dir is None:
+            return cargar(filename)
+
+        stat = os.stat(filename)
+        ruta_cache = self._ruta_cache(filename, parte)
+        clave = {
+            'version': VERSION_CACHE,
+            'ruta': os.path.abspath(filename),
+            'mtime': stat.st_mtime_ns,
+            'tamano': stat.st_size,
+        }
+
+        guardado = None
+        if os.path.exists(ruta_cache):
+            try:
+                with open(ruta_cache, 'rb') as f:
+                    guardado = pickle.load(f)
+            except Exception:
+                guardado = None  # caché corrupta o de otra versión de pandas: se regenera
+
+        contenido_hash = None
+        if guardado is not None:
+            clave_guardada = guardado['clave']
+            mismos_metadatos = all(clave_guardada.get(k) == v for k, v in clave.items())
+            if mismos_metadatos:
+                return guardado['datos']
+            if (clave_guardada.get('version') == VERSION_CACHE
+                    and clave_guardada.get('tamano') == clave['tamano']):
+                contenido_hash = self._hash_archivo(filename)
+                if clave_guardada.get('hash') == contenido_hash:
+                    # Mismo contenido con otra fecha: se actualiza la clave
+                    self._guardar_cache(ruta_cache, dict(clave, hash=contenido_hash), guardado['datos'])
+                    return guardado['datos']
+
+        datos = cargar(filename)
+        if contenido_hash is None:
+            contenido_hash = self._hash_archivo(filename)
+        self._guardar_cache(ruta_cache, dict(clave, hash=contenido_hash), datos)
+        return datos
+
+    def _guardar_cache(self, ruta_cache, clave, datos):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        with open(temporal, 'wb') as f:
+            pickle.dump({'clave': clave, 'datos': datos}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Reemplazo atómico: varias réplicas pueden arrancar a la vez
+        os.replace(temporal, ruta_cache)
+
     def _print_rows(self, df):
         """
         Imprime filas de df según la configuración:
@@ -62,19 +205,6 @@ class DataLoader:
             else:
                 print("No hay datos en esta hoja.")
 
-    def _print_list_of_dicts(self, data_list):
-        """
-        Imprime una lista de diccionarios según la configuración.
-        """
-        if not self.print_data:
-            return
-        if self.print_all:
-            for d in data_list:
-                print(d)
-        else:
-            for d in data_list[:self.print_limit]:
-                print(d)
-
     def _mostrar_informacion(self, data_dict, nombre_archivo):
         if not self.print_data:
             return
@@ -119,21 +249,20 @@ class DataLoader:
             print("No se extrajo tabla de servicios.")
 
         # Hojas 80X
-        otras_hojas = [h for h in self.pot_parsed.keys() if h not in ["TAPA","Servicios"]]
-        if otras_hojas:
+        programas = self.pot_parsed.get("Programas", {})
+        if programas:
             print("\n--- Hojas de Programas de Operación (80X) ---")
-            for hoja in otras_hojas:
+            for hoja, data_80x in programas.items():
                 print(f"\nHoja: {hoja}")
-                data_80x = self.pot_parsed[hoja]
                 info_servicio = data_80x.get("info_servicio", {})
-                frecuencias = data_80x.get("frecuencias", [])
+                frecuencias = data_80x.get("frecuencias", pd.DataFrame())
 
                 print("Info del Servicio:")
                 for k,v in info_servicio.items():
                     print(f"  {k}: {v}")
 
                 print("Frecuencias (muestra según configuración):")
-                self._print_list_of_dicts(frecuencias)
+                self._print_rows(frecuencias)
         else:
             print("\nNo se encontraron hojas tipo 80X.")
 
@@ -142,7 +271,7 @@ class DataLoader:
             if self.print_data:
                 print("No se especificó archivo de multas. Omitiendo carga.")
             return
-        self.multas_data = self._cargar_excel(self.file_multas)
+        self.multas_data = self._cargar_con_cache(self.file_multas, self._cargar_excel)
         self._mostrar_informacion(self.multas_data, self.file_multas)
 
     def load_pot_data(self):
@@ -150,8 +279,9 @@ class DataLoader:
             if self.print_data:
                 print("No se especificó archivo POT. Omitiendo carga.")
             return
-        self.pot_data = self._cargar_excel(self.file_pot)
-        self._parse_pot_data()
+        datos = self._cargar_con_cache(self.file_pot, self._cargar_y_parsear_pot)
+        self.pot_data = datos['pot_data']
+        self.pot_parsed = datos['pot_parsed']
         self._mostrar_informacion_pot_parsed()
 
     def load_rutas_data(self):
@@ -159,7 +289,7 @@ class DataLoader:
             if self.print_data:
                 print("No se especificó archivo de Rutas_Operacion. Omitiendo carga.")
             return
-        self.rutas_data = self._cargar_excel(self.file_rutas)
+        self.rutas_data = self._cargar_con_cache(self.file_rutas, self._cargar_excel)
         self._mostrar_informacion(self.rutas_data, self.file_rutas)
 
     def load_all_data(self):
@@ -167,18 +297,42 @@ class DataLoader:
         self.load_pot_data()
         self.load_rutas_data()
 
+    def _libro(self, filename):
+        if filename not in self._libros:
+            self._libros[filename] = LibroExcel(self, filename)
+        return self._libros[filename]
+
     def get_multas_data(self):
+        if not self.multas_data and self.file_multas is not None:
+            return self._libro(self.file_multas)
         return self.multas_data
 
     def get_pot_data(self):
+        if not self.pot_data and self.file_pot is not None:
+            self.load_pot_data()
         return self.pot_data
 
     def get_rutas_data(self):
+        if not self.rutas_data and self.file_rutas is not None:
+            return self._libro(self.file_rutas)
         return self.rutas_data
 
     def get_pot_parsed(self):
+        if not self.pot_parsed and self.file_pot is not None:
+            self.load_pot_data()
         return self.pot_parsed
 
+    def close(self):
+        """Cierra los libros Excel abiertos por la carga perezosa."""
+        for libro in self._libros.values():
+            libro.cerrar()
+
+    def _cargar_y_parsear_pot(self, filename):
+        self.pot_data = self._cargar_excel(filename)
+        self.pot_parsed = {}
+        self._parse_pot_data()
+        return {'pot_data': self.pot_data, 'pot_parsed': self.pot_parsed}
+
     def _parse_pot_data(self):
         self.pot_parsed["TAPA"] = self._parse_tapa(self.pot_data.get("TAPA", pd.DataFrame()))
         self.pot_parsed["Servicios"] = self._parse_servicios(self.pot_data.get("Servicios", pd.DataFrame()))
@@ -192,47 +346,92 @@ class DataLoader:
         # Guardar en pot_parsed["Programas"]
         self.pot_parsed["Programas"] = programas_dict
 
-    def _to_upper_df(self, df):
-        # Reemplazo de applymap por apply col-wise
-        for col in df.columns:
-            if df[col].dtype == object:
-                df[col] = df[col].astype(str).str.strip().str.upper()
-        return df
+    # ------------------------------------------------------
+    # PARSER DEL POT
+    #
+    # Cada hoja se pasa a texto una sola vez (_texto_hoja) y las etiquetas que
+    # sirven de ancla se ubican con una sola búsqueda vectorizada sobre las
+    # celdas apiladas (_ubicar_etiquetas), en vez de recorrer la hoja con
+    # iterrows por cada etiqueta.
+    # ------------------------------------------------------
+
+    def _texto_hoja(self, df):
+        """
+        Texto de cada celda de la hoja, sin espacios al borde ('' si la celda
+        está vacía), como arreglos 2D (filas x columnas): (texto, mayúsculas).
+        Las celdas se apilan en una sola Series para convertirlas de una vez.
+        """
+        valores = df.to_numpy(dtype=object).ravel()
+        celdas = pd.Series(valores).where(pd.notna(valores), "").astype(str).str.strip()
+        texto = celdas.to_numpy(dtype=object).reshape(df.shape)
+        return texto, celdas.str.upper().to_numpy(dtype=object).reshape(df.shape)
+
+    def _filas_que_contienen(self, texto, subcadena):
+        """Filas con alguna celda que contiene 'subcadena'."""
+        celdas = pd.Series(texto.ravel())
+        return np.unique(np.flatnonzero(celdas.str.contains(subcadena, regex=False).to_numpy())
+                         // texto.shape[1])
+
+    def _ubicar_etiquetas(self, mayus, etiquetas):
+        """
+        Filas (en orden) en que aparece cada etiqueta dentro de alguna celda de
+        la hoja en mayúsculas. Devuelve dict etiqueta -> array de filas.
+
+        Una sola búsqueda con todas las etiquetas recorre la hoja completa; cada
+        etiqueta se resuelve luego sólo sobre las pocas celdas que coincidieron.
+        """
+        celdas = pd.Series(mayus.ravel())
+        patron = "|".join(re.escape(e) for e in etiquetas)
+        candidatas = celdas[celdas.str.contains(patron, regex=True).to_numpy()]
+        filas = candidatas.index.to_numpy() // mayus.shape[1]
+        return {e: np.unique(filas[candidatas.str.contains(e, regex=False).to_numpy()])
+                for e in etiquetas}
+
+    def _filas_con_encabezados(self, texto, encabezados):
+        """Filas que contienen todas las celdas 'encabezados' (coincidencia exacta)."""
+        mascara = np.logical_and.reduce([(texto == h).any(axis=1) for h in encabezados])
+        return np.flatnonzero(mascara)
+
+    def _ultimo_valor(self, texto, fila):
+        """Último valor no vacío de la fila (el dato que acompaña a una etiqueta)."""
+        valores = texto[fila][texto[fila] != ""]
+        return valores[-1] if len(valores) else None
+
+    def _primera_desde(self, filas, desde, hasta=None):
+        """Primera fila de 'filas' en [desde, hasta), o None."""
+        filas = filas[filas >= desde]
+        if hasta is not None:
+            filas = filas[filas < hasta]
+        return int(filas[0]) if len(filas) else None
 
     def _parse_tapa(self, df):
         info = {}
         if df.empty:
             return info
 
-        buscar = {
-            "TIPO REGULACIÓN": "TIPO REGULACIÓN",
-            "TIPO ANEXO": "TIPO ANEXO",
-            "TIPO PROGRAMA": "TIPO PROGRAMA",
-            "REGIÓN": "REGIÓN",
-            "ZONA REGULADA": "ZONA REGULADA",
-            "UNIDAD DE NEGOCIO": "UNIDAD DE NEGOCIO",
-            "CON VERSIONES DE TRAZADO": "CON VERSIONES DE TRAZADO",
-            "FECHA INICIO": "FECHA INICIO",
-            "FECHA FIN": "FECHA FIN",
-            "RES N°": "RES N°",
-            "ESTACIONALIDAD": "ESTACIONALIDAD",
-            "CORRELATIVO A1": "CORRELATIVO A1"
-        }
-
-        df_str = df.copy()
-        df_str = self._to_upper_df(df_str)
-
-        for key, texto in buscar.items():
-            texto_up = texto.upper()
+        buscar = [
+            "TIPO REGULACIÓN",
+            "TIPO ANEXO",
+            "TIPO PROGRAMA",
+            "REGIÓN",
+            "ZONA REGULADA",
+            "UNIDAD DE NEGOCIO",
+            "CON VERSIONES DE TRAZADO",
+            "FECHA INICIO",
+            "FECHA FIN",
+            "RES N°",
+            "ESTACIONALIDAD",
+            "CORRELATIVO A1"
+        ]
+
+        texto, mayus = self._texto_hoja(df)
+        filas = self._ubicar_etiquetas(mayus, buscar)
+
+        for etiqueta in buscar:
             valor_encontrado = None
-            for i, row in df_str.iterrows():
-                if any((pd.notna(val) and texto_up in val) for val in row.values):
-                    fila_original = df.iloc[i]
-                    non_empty_vals = [x for x in fila_original.values if pd.notna(x) and str(x).strip() != ""]
-                    if non_empty_vals:
-                        valor_encontrado = str(non_empty_vals[-1]).strip()
-                    break
-            info[key] = valor_encontrado if valor_encontrado is not None else "No encontrado"
+            if len(filas[etiqueta]):
+                valor_encontrado = self._ultimo_valor(texto, filas[etiqueta][0])
+            info[etiqueta] = valor_encontrado if valor_encontrado is not None else "No encontrado"
         return info
 
     def _parse_servicios(self, df):
@@ -245,154 +444,104 @@ class DataLoader:
         if df.empty:
             return info
 
-        df_str = df.copy()
-        df_str = self._to_upper_df(df_str)
-
-        # Buscar 1. Descripción del Operador
-        fila_desc_op = None
-        for i, row in df_str.iterrows():
-            if any(pd.notna(val) and "1. DESCRIPCIÓN DEL OPERADOR" in val for val in row.values):
-                fila_desc_op = i
-                break
+        texto, mayus = self._texto_hoja(df)
+        filas = self._ubicar_etiquetas(mayus, ["1. DESCRIPCIÓN DEL OPERADOR", "OPERADOR DE TRANSPORTE",
+                                               "RUT", "2. RESUMEN DE SERVICIOS"])
 
+        # 1. Descripción del Operador: el operador va en la misma fila y el RUT
+        # en alguna de las 10 filas siguientes
+        fila_desc_op = self._primera_desde(filas["1. DESCRIPCIÓN DEL OPERADOR"], 0)
         if fila_desc_op is not None:
-            info["operador"] = self._buscar_valor_en_fila(df, fila_desc_op, "OPERADOR DE TRANSPORTE")
-            info["rut"] = self._buscar_valor_cercano(df, fila_desc_op, "RUT")
-
-        # Buscar 2. Resumen de servicios (tabla)
-        fila_resumen = None
-        for i, row in df.iterrows():
-            for val in row.values:
-                if pd.notna(val) and isinstance(val, str) and "2. RESUMEN DE SERVICIOS" in val.upper():
-                    fila_resumen = i
-                    break
-            if fila_resumen is not None:
-                break
-
+            if fila_desc_op in filas["OPERADOR DE TRANSPORTE"]:
+                info["operador"] = self._ultimo_valor(texto, fila_desc_op)
+            fila_rut = self._primera_desde(filas["RUT"], fila_desc_op, fila_desc_op + 10)
+            if fila_rut is not None:
+                info["rut"] = self._ultimo_valor(texto, fila_rut)
+
+        # 2. Resumen de servicios (tabla)
+        fila_resumen = self._primera_desde(filas["2. RESUMEN DE SERVICIOS"], 0)
         if fila_resumen is not None:
-            fila_encabezados = None
-            for start_row in range(fila_resumen, len(df)):
-                fila = df.iloc[start_row].dropna().astype(str).str.strip().values
-                if all(k in fila for k in ["Servicio","Sentido","Origen","Destino"]):
-                    fila_encabezados = start_row
-                    break
+            fila_encabezados = self._primera_desde(
+                self._filas_con_encabezados(texto, ["Servicio", "Sentido", "Origen", "Destino"]),
+                fila_resumen)
 
             if fila_encabezados is not None:
-                headers = df.iloc[fila_encabezados].values
-                headers = [str(x).strip() if pd.notna(x) else "" for x in headers]
-                rows = []
-                for j in range(fila_encabezados+1, len(df)):
-                    row_vals = df.iloc[j].values
-                    if all(pd.isna(x) for x in row_vals):
-                        break
-                    rows.append(row_vals)
-
-                servicios_df = pd.DataFrame(rows, columns=headers)
-                servicios_df = servicios_df.loc[:, servicios_df.columns != ""]
+                headers = texto[fila_encabezados].tolist()
+                # La tabla termina en la primera fila completamente vacía
+                fin = self._primera_desde(np.flatnonzero(df.isna().all(axis=1).to_numpy()),
+                                          fila_encabezados + 1)
+                servicios_df = df.iloc[fila_encabezados+1:fin].set_axis(headers, axis=1)
+                servicios_df = servicios_df.loc[:, servicios_df.columns != ""].reset_index(drop=True)
                 info["tabla_servicios"] = servicios_df
 
         return info
 
-    def _buscar_valor_en_fila(self, df, start_row, keyword):
-        df_str = df.copy()
-        df_str = self._to_upper_df(df_str)
-        if start_row < len(df_str):
-            row = df_str.iloc[start_row]
-            if any(pd.notna(x) and keyword in x for x in row.values):
-                fila_original = df.iloc[start_row]
-                non_empty_vals = [x for x in fila_original.values if pd.notna(x) and str(x).strip() != ""]
-                if non_empty_vals:
-                    return str(non_empty_vals[-1]).strip()
-        return "No encontrado"
-
-    def _buscar_valor_cercano(self, df, start_row, keyword):
-        df_str = df.copy()
-        df_str = self._to_upper_df(df_str)
-        max_rows = min(start_row+10, len(df_str))
-        for i in range(start_row, max_rows):
-            row = df_str.iloc[i]
-            if any(pd.notna(x) and keyword in x for x in row.values):
-                fila_original = df.iloc[i]
-                non_empty_vals = [x for x in fila_original.values if pd.notna(x) and str(x).strip() != ""]
-                if non_empty_vals:
-                    return str(non_empty_vals[-1]).strip()
-        return "No encontrado"
-
     def _parse_80X_sheet(self, df):
         info_servicio = {}
-        frecuencias_list = []
+        frecuencias = pd.DataFrame()
 
-        # Buscar info del servicio
-        fila_enc_info = None
-        for i, row in df.iterrows():
-            vals = [str(x).strip() for x in row.dropna().values if pd.notna(x)]
-            if all(k in vals for k in ["Servicio","Sentido","Origen","Destino","Estacionalidad"]):
-                fila_enc_info = i
-                break
+        texto, mayus = self._texto_hoja(df)
+        campos_info = ["Servicio", "Sentido", "Origen", "Destino", "Estacionalidad"]
 
+        # Info del servicio: fila de encabezados y, bajo ella, los valores
+        fila_enc_info = self._primera_desde(self._filas_con_encabezados(texto, campos_info), 0)
         if fila_enc_info is not None and fila_enc_info+1 < len(df):
-            fila_valores = df.iloc[fila_enc_info+1]
-            headers = df.iloc[fila_enc_info].values
-            headers = [str(h).strip() if pd.notna(h) else "" for h in headers]
-            for h,v in zip(headers, fila_valores.values):
-                if h in ["Servicio","Sentido","Origen","Destino","Estacionalidad"]:
-                    if pd.notna(v):
-                        info_servicio[h] = str(v).strip()
-
-        # Buscar la sección "2. Frecuencias"
-        fila_frec = None
-        for i, row in df.iterrows():
-            for val in row.values:
-                if pd.notna(val) and isinstance(val, str) and "2. FRECUENCIAS" in val.upper():
-                    fila_frec = i
-                    break
-            if fila_frec is not None:
-                break
+            for h, v in zip(texto[fila_enc_info], texto[fila_enc_info+1]):
+                if h in campos_info and v != "":
+                    info_servicio[h] = v
 
+        # Sección "2. Frecuencias"
+        fila_frec = self._primera_desde(self._filas_que_contienen(mayus, "2. FRECUENCIAS"), 0)
         if fila_frec is not None:
-            fila_enc_frec = None
+            fila_enc_frec = self._primera_desde(self._filas_con_encabezados(mayus, ["PERIODO", "HORARIO"]),
+                                                fila_frec)
+            # La fila siguiente trae los sub-encabezados
             fila_enc_frec2 = None
-            for start_row in range(fila_frec, len(df)):
-                vals = [str(x).strip().upper() for x in df.iloc[start_row].dropna().values if pd.notna(x)]
-                if "PERIODO" in vals and "HORARIO" in vals:
-                    fila_enc_frec = start_row
-                    # La siguiente fila para sub-encabezados
-                    if start_row+1 < len(df):
-                        vals2 = [x for x in df.iloc[start_row+1].values if pd.notna(x)]
-                        if len(vals2) > 0:
-                            fila_enc_frec2 = start_row+1
-                    break
-
-            if fila_enc_frec is not None and fila_enc_frec2 is not None:
-                row1 = df.iloc[fila_enc_frec].values
-                row2 = df.iloc[fila_enc_frec2].values
-
-                combined_headers = []
-                for c1, c2 in zip(row1, row2):
-                    h1 = str(c1).strip() if pd.notna(c1) else ""
-                    h2 = str(c2).strip() if pd.notna(c2) else ""
-                    if h1 and h2:
-                        combined_headers.append(f"{h1}_{h2}")
-                    else:
-                        combined_headers.append(h1 if h1 else h2)
-
-                for j in range(fila_enc_frec2+1, len(df)):
-                    row_vals = df.iloc[j].values
-                    if any(isinstance(x, str) and "Total" in x for x in row_vals if pd.notna(x)):
-                        break
-                    if all(pd.isna(x) for x in row_vals):
-                        break
-                    fila_dict = {}
-                    for col_name, val in zip(combined_headers, row_vals):
-                        if col_name:
-                            # Si Periodo es número, convirtamos a int
-                            if col_name == "Periodo" and pd.notna(val):
-                                fila_dict[col_name] = int(val)
-                            else:
-                                fila_dict[col_name] = val if pd.notna(val) else None
-                    frecuencias_list.append(fila_dict)
+            if fila_enc_frec is not None and fila_enc_frec+1 < len(df):
+                if df.iloc[fila_enc_frec+1].notna().any():
+                    fila_enc_frec2 = fila_enc_frec + 1
+
+            if fila_enc_frec2 is not None:
+                frecuencias = self._tabla_frecuencias(df, texto, fila_enc_frec, fila_enc_frec2)
 
         return {
             "info_servicio": info_servicio,
-            "frecuencias": frecuencias_list
+            "frecuencias": frecuencias
         }
+
+    def _tabla_frecuencias(self, df, texto, fila_enc, fila_enc2):
+        """
+        Tabla de frecuencias bajo los dos niveles de encabezado (p. ej. 'Laboral'
+        sobre 'Tipo Demanda' y 'Frecuencia (buses/hr)'), como DataFrame tipado:
+        Periodo entero, Tipo Demanda categórica y frecuencias numéricas.
+        """
+        headers = []
+        grupo = ""
+        # El grupo ('Laboral', 'Sábado', ...) es una celda combinada: sólo viene
+        # en la primera de sus columnas
+        for h1, h2 in zip(texto[fila_enc], texto[fila_enc2]):
+            grupo = h1 or grupo
+            if h2:
+                headers.append(f"{grupo}_{h2}" if grupo else h2)
+            else:
+                headers.append(h1)
+
+        # La tabla termina en la fila de totales o en la primera fila vacía
+        fin_tabla = np.union1d(self._filas_que_contienen(texto, "Total"),
+                               np.flatnonzero(df.isna().all(axis=1).to_numpy()))
+        fin = self._primera_desde(fin_tabla, fila_enc2 + 1)
+
+        bloque = df.to_numpy(dtype=object)[fila_enc2+1:fin]
+        columnas = {}
+        for col, valores in zip(headers, bloque.T):
+            if not col:
+                continue
+            if col.endswith("Tipo Demanda"):
+                columnas[col] = pd.Categorical(valores)
+                continue
+            numeros = pd.to_numeric(valores, errors="coerce")
+            if np.count_nonzero(pd.isna(numeros)) == np.count_nonzero(pd.isna(valores)):
+                columnas[col] = numeros
+            else:
+                columnas[col] = valores
+        return pd.DataFrame(columnas)
@@ -1,49 +1,575 @@
 import simpy
 import random
+from array import array
+from collections import deque
+from heapq import heappop, heappush
+from math import isnan
+
+import numpy as np
+
+from event_log import RegistroBus
+from utils import monto_multa
+
+NAN = float('nan')
+
+
+class TablaPasajeros:
+    """
+    Tabla columnar de pasajeros compartida por todas las paradas y buses.
+
+    Cada pasajero es un entero (su fila en la tabla). Las columnas son arreglos
+    compactos (array.array): origen y destino como índice de parada, correlativo
+    del pasajero en su parada de origen, instante de llegada y de abordaje (NaN
+    mientras no sube) y buses_perdidos (buses llenos que lo dejaron en la
+    parada; ver ColaParada). Ocupa ~32 bytes por pasajero, frente a un objeto
+    Python con su diccionario y un id de texto.
+    """
+    def __init__(self):
+        self.nombres_paradas = []
+        self._indice_parada = {}
+        self._generados_por_parada = []
+        self.origen = array('i')
+        self.destino = array('i')
+        self.correlativo = array('i')
+        self.llegada = array('d')
+        self.abordaje = array('d')
+        self.buses_perdidos = array('i')
+
+    def __len__(self):
+        return len(self.llegada)
+
+    def indice_parada(self, nombre):
+        """Índice entero de la parada (se asigna la primera vez que se consulta)."""
+        indice = self._indice_parada.get(nombre)
+        if indice is None:
+            indice = len(self.nombres_paradas)
+            self._indice_parada[nombre] = indice
+            self.nombres_paradas.append(nombre)
+            self._generados_por_parada.append(0)
+        return indice
+
+    def agregar(self, origen, destino, llegada):
+        """Agrega un pasajero y devuelve su id."""
+        id_pasajero = len(self.llegada)
+        self.origen.append(origen)
+        self.destino.append(destino)
+        self.correlativo.append(self._generados_por_parada[origen])
+        self._generados_por_parada[origen] += 1
+        self.llegada.append(llegada)
+        self.abordaje.append(NAN)
+        self.buses_perdidos.append(0)
+        return id_pasajero
+
+    def agregar_bloque(self, origen, destinos, llegadas):
+        """
+        Agrega un bloque de pasajeros con el mismo origen a partir de arreglos
+        NumPy de destinos y llegadas. Devuelve el range de ids asignados.
+        """
+        inicio = len(self.llegada)
+        n = len(llegadas)
+        self.origen.extend([origen] * n)
+        self.destino.frombytes(np.asarray(destinos, dtype=np.intc).tobytes())
+        primero = self._generados_por_parada[origen]
+        self.correlativo.extend(range(primero, primero + n))
+        self._generados_por_parada[origen] += n
+        self.llegada.frombytes(np.asarray(llegadas, dtype=np.float64).tobytes())
+        self.abordaje.extend([NAN] * n)
+        self.buses_perdidos.frombytes(bytes(self.buses_perdidos.itemsize * n))
+        return range(inicio, inicio + n)
+
+    def etiquetas(self, ids):
+        """
+        Identificadores de texto '<parada de origen>_<n>' (n: correlativo del
+        pasajero en su parada de origen), el formato de los registros originales.
+        """
+        return [f"{self.nombres_paradas[self.origen[i]]}_{self.correlativo[i]}" for i in ids]
+
+
+class ColaParada:
+    """
+    Cola FIFO de ids de pasajeros en espera respaldada por un deque: agregar y
+    tomar cuestan O(1) por pasajero, y tomar(k) extrae hasta k de una vez.
+
+    Pasajeros dejados por buses llenos, sin recorrer la cola: 'llenos' cuenta
+    los buses llenos que dejaron gente en la cola. Con perdidos (la columna
+    buses_perdidos de la TablaPasajeros), cada pasajero guarda -llenos al entrar
+    y suma llenos al salir, con lo que queda con los buses que lo dejaron.
+
+    Abandonos: abandonar(id) saca a un pasajero de cualquier posición en O(1)
+    marcándolo; los marcados se descartan al llegar al frente, y la cola se
+    compacta de una vez si llegan a ser la mitad. Los ids de una cola crecen
+    con la llegada (son de una sola parada).
+    """
+    def __init__(self, perdidos=None):
+        self._cola = deque()
+        self._perdidos = perdidos
+        self._fuera = set()
+        self.llenos = 0
+        # En espera que ningún bus lleno ha dejado, e id del último que quedaba
+        # en la cola cuando pasó el último bus lleno (los nuevos tienen id mayor)
+        self._nuevos = 0
+        self._ultimo_dejado = -1
+
+    def __len__(self):
+        return len(self._cola) - len(self._fuera)
+
+    def __bool__(self):
+        return len(self._cola) > len(self._fuera)
+
+    def __iter__(self):
+        if not self._fuera:
+            return iter(self._cola)
+        return (p for p in self._cola if p not in self._fuera)
+
+    def agregar(self, pasajero):
+        self._cola.append(pasajero)
+        self._nuevos += 1
+        if self.llenos and self._perdidos is not None:
+            self._perdidos[pasajero] = -self.llenos
+
+    def extender(self, pasajeros):
+        n = len(self._cola)
+        self._cola.extend(pasajeros)
+        self._nuevos += len(self._cola) - n
+        if self.llenos and self._perdidos is not None:
+            for pasajero in pasajeros:
+                self._perdidos[pasajero] = -self.llenos
+
+    def _descartar_frente(self):
+        cola, fuera = self._cola, self._fuera
+        while cola[0] in fuera:
+            fuera.remove(cola.popleft())
+
+    def primero(self):
+        if self._fuera:
+            self._descartar_frente()
+        return self._cola[0]
+
+    def tomar_uno(self):
+        if self._fuera:
+            self._descartar_frente()
+        pasajero = self._cola.popleft()
+        if self.llenos and self._perdidos is not None:
+            self._perdidos[pasajero] += self.llenos
+        # Se sale por el frente: los dejados antes que los nuevos
+        self._nuevos = min(self._nuevos, len(self))
+        return pasajero
+
+    def tomar(self, k):
+        """Extrae hasta k pasajeros en orden de llegada."""
+        if self._fuera:
+            return [self.tomar_uno() for _ in range(min(k, len(self)))]
+        k = min(k, len(self._cola))
+        popleft = self._cola.popleft
+        pasajeros = [popleft() for _ in range(k)]
+        if self.llenos and self._perdidos is not None:
+            for pasajero in pasajeros:
+                self._perdidos[pasajero] += self.llenos
+        self._nuevos = min(self._nuevos, len(self))
+        return pasajeros
+
+    def devolver(self, pasajeros):
+        """Vuelve a poner al frente, en su orden, pasajeros recién extraídos con tomar."""
+        for pasajero in reversed(pasajeros):
+            self._cola.appendleft(pasajero)
+            if self.llenos and self._perdidos is not None:
+                self._perdidos[pasajero] -= self.llenos
+            if pasajero > self._ultimo_dejado:
+                self._nuevos += 1
+
+    def abandonar(self, pasajero):
+        """Saca de la espera a 'pasajero' (que debe seguir en la cola)."""
+        self._fuera.add(pasajero)
+        if pasajero > self._ultimo_dejado:
+            self._nuevos -= 1
+        if self.llenos and self._perdidos is not None:
+            self._perdidos[pasajero] += self.llenos
+        if 2 * len(self._fuera) >= len(self._cola):
+            fuera = self._fuera
+            self._cola = deque(p for p in self._cola if p not in fuera)
+            fuera.clear()
+
+    def dejar(self):
+        """
+        Un bus lleno deja a toda la cola. Devuelve (pasajeros dejados, de ellos
+        los dejados por primera vez) en O(1): como la cola es FIFO, los que ya
+        habían sido dejados están al frente y los nuevos son los que entraron
+        después del último bus lleno.
+        """
+        n = len(self)
+        if n == 0:
+            return 0, 0
+        nuevos = self._nuevos
+        self.llenos += 1
+        self._nuevos = 0
+        self._ultimo_dejado = self._cola[-1]
+        return n, nuevos
+
+    def cerrar(self):
+        """Pasajeros que siguen esperando al final (cierra su cuenta de buses perdidos)."""
+        pasajeros = list(self)
+        if self.llenos and self._perdidos is not None:
+            for pasajero in pasajeros:
+                self._perdidos[pasajero] += self.llenos
+        return pasajeros
+
+
+class ColasCombinadas:
+    """
+    Vista FIFO sobre varias ColaParada (p. ej. las de varios destinos de una
+    parada compartida): entrega primero al pasajero que llegó antes, que es el
+    de id menor porque los ids de una parada se asignan en orden de llegada.
+    """
+    def __init__(self, colas):
+        self.colas = colas
+
+    def __len__(self):
+        return sum(len(c) for c in self.colas)
+
+    def __bool__(self):
+        return any(self.colas)
+
+    def tomar_uno(self):
+        return min((c for c in self.colas if c), key=ColaParada.primero).tomar_uno()
+
+    def tomar(self, k):
+        """Extrae hasta k pasajeros en orden de llegada."""
+        return [self.tomar_uno() for _ in range(min(k, len(self)))]
+
+    def dejar(self):
+        dejados = [c.dejar() for c in self.colas]
+        return sum(d[0] for d in dejados), sum(d[1] for d in dejados)
+
+
+class IntensidadHoraria:
+    """
+    Tasa de llegada constante por tramos de una hora que se repite cada
+    len(perfil) horas: tasa * perfil[h] pasajeros/s en la hora h.
+
+    Las llegadas de un proceso de Poisson no homogéneo se obtienen invirtiendo
+    la intensidad acumulada Λ(t): si s_1 < s_2 < ... son las llegadas de un
+    proceso de tasa 1, t_k = Λ⁻¹(s_k). No hay candidatos rechazados (como en
+    el thinning) y las horas con tasa cero se saltan sin generar nada.
+    """
+    def __init__(self, tasa, perfil):
+        self.tasas = tasa * np.asarray(perfil, dtype=float)
+        self.acumulada = np.concatenate([[0.0], np.cumsum(self.tasas * 3600)])
+        self.total = self.acumulada[-1]  # Λ de un periodo completo
+        self.periodo = len(self.tasas) * 3600
+        # Última hora con tasa positiva (ver invertir)
+        self._ultima_hora = int(np.flatnonzero(self.tasas)[-1]) if self.total > 0 else 0
+
+    def invertir(self, s):
+        """Instantes t (s) tales que Λ(t) = s, para s escalar o arreglo."""
+        periodos, resto = np.divmod(s, self.total)
+        # Última hora cuya acumulada no supera 'resto': salta las horas con tasa cero
+        hora = np.searchsorted(self.acumulada, resto, side='right') - 1
+        # Por redondeo divmod puede dejar resto == total: ese instante es el
+        # fin de la última hora con tasa positiva
+        hora = np.minimum(hora, self._ultima_hora)
+        return (periodos * self.periodo + hora * 3600
+                + (resto - self.acumulada[hora]) / self.tasas[hora])
+
+
+class Paciencia:
+    """
+    Tolerancia (s) de un pasajero en la parada antes de abandonar la espera:
+    exponencial de media 'media' o lognormal de media 'media' y coeficiente
+    de variación 'cv'.
+    """
+    DISTRIBUCIONES = ('exponencial', 'lognormal')
+
+    def __init__(self, media=15 * 60, distribucion='exponencial', cv=0.5):
+        if distribucion not in self.DISTRIBUCIONES:
+            raise ValueError(f"Distribución de paciencia desconocida: {distribucion}. "
+                             f"Opciones: {list(self.DISTRIBUCIONES)}")
+        self.media = media
+        self.distribucion = distribucion
+        self._sigma = np.sqrt(np.log1p(cv ** 2))
+        self._mu = np.log(media) - self._sigma ** 2 / 2
+
+    def muestrear(self, rng, n=None):
+        """Una tolerancia (n=None) o un arreglo de n, sorteadas con rng."""
+        if self.distribucion == 'exponencial':
+            return rng.exponential(self.media, n)
+        return rng.lognormal(self._mu, self._sigma, n)
 
-class Pasajero:
-    def __init__(self, env, id_pasajero, origen, destino, tiempo_llegada):
-        self.env = env
-        self.id_pasajero = id_pasajero
-        self.origen = origen
-        self.destino = destino
-        self.tiempo_llegada = tiempo_llegada
-        self.tiempo_abordaje = None  # Se asigna cuando sube al bus
 
 class Parada:
-    def __init__(self, env, nombre, demanda_paradas):
+    """
+    Parada con una cola de pasajeros por destino (ids de la TablaPasajeros
+    compartida). Un bus sólo sube a los pasajeros que van a alguna de las
+    paradas que le quedan (cola_para), lo que permite compartir la parada entre
+    varias líneas. El destino de cada pasajero se sortea entre los 'destinos' de
+    la demanda, uniforme o según 'pesos' si la demanda los trae.
+
+    modo_llegadas:
+    - 'proceso': un proceso SimPy genera cada llegada con random.expovariate
+      (modelo original).
+    - 'vectorizado': los instantes de llegada y destinos se pregeneran con NumPy
+      en bloques de tamano_bloque, y los pasajeros se materializan en la cola sólo
+      cuando un bus consulta la parada (actualizar). No agenda eventos SimPy.
+    Una parada sin demanda o sin destinos no genera nada. Si la demanda trae
+    'perfil' (multiplicadores horarios, ver simulation.perfil_semanal), las
+    llegadas son un proceso de Poisson no homogéneo (ver IntensidadHoraria).
+
+    rng: numpy Generator propio de la parada (ver random_streams). Sin él, el
+    modo 'proceso' usa el módulo random global y el 'vectorizado' np.random.
+    metricas: MetricasEnLinea (ver metrics.py) a la que se informan las llegadas.
+
+    paciencia: Paciencia de los pasajeros (None: nadie abandona), sorteada con
+    rng_paciencia (por defecto np.random). Cada llegada deja su vencimiento
+    (llegada + tolerancia) en un heap de la parada; los vencidos se retiran de
+    su cola en actualizar, es decir cuando un bus consulta la parada, sin
+    procesos ni eventos SimPy por pasajero. Los vencimientos de quienes ya
+    subieron se descartan al salir del heap.
+    """
+    def __init__(self, env, nombre, demanda_paradas, modo_llegadas='proceso', rng=None,
+                 tamano_bloque=4096, tabla=None, metricas=None, paciencia=None, rng_paciencia=None):
         self.env = env
         self.nombre = nombre
-        self.cola = []
+        self.tabla = tabla if tabla is not None else TablaPasajeros()
+        self.indice = self.tabla.indice_parada(nombre)
+        self.destinos_idx = [self.tabla.indice_parada(d) for d in demanda_paradas[nombre]['destinos']]
+        self.pesos = demanda_paradas[nombre].get('pesos')
+        self.colas = {destino: ColaParada(self.tabla.buses_perdidos) for destino in self.destinos_idx}
         self.total_pasajeros = 0
+        # Pasajeros distintos que algún bus lleno dejó, y total de veces que
+        # un bus lleno dejó a un pasajero (uno dejado por 3 buses cuenta 3)
         self.pasajeros_no_atendidos = 0
+        self.rechazos = 0
+        # Abandonos: total y por hora del día en que vence la tolerancia
+        self.paciencia = paciencia
+        self._rng_paciencia = rng_paciencia if rng_paciencia is not None else np.random
+        self._vencimientos = []  # heap de (instante, pasajero, destino)
+        self._limites = {}  # pasajero -> instante en que abandona, mientras no sale del heap
+        self.abandonos = 0
+        self.abandonos_hora = [0] * 24
+        # Buses subiendo o bajando pasajeros en este momento (modo 'lote', ver
+        # Bus._subir_en_lote), y tandas en que llegó otro bus a la parada
+        self.subiendo = set()
+        self.bajando = set()
+        self.tandas_compartidas = 0
         self.demanda_paradas = demanda_paradas
-        self.env.process(self.generar_pasajeros())
+        if modo_llegadas not in ('proceso', 'vectorizado'):
+            raise ValueError(f"modo_llegadas desconocido: {modo_llegadas}")
+        self.modo_llegadas = modo_llegadas
+        self.rng = rng
+        self.metricas = metricas
+        llegada = demanda_paradas[nombre]['llegada']
+        perfil = demanda_paradas[nombre].get('perfil')
+        self.intensidad = IntensidadHoraria(llegada, perfil) if perfil is not None else None
+        self.genera = (llegada > 0 and bool(self.destinos_idx)
+                       and (self.intensidad is None or self.intensidad.total > 0))
+        self._acumulada = 0.0  # Λ de la última llegada generada (con perfil)
 
-    def generar_pasajeros(self):
+        if modo_llegadas == 'proceso':
+            self.env.process(self.generar_pasajeros())
+        else:
+            if self.rng is None:
+                self.rng = np.random
+            self.tamano_bloque = tamano_bloque
+            self._llegadas = np.empty(0)
+            self._destinos = np.empty(0, dtype=int)
+            self._pos = 0
+            self._ultima_llegada = 0.0
+
+    def _generar_bloque(self):
+        llegada = self.demanda_paradas[self.nombre]['llegada']
+        destinos = self.demanda_paradas[self.nombre]['destinos']
+        if self.intensidad is None:
+            intervalos = self.rng.exponential(1 / llegada, self.tamano_bloque)
+            self._llegadas = self._ultima_llegada + np.cumsum(intervalos)
+        else:
+            acumuladas = self._acumulada + np.cumsum(self.rng.exponential(1.0, self.tamano_bloque))
+            self._llegadas = self.intensidad.invertir(acumuladas)
+            self._acumulada = acumuladas[-1]
+        sorteo = self.rng.random(self.tamano_bloque)
+        if self.pesos is None:
+            self._destinos = (sorteo * len(destinos)).astype(int)
+        else:
+            acumulado = np.cumsum(self.pesos)
+            self._destinos = np.searchsorted(acumulado, sorteo * acumulado[-1], side='right')
+        self._pos = 0
+        self._ultima_llegada = self._llegadas[-1]
+
+    def actualizar(self, ahora):
+        """
+        Materializa en la cola los pasajeros pregenerados que llegaron hasta
+        'ahora' (en modo 'proceso' la cola ya está al día) y retira a quienes
+        abandonaron hasta 'ahora'.
+        """
+        if self.modo_llegadas == 'vectorizado' and self.genera:
+            self._materializar(ahora)
+        if self._vencimientos and self._vencimientos[0][0] <= ahora:
+            self._abandonar(ahora)
+
+    def _materializar(self, ahora):
         while True:
-            llegada = self.demanda_paradas[self.nombre]['llegada']
-            destinos = self.demanda_paradas[self.nombre]['destinos']
+            if self._pos == len(self._llegadas):
+                self._generar_bloque()
+            fin = int(np.searchsorted(self._llegadas, ahora, side='right'))
+            if fin > self._pos:
+                codigos = self._destinos[self._pos:fin]
+                destinos_idx = np.asarray(self.destinos_idx)[codigos]
+                ids = self.tabla.agregar_bloque(self.indice, destinos_idx, self._llegadas[self._pos:fin])
+                if self.metricas is not None:
+                    self.metricas.registrar_llegadas(self.nombre, self._llegadas[self._pos:fin])
+                if self.paciencia is not None:
+                    limites = (self._llegadas[self._pos:fin]
+                               + self.paciencia.muestrear(self._rng_paciencia, fin - self._pos))
+                    for vencimiento in zip(limites.tolist(), ids, destinos_idx.tolist()):
+                        heappush(self._vencimientos, vencimiento)
+                        self._limites[vencimiento[1]] = vencimiento[0]
+                if len(self.destinos_idx) == 1:
+                    self.colas[self.destinos_idx[0]].extender(ids)
+                else:
+                    ids = np.arange(ids.start, ids.stop)
+                    for codigo, destino in enumerate(self.destinos_idx):
+                        self.colas[destino].extender(ids[codigos == codigo].tolist())
+                self.total_pasajeros += len(ids)
+            self._pos = fin
+            if fin < len(self._llegadas):
+                break
 
-            # Si no hay destinos, no generar pasajeros en esta parada
-            if not destinos:
-                # Espera un tiempo antes de volver a chequear
-                yield self.env.timeout(1)
-                continue
+    def _abandonar(self, ahora):
+        vencimientos = self._vencimientos
+        abordaje = self.tabla.abordaje
+        while vencimientos and vencimientos[0][0] <= ahora:
+            limite, pasajero, destino = heappop(vencimientos)
+            if self._limites.pop(pasajero, None) is None or not isnan(abordaje[pasajero]):
+                continue  # ya abandonó dentro de una tanda, o ya subió
+            self.colas[destino].abandonar(pasajero)
+            self._contar_abandono(limite)
+
+    def _contar_abandono(self, limite):
+        self.abandonos += 1
+        self.abandonos_hora[int(limite // 3600) % 24] += 1
+
+    def vencimiento(self, pasajero, tiempo):
+        """
+        Instante en que abandona 'pasajero', ya extraído de su cola para una
+        tanda, si es a más tardar en 'tiempo' (si no, None). Su vencimiento
+        queda fuera del heap: lo registra la tanda con abandonar_extraido.
+        """
+        if self.paciencia is None or self._limites[pasajero] > tiempo:
+            return None
+        return self._limites.pop(pasajero)
+
+    def abandonar_extraido(self, limite):
+        """Cuenta el abandono, en 'limite', de un pasajero extraído para una tanda (ver vencimiento)."""
+        self._contar_abandono(limite)
+
+    def reponer_vencimiento(self, pasajero, limite):
+        """Deshace vencimiento para un pasajero que vuelve a la cola (su entrada sigue en el heap)."""
+        self._limites[pasajero] = limite
+
+    def devolver(self, pasajeros):
+        """Devuelve al frente de sus colas pasajeros extraídos que no alcanzaron a subir."""
+        por_destino = {}
+        for pasajero in pasajeros:
+            por_destino.setdefault(self.tabla.destino[pasajero], []).append(pasajero)
+        for destino, grupo in por_destino.items():
+            self.colas[destino].devolver(grupo)
 
-            if llegada > 0:
+    def cerrar_tandas(self, ahora):
+        """
+        Al final de la simulación, cierra las tandas y bajadas en curso (modo
+        'lote') en 'ahora', como si hubieran sido pasajero a pasajero.
+        """
+        for bus in list(self.subiendo):
+            bus._cerrar_tanda(ahora)
+        for bus in self.bajando:
+            bus._confirmar_bajada(ahora)
+        self.bajando.clear()
+
+    def generar_pasajeros(self):
+        # Sin demanda o sin destinos el proceso termina: no hay nada que esperar
+        if not self.genera:
+            return
+        llegada = self.demanda_paradas[self.nombre]['llegada']
+        while True:
+            if self.intensidad is not None:
+                # Siguiente llegada del proceso no homogéneo (salta las horas sin demanda)
+                self._acumulada += random.expovariate(1.0) if self.rng is None else self.rng.exponential(1.0)
+                tiempo_llegada = max(0.0, float(self.intensidad.invertir(self._acumulada)) - self.env.now)
+            elif self.rng is None:
                 tiempo_llegada = random.expovariate(llegada)
-                yield self.env.timeout(tiempo_llegada)
-                destino = random.choice(destinos)
-                pasajero = Pasajero(self.env, f"{self.nombre}_{self.total_pasajeros}", self.nombre, destino, self.env.now)
-                self.cola.append(pasajero)
-                self.total_pasajeros += 1
             else:
-                yield self.env.timeout(1)  # Espera si no hay demanda
+                tiempo_llegada = self.rng.exponential(1 / llegada)
+            yield self.env.timeout(tiempo_llegada)
+            destino = self._sortear_destino()
+            pasajero = self.tabla.agregar(self.indice, destino, self.env.now)
+            self.colas[destino].agregar(pasajero)
+            if self.paciencia is not None:
+                limite = self.env.now + float(self.paciencia.muestrear(self._rng_paciencia))
+                heappush(self._vencimientos, (limite, pasajero, destino))
+                self._limites[pasajero] = limite
+            self.total_pasajeros += 1
+            if self.metricas is not None:
+                self.metricas.registrar_llegada(self.nombre, self.env.now)
+
+    def _sortear_destino(self):
+        if self.rng is None:
+            if self.pesos is None:
+                return random.choice(self.destinos_idx)
+            return random.choices(self.destinos_idx, weights=self.pesos)[0]
+        sorteo = self.rng.random()
+        if self.pesos is None:
+            return self.destinos_idx[int(sorteo * len(self.destinos_idx))]
+        acumulado = np.cumsum(self.pesos)
+        return self.destinos_idx[int(np.searchsorted(acumulado, sorteo * acumulado[-1], side='right'))]
+
+    def cerrar(self):
+        """Ids de los pasajeros que siguen esperando al final de la simulación."""
+        return [pasajero for cola in self.colas.values() for pasajero in cola.cerrar()]
+
+    def cola_para(self, destinos):
+        """Pasajeros en espera que puede llevar un bus que sigue hacia 'destinos'."""
+        colas = [self.colas[d] for d in destinos if d in self.colas]
+        if len(colas) == 1:
+            return colas[0]
+        return ColasCombinadas(colas)
+
 
 class Bus:
+    """
+    Bus que recorre la ruta desde hora_salida.
+
+    modo_detencion:
+    - 'pasajero': un timeout por cada pasajero que sube o baja (modelo original).
+    - 'lote': calcula la detención completa en forma cerrada y emite un solo timeout
+      por tanda de bajadas/subidas. Los tiempos individuales de los registros se
+      reconstruyen sumando tiempo_bajada/tiempo_subida igual que en el modo
+      'pasajero', por lo que con la misma semilla los registros coinciden.
+      Mientras otro bus sube o baja pasajeros en la misma parada, el bus sube
+      pasajero a pasajero y ambos se turnan la cola como en el modo 'pasajero'.
+      Única diferencia: si otro bus llega durante una tanda, la tanda ya
+      calculada termina igual (sus pasajeros van al primer bus en vez de
+      repartirse), y los empates en un mismo instante pueden resolverse en otro
+      orden. Parada.tandas_compartidas cuenta esas tandas (KPI del mismo nombre).
+
+    rng: numpy Generator propio del bus (ver random_streams). Se sortean de una
+    vez los mismos tres números por tramo (factor de viaje, si hay retraso y su
+    duración), de modo que cada tramo use siempre los mismos números. Sin rng
+    se usa el módulo random global (modelo original).
+
+    modelo_viaje: estrategia de tiempos de viaje por tramo y franja horaria
+    (ver travel_time.ModeloViaje); sin ella, el modelo original de _tiempo_viaje.
+
+    control: control.ControlBus con las reglas de retención y salto de paradas
+    de su línea (opcional).
+
+    costo_multa: monto fijo por llegada atrasada o escala por tramos de atraso
+    (ver utils.monto_multa).
+
+    tiempos_espera: lista a la que se agrega la espera (s) de cada pasajero que
+    sube, o None para no guardarlas. metricas: MetricasEnLinea (ver metrics.py)
+    que se actualiza con cada espera, ocupación y multa.
+    """
     def __init__(self, env, id_bus, ruta, capacidad, hora_salida, paradas_dict, tiempos_espera,
-                 costo_multa=1000, tiempo_subida=2, tiempo_bajada=1):
+                 costo_multa=1000, tiempo_subida=2, tiempo_bajada=1, modo_detencion='pasajero',
+                 tabla=None, registro=None, rng=None, metricas=None, modelo_viaje=None, control=None):
         self.env = env
         self.id_bus = id_bus
         self.ruta = ruta
@@ -54,84 +580,275 @@ class Bus:
         self.costo_multa = costo_multa
         self.tiempo_subida = tiempo_subida
         self.tiempo_bajada = tiempo_bajada
+        if modo_detencion not in ('pasajero', 'lote'):
+            raise ValueError(f"modo_detencion desconocido: {modo_detencion}")
+        self.modo_detencion = modo_detencion
+        if tabla is None:
+            tabla = paradas_dict[ruta[0]['nombre']].tabla
+        self.tabla = tabla
+        # Paradas que quedan después de cada parada de la ruta: en una parada
+        # compartida, el bus sólo sube a quienes van hacia alguna de ellas.
+        indices = [paradas_dict[p['nombre']].indice for p in ruta]
+        self.destinos_restantes = [indices[i+1:] for i in range(len(indices))]
 
-        self.pasajeros = []
+        # Ids de pasajeros a bordo indexados por parada de destino (en orden de subida),
+        # así la bajada en cada parada cuesta O(pasajeros que bajan).
+        self.pasajeros_por_destino = {}
+        self.n_a_bordo = 0
         self.registro_ocupacion = []
         self.tiempo_inicio = env.now
         self.multas_acumuladas = 0
         self.registro_multas = []
         self.registro_subidas = []
         self.registro_bajadas = []
+        # Sin sumidero compartido, los eventos quedan en las listas registro_* del bus
+        self.registro = registro if registro is not None else RegistroBus(self)
+        self.metricas = metricas
+        self.control = control
+        self.rng = rng
+        self._tanda = None
+        self._bajada = None
+        self._tiempos_viaje = None
+        if modelo_viaje is not None:
+            # Todos los tramos del recorrido se sortean de una vez al salir
+            self._tiempos_viaje = modelo_viaje.muestrear(rng if rng is not None else np.random,
+                                                         ruta, hora_salida)
+        elif rng is not None:
+            n_tramos = len(ruta)
+            self._factor_viaje = rng.uniform(0.8, 1.2, n_tramos).tolist()
+            self._sorteo_retraso = rng.random(n_tramos).tolist()
+            self._retraso = rng.exponential(60, n_tramos).tolist()
         self.env.process(self.recorrer_ruta())
 
     def recorrer_ruta(self):
-        # Esperar hasta la hora de salida
-        yield self.env.timeout(self.hora_salida - self.env.now)
+        # Esperar hasta la hora de salida (un bus creado a su hora sale de inmediato)
+        if self.hora_salida > self.env.now:
+            yield self.env.timeout(self.hora_salida - self.env.now)
         tiempo_programado = self.hora_salida
 
-        for parada in self.ruta:
+        for i, parada in enumerate(self.ruta):
             tiempo_llegada = self.env.now
             # Verificar atraso
             if tiempo_llegada > tiempo_programado:
                 atraso = tiempo_llegada - tiempo_programado
-                self.multas_acumuladas += self.costo_multa
-                self.registro_multas.append({
-                    'bus_id': self.id_bus,
-                    'parada': parada['nombre'],
-                    'tiempo_atraso': atraso,
-                    'costo_multa': self.costo_multa,
-                })
-            # Bajada de pasajeros
-            pasajeros_a_bajar = [p for p in self.pasajeros if p.destino == parada['nombre']]
-            for pasajero in pasajeros_a_bajar:
-                yield self.env.timeout(self.tiempo_bajada)
-                self.pasajeros.remove(pasajero)
-                self.registro_bajadas.append({
-                    'bus_id': self.id_bus,
-                    'tiempo': self.env.now,
-                    'parada': parada['nombre'],
-                    'pasajero_id': pasajero.id_pasajero
-                })
-
-            # Subida de pasajeros
-            parada_obj = self.paradas_dict[parada['nombre']]
-            while parada_obj.cola:
-                if len(self.pasajeros) < self.capacidad:
-                    pasajero = parada_obj.cola.pop(0)
-                    pasajero.tiempo_abordaje = self.env.now
-                    tiempo_espera_pasajero = pasajero.tiempo_abordaje - pasajero.tiempo_llegada
-                    self.tiempos_espera.append(tiempo_espera_pasajero)
-                    yield self.env.timeout(self.tiempo_subida)
-                    self.pasajeros.append(pasajero)
-                    self.registro_subidas.append({
-                        'bus_id': self.id_bus,
-                        'tiempo': self.env.now,
-                        'parada': parada['nombre'],
-                        'pasajero_id': pasajero.id_pasajero
-                    })
-                else:
-                    # Bus lleno
-                    parada_obj.pasajeros_no_atendidos += len(parada_obj.cola)
-                    break
-
-            ocupacion = len(self.pasajeros) / self.capacidad * 100
-            self.registro_ocupacion.append({
-                'bus_id': self.id_bus,
-                'tiempo': self.env.now,
-                'parada': parada['nombre'],
-                'ocupacion': ocupacion,
-                'pasajeros_a_bordo': len(self.pasajeros),
-            })
+                monto = monto_multa(self.costo_multa, atraso)
+                self.multas_acumuladas += monto
+                self.registro.agregar('multas', (self.id_bus, parada['nombre'], atraso, monto))
+                if self.metricas is not None:
+                    self.metricas.registrar_multa(parada['nombre'], atraso, monto)
+            # Salto de parada: sólo donde nadie baja y nunca en el origen
+            saltar = (self.control is not None and i > 0
+                      and self.paradas_dict[parada['nombre']].indice not in self.pasajeros_por_destino
+                      and self.control.saltar_parada(parada['nombre'], self.env.now))
+            if not saltar:
+                yield from self._detener(parada, i)
+            if self.control is not None and not saltar:
+                retencion = self.control.retencion(parada['nombre'], i == 0, self.env.now)
+                if retencion > 0:
+                    yield from self._retener(retencion)
+                    # Suben quienes llegaron durante la retención
+                    yield from self._detener(parada, i)
+                    if i == 0:
+                        # Retener en el origen es despachar más tarde: corre el horario del bus
+                        tiempo_programado += retencion
+            if self.control is not None:
+                self.control.registrar_salida(parada['nombre'], self.env.now)
+
+            ocupacion = self.n_a_bordo / self.capacidad * 100
+            self.registro.agregar('ocupacion', (self.id_bus, self.env.now, parada['nombre'],
+                                                ocupacion, self.n_a_bordo))
+            if self.metricas is not None:
+                self.metricas.registrar_ocupacion(parada['nombre'], self.env.now, ocupacion)
 
             if parada['tiempo_hasta_siguiente'] > 0:
-                tiempo_viaje = parada['tiempo_hasta_siguiente']
-                tiempo_viaje *= random.uniform(0.8, 1.2)
-                probabilidad_retraso = 0.1
-                if random.random() < probabilidad_retraso:
-                    retraso_adicional = random.expovariate(1/60)
-                    tiempo_viaje += retraso_adicional
-                yield self.env.timeout(tiempo_viaje)
+                yield self.env.timeout(self._tiempo_viaje(i, parada['tiempo_hasta_siguiente']))
                 tiempo_programado += parada['tiempo_hasta_siguiente']
             else:
                 # Última parada
                 break
+
+    def _retener(self, retencion):
+        # Generador propio para que la instrumentación cuente la retención
+        # aparte del viaje (ver instrumentation.CATEGORIAS)
+        yield self.env.timeout(retencion)
+
+    def _detener(self, parada, i):
+        if self.modo_detencion == 'lote':
+            yield from self._bajar_en_lote(parada)
+            yield from self._subir_en_lote(parada, self.destinos_restantes[i])
+        else:
+            yield from self._bajar_por_pasajero(parada)
+            yield from self._subir_por_pasajero(parada, self.destinos_restantes[i])
+
+    def _tiempo_viaje(self, i, tiempo_base):
+        """Tiempo del tramo i: ±20% del base y, con probabilidad 0.1, un retraso exponencial de media 60 s."""
+        if self._tiempos_viaje is not None:
+            return self._tiempos_viaje[i]
+        probabilidad_retraso = 0.1
+        if self.rng is None:
+            tiempo_viaje = tiempo_base * random.uniform(0.8, 1.2)
+            if random.random() < probabilidad_retraso:
+                tiempo_viaje += random.expovariate(1/60)
+            return tiempo_viaje
+        tiempo_viaje = tiempo_base * self._factor_viaje[i]
+        if self._sorteo_retraso[i] < probabilidad_retraso:
+            tiempo_viaje += self._retraso[i]
+        return tiempo_viaje
+
+    def _abordar(self, pasajero):
+        destino = self.tabla.destino[pasajero]
+        self.pasajeros_por_destino.setdefault(destino, []).append(pasajero)
+        self.n_a_bordo += 1
+
+    def _bajar_por_pasajero(self, parada):
+        pasajeros_a_bajar = self.pasajeros_por_destino.pop(self.paradas_dict[parada['nombre']].indice, [])
+        for pasajero in pasajeros_a_bajar:
+            yield self.env.timeout(self.tiempo_bajada)
+            self.n_a_bordo -= 1
+            self.registro.agregar('bajadas', (self.id_bus, self.env.now, parada['nombre'], pasajero))
+
+    def _subir_por_pasajero(self, parada, destinos):
+        parada_obj = self.paradas_dict[parada['nombre']]
+        parada_obj.subiendo.add(self)
+        parada_obj.actualizar(self.env.now)
+        cola = parada_obj.cola_para(destinos)
+        while cola:
+            if self.n_a_bordo < self.capacidad:
+                pasajero = cola.tomar_uno()
+                self.tabla.abordaje[pasajero] = self.env.now
+                tiempo_espera_pasajero = self.env.now - self.tabla.llegada[pasajero]
+                if self.tiempos_espera is not None:
+                    self.tiempos_espera.append(tiempo_espera_pasajero)
+                if self.metricas is not None:
+                    self.metricas.registrar_espera(parada['nombre'], self.env.now, tiempo_espera_pasajero)
+                yield self.env.timeout(self.tiempo_subida)
+                self._abordar(pasajero)
+                self.registro.agregar('subidas', (self.id_bus, self.env.now, parada['nombre'], pasajero))
+                parada_obj.actualizar(self.env.now)
+            else:
+                # Bus lleno
+                dejados, nuevos = cola.dejar()
+                parada_obj.rechazos += dejados
+                parada_obj.pasajeros_no_atendidos += nuevos
+                break
+        parada_obj.subiendo.discard(self)
+
+    def _bajar_en_lote(self, parada):
+        parada_obj = self.paradas_dict[parada['nombre']]
+        pasajeros_a_bajar = self.pasajeros_por_destino.pop(parada_obj.indice, [])
+        if not pasajeros_a_bajar:
+            return
+        # Se acumula igual que timeouts sucesivos para reproducir los mismos flotantes
+        tiempo = self.env.now
+        bajadas = []
+        for pasajero in pasajeros_a_bajar:
+            tiempo += self.tiempo_bajada
+            bajadas.append((tiempo, pasajero))
+        self.n_a_bordo -= len(pasajeros_a_bajar)
+        # Las bajadas se registran al terminar (o al cerrarse la simulación, ver Parada.cerrar_tandas)
+        self._bajada = (parada['nombre'], bajadas)
+        parada_obj.bajando.add(self)
+        yield self.env.timeout(tiempo - self.env.now)
+        parada_obj.bajando.discard(self)
+        self._confirmar_bajada()
+
+    def _confirmar_bajada(self, hasta=float('inf')):
+        nombre, bajadas = self._bajada
+        self._bajada = None
+        for tiempo, pasajero in bajadas:
+            if tiempo < hasta:
+                self.registro.agregar('bajadas', (self.id_bus, tiempo, nombre, pasajero))
+
+    def _subir_en_lote(self, parada, destinos):
+        parada_obj = self.paradas_dict[parada['nombre']]
+        if parada_obj.subiendo or parada_obj.bajando:
+            # Otro bus detenido aquí: se turnan la cola pasajero a pasajero
+            if any(bus._tanda_pendiente(self.env.now) for bus in parada_obj.subiendo):
+                parada_obj.tandas_compartidas += 1
+            yield from self._subir_por_pasajero(parada, destinos)
+            return
+        parada_obj.subiendo.add(self)
+        # Quienes llegan durante una tanda suben en la tanda siguiente,
+        # tal como en el modo por pasajero (la cola es FIFO).
+        parada_obj.actualizar(self.env.now)
+        cola = parada_obj.cola_para(destinos)
+        while cola:
+            if len(parada_obj.subiendo) > 1 or parada_obj.bajando:
+                # Llegó otro bus durante la tanda anterior
+                parada_obj.subiendo.discard(self)
+                yield from self._subir_por_pasajero(parada, destinos)
+                return
+            espacio = self.capacidad - self.n_a_bordo
+            if espacio <= 0:
+                # Bus lleno
+                dejados, nuevos = cola.dejar()
+                parada_obj.rechazos += dejados
+                parada_obj.pasajeros_no_atendidos += nuevos
+                break
+            # Plan de la tanda: (pasajero, instante en que el bus lo toma o le
+            # toca, vencimiento si abandona antes de subir). Se confirma al
+            # terminarla; el abordaje se marca ya para que otro bus que consulte
+            # la parada no dé por abandonado a quien va subiendo.
+            tiempo = self.env.now
+            plan = []
+            for pasajero in cola.tomar(espacio):
+                limite = parada_obj.vencimiento(pasajero, tiempo)
+                plan.append((pasajero, tiempo, limite))
+                if limite is None:
+                    self.tabla.abordaje[pasajero] = tiempo
+                    tiempo += self.tiempo_subida
+            self._tanda = (parada_obj, parada['nombre'], self.env.now, plan)
+            yield self.env.timeout(tiempo - self.env.now)
+            if self._tanda is not None:
+                self._confirmar_tanda(len(plan))
+            parada_obj.actualizar(self.env.now)
+        parada_obj.subiendo.discard(self)
+
+    def _tanda_pendiente(self, ahora):
+        """True si a la tanda en curso le quedan pasajeros por tomar después de 'ahora'."""
+        return self._tanda is not None and self._tanda[3][-1][1] > ahora
+
+    def _confirmar_tanda(self, n, hasta=float('inf')):
+        """
+        Sube (o da por abandonados) a los primeros n pasajeros del plan de la
+        tanda en curso. Sólo se registran las subidas que terminan antes de 'hasta'.
+        """
+        parada_obj, nombre, inicio, plan = self._tanda
+        self._tanda = None
+        esperas = []
+        for pasajero, tiempo, limite in plan[:n]:
+            if limite is not None:
+                parada_obj.abandonar_extraido(limite)
+                continue
+            esperas.append(tiempo - self.tabla.llegada[pasajero])
+            self._abordar(pasajero)
+            if tiempo + self.tiempo_subida < hasta:
+                self.registro.agregar('subidas', (self.id_bus, tiempo + self.tiempo_subida, nombre, pasajero))
+        if self.tiempos_espera is not None:
+            self.tiempos_espera.extend(esperas)
+        if self.metricas is not None:
+            self.metricas.registrar_esperas(nombre, inicio, esperas)
+
+    def _cerrar_tanda(self, ahora):
+        """
+        Fin de la simulación en 'ahora': confirma los pasajeros que el bus
+        alcanzó a tomar (sin registrar las subidas que terminarían después,
+        como en el modo 'pasajero') y devuelve el resto a la cola.
+        """
+        if self._tanda is None:
+            return
+        parada_obj, plan = self._tanda[0], self._tanda[3]
+        n = sum(1 for _, tiempo, _ in plan if tiempo < ahora)
+        self._confirmar_tanda(n, ahora)
+        devueltos = []
+        for pasajero, _, limite in plan[n:]:
+            if limite is None:
+                self.tabla.abordaje[pasajero] = NAN
+            elif limite <= ahora:
+                # Habría abandonado la cola al cerrarse (Parada.actualizar)
+                parada_obj.abandonar_extraido(limite)
+                continue
+            else:
+                parada_obj.reponer_vencimiento(pasajero, limite)
+            devueltos.append(pasajero)
+        parada_obj.devolver(devueltos)
@@ -0,0 +1,164 @@
+import os
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------
+# REGISTRO DE EVENTOS DE LA SIMULACIÓN
+#
+# Los buses escriben cada evento como una tupla en una de las tablas de
+# ESQUEMAS. El sumidero (RegistroEventos y subclases) las acumula en bloques
+# columnares de tamaño fijo y vacía cada bloque lleno:
+# - RegistroEventos: descarta los bloques y sólo conserva conteos y sumas
+#   (suficiente para los KPIs de una réplica).
+# - RegistroMemoria: conserva los bloques como DataFrames.
+# - RegistroCSV: agrega cada bloque al CSV de su tabla mientras corre la
+#   simulación, con memoria acotada por tamano_bloque.
+# ----------------------------------------------------------
+
+# Tipo de columna: código de array.array, o 'parada' (nombre codificado como entero)
+ESQUEMAS = {
+    'ocupacion': [('bus_id', 'q'), ('tiempo', 'd'), ('parada', 'parada'),
+                  ('ocupacion', 'd'), ('pasajeros_a_bordo', 'q')],
+    'subidas': [('bus_id', 'q'), ('tiempo', 'd'), ('parada', 'parada'), ('pasajero_id', 'q')],
+    'bajadas': [('bus_id', 'q'), ('tiempo', 'd'), ('parada', 'parada'), ('pasajero_id', 'q')],
+    'multas': [('bus_id', 'q'), ('parada', 'parada'), ('tiempo_atraso', 'd'), ('costo_multa', 'q')],
+}
+
+COLUMNAS = {tabla: [col for col, _ in esquema] for tabla, esquema in ESQUEMAS.items()}
+
+
+class RegistroBus:
+    """
+    Registro del modelo original: listas de diccionarios en el propio Bus
+    (bus.registro_ocupacion, bus.registro_subidas, ...). Es el que usa un Bus
+    cuando no recibe un sumidero compartido.
+    """
+    def __init__(self, bus):
+        self.listas = {tabla: getattr(bus, f'registro_{tabla}') for tabla in ESQUEMAS}
+
+    def agregar(self, tabla, fila):
+        self.listas[tabla].append(dict(zip(COLUMNAS[tabla], fila)))
+
+
+class RegistroEventos:
+    """
+    Sumidero compartido por todos los buses. Cada tabla se guarda en un bloque
+    columnar (un array.array por columna, 'parada' como código entero) que se
+    vacía con _volcar_bloque al llegar a tamano_bloque filas.
+
+    Esta clase base descarta los bloques volcados y sólo mantiene, por tabla,
+    el número de filas y la suma de cada columna numérica.
+    """
+    def __init__(self, tamano_bloque=65536):
+        self.tamano_bloque = tamano_bloque
+        self.nombres_paradas = []
+        self._codigo_parada = {}
+        self._bloques = {tabla: self._bloque_vacio(tabla) for tabla in ESQUEMAS}
+        self.filas = {tabla: 0 for tabla in ESQUEMAS}
+        self._sumas = {tabla: {col: 0 for col, tipo in esquema if tipo != 'parada'}
+                       for tabla, esquema in ESQUEMAS.items()}
+
+    def _bloque_vacio(self, tabla):
+        return [array('i' if tipo == 'parada' else tipo) for _, tipo in ESQUEMAS[tabla]]
+
+    def codigo_parada(self, nombre):
+        codigo = self._codigo_parada.get(nombre)
+        if codigo is None:
+            codigo = len(self.nombres_paradas)
+            self._codigo_parada[nombre] = codigo
+            self.nombres_paradas.append(nombre)
+        return codigo
+
+    def agregar(self, tabla, fila):
+        bloque = self._bloques[tabla]
+        for (_, tipo), columna, valor in zip(ESQUEMAS[tabla], bloque, fila):
+            columna.append(self.codigo_parada(valor) if tipo == 'parada' else valor)
+        self.filas[tabla] += 1
+        if len(bloque[0]) >= self.tamano_bloque:
+            self._vaciar(tabla)
+
+    def _vaciar(self, tabla):
+        bloque = self._bloques[tabla]
+        if not len(bloque[0]):
+            return
+        for (col, tipo), columna in zip(ESQUEMAS[tabla], bloque):
+            if tipo != 'parada':
+                self._sumas[tabla][col] += np.frombuffer(columna, dtype=columna.typecode).sum()
+        self._volcar_bloque(tabla, bloque)
+        self._bloques[tabla] = self._bloque_vacio(tabla)
+
+    def _volcar_bloque(self, tabla, bloque):
+        pass
+
+    def _bloque_a_dataframe(self, tabla, bloque):
+        datos = {}
+        for (col, tipo), columna in zip(ESQUEMAS[tabla], bloque):
+            if tipo == 'parada':
+                datos[col] = pd.Categorical.from_codes(np.frombuffer(columna, dtype=np.intc),
+                                                       categories=list(self.nombres_paradas))
+            else:
+                datos[col] = np.frombuffer(columna, dtype=columna.typecode).copy()
+        return pd.DataFrame(datos)
+
+    def suma(self, tabla, columna):
+        """Suma de una columna numérica sobre todas las filas registradas."""
+        pendiente = self._bloques[tabla][COLUMNAS[tabla].index(columna)]
+        return self._sumas[tabla][columna] + np.frombuffer(pendiente, dtype=pendiente.typecode).sum()
+
+    def cerrar(self):
+        """Vacía los bloques pendientes. Llamar una vez terminada la simulación."""
+        for tabla in ESQUEMAS:
+            self._vaciar(tabla)
+
+
+class RegistroMemoria(RegistroEventos):
+    """
+    Conserva todas las tablas en memoria como DataFrames (columnas tipadas,
+    'parada' categórica), ordenadas por instante de registro.
+
+    tablas: sólo conservar estas tablas (p. ej. ['ocupacion'] en corridas
+    largas); del resto se mantienen conteos y sumas, como en RegistroEventos.
+    """
+    def __init__(self, tamano_bloque=65536, tablas=None):
+        super().__init__(tamano_bloque)
+        self.tablas = list(ESQUEMAS) if tablas is None else list(tablas)
+        self._frames = {tabla: [] for tabla in ESQUEMAS}
+
+    def _volcar_bloque(self, tabla, bloque):
+        if tabla in self.tablas:
+            self._frames[tabla].append(bloque)
+
+    def a_dataframe(self, tabla):
+        if tabla not in self.tablas:
+            raise ValueError(f"La tabla {tabla} no se conservó (tablas={self.tablas})")
+        bloques = self._frames[tabla] + [self._bloques[tabla]]
+        frames = [self._bloque_a_dataframe(tabla, b) for b in bloques]
+        df = pd.concat(frames, ignore_index=True)
+        # Las categorías crecen entre bloques; se unifican al final
+        df['parada'] = pd.Categorical(df['parada'].astype(object), categories=self.nombres_paradas)
+        return df
+
+
+class RegistroCSV(RegistroEventos):
+    """
+    Escribe cada tabla en '<directorio>/datos_<tabla>.csv' a medida que se llenan
+    los bloques, de modo que la memoria usada no crece con el horizonte ni con la
+    flota. formato_pasajero (opcional) convierte los ids enteros de pasajero a
+    texto al escribir (p. ej. TablaPasajeros.etiquetas).
+    """
+    def __init__(self, directorio, tamano_bloque=65536, formato_pasajero=None):
+        super().__init__(tamano_bloque)
+        self.directorio = directorio
+        self.formato_pasajero = formato_pasajero
+        os.makedirs(directorio, exist_ok=True)
+        self.rutas = {tabla: os.path.join(directorio, f"datos_{tabla}.csv") for tabla in ESQUEMAS}
+        for tabla, ruta in self.rutas.items():
+            pd.DataFrame(columns=COLUMNAS[tabla]).to_csv(ruta, index=False)
+
+    def _volcar_bloque(self, tabla, bloque):
+        df = self._bloque_a_dataframe(tabla, bloque)
+        if self.formato_pasajero is not None and 'pasajero_id' in df:
+            df['pasajero_id'] = self.formato_pasajero(df['pasajero_id'])
+        df.to_csv(self.rutas[tabla], mode='a', header=False, index=False)
@@ -0,0 +1,226 @@
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader
+from event_log import RegistroMemoria
+from simulation import (ARCHIVO_MULTAS, ESCENARIOS, TIPOS_DIA, cargar_servicio, construir_configuracion,
+                        simular)
+
+# ----------------------------------------------------------
+# MULTAS REALES
+#
+# La Base de Multas (septiembre-octubre 2024) se carga una vez en TablaMultas:
+# columnas tipadas (categóricas para servicio, parada, inspector, etc.; enteros
+# para monto, hora y día), ordenada por servicio, parada y fecha, con un índice
+# de posiciones por (servicio, parada) para seleccionar sin recorrer la hoja.
+# Sobre ella:
+# - agregar(por=[...]): multas y montos por cualquier combinación de servicio,
+#   línea, sentido, parada, hora, día, etc. (por_parada, por_hora, por_servicio).
+# - calibrar_costo_multa(...): reemplaza el costo fijo de la simulación por una
+#   escala de montos por tramos de atraso que reproduce la distribución de
+#   montos reales (ver utils.monto_multa).
+#
+# En la base, 'Destino' identifica el recorrido ('1-HUALQUI-VALLE-IDA': línea,
+# recorrido y sentido) y 'Control' el punto de control ('10676-PAICAVI/OHIGGINS').
+#
+# Uso:
+#   python fines.py --por parada hora
+#   python fines.py --calibrar --escenario base --dias 7
+# ----------------------------------------------------------
+
+COLUMNAS = {'Inspector': 'inspector', 'Destino': 'servicio', 'Conductor': 'conductor',
+            'Vehículo': 'vehiculo', 'Fecha Hora': 'fecha', 'Control': 'parada', 'Monto ($)': 'monto'}
+AGRUPACIONES = ['servicio', 'linea', 'sentido', 'parada', 'inspector', 'conductor', 'vehiculo',
+                'dia', 'dia_semana', 'tipo_dia', 'hora']
+
+
+class TablaMultas:
+    """
+    Multas reales en columnas tipadas, ordenadas por (servicio, parada, fecha).
+
+    datos: hoja cruda de la Base de Multas (DataLoader.get_multas_data()).
+    """
+    def __init__(self, datos):
+        df = datos.rename(columns=COLUMNAS)
+        fecha = pd.to_datetime(df['fecha'])
+        partes = df['servicio'].str.split('-')
+        tabla = pd.DataFrame({
+            'servicio': pd.Categorical(df['servicio']),
+            'linea': partes.str[0].astype(np.int16),
+            'sentido': pd.Categorical(partes.str[-1]),
+            'parada': pd.Categorical(df['parada']),
+            'fecha': fecha,
+            'dia': fecha.dt.normalize(),
+            'dia_semana': fecha.dt.dayofweek.astype(np.int8),
+            'tipo_dia': pd.Categorical([TIPOS_DIA[d] for d in fecha.dt.dayofweek],
+                                       categories=list(dict.fromkeys(TIPOS_DIA))),
+            'hora': fecha.dt.hour.astype(np.int8),
+            'inspector': pd.Categorical(df['inspector']),
+            'conductor': pd.Categorical(df['conductor']),
+            'vehiculo': pd.Categorical(df['vehiculo']),
+            'monto': df['monto'].astype(np.int32),
+        })
+        self.datos = tabla.sort_values(['servicio', 'parada', 'fecha'], kind='stable', ignore_index=True)
+
+        # Posiciones [inicio, fin) de cada servicio y de cada (servicio, parada)
+        self._por_servicio = self._rangos(self.datos.groupby('servicio', observed=True).indices)
+        self._por_clave = self._rangos(self.datos.groupby(['servicio', 'parada'], observed=True).indices)
+
+    @staticmethod
+    def _rangos(indices):
+        return {clave: (int(pos[0]), int(pos[-1]) + 1) for clave, pos in indices.items()}
+
+    def __len__(self):
+        return len(self.datos)
+
+    @property
+    def servicios(self):
+        return list(self.datos['servicio'].cat.categories)
+
+    @property
+    def paradas(self):
+        return list(self.datos['parada'].cat.categories)
+
+    def seleccionar(self, servicio=None, parada=None, desde=None, hasta=None):
+        """
+        Multas de un servicio y/o parada en [desde, hasta) (fechas o textos
+        'AAAA-MM-DD'). Con servicio (y parada) la selección es un tramo
+        contiguo de la tabla y las fechas se ubican con búsqueda binaria.
+        """
+        if servicio is not None:
+            clave = servicio if parada is None else (servicio, parada)
+            inicio, fin = (self._por_servicio if parada is None else self._por_clave).get(clave, (0, 0))
+            df = self.datos.iloc[inicio:fin]
+            if parada is None:
+                return self._filtrar_fechas(df, desde, hasta)
+            fechas = df['fecha'].to_numpy()
+            a = 0 if desde is None else int(np.searchsorted(fechas, np.datetime64(pd.Timestamp(desde))))
+            b = len(df) if hasta is None else int(np.searchsorted(fechas, np.datetime64(pd.Timestamp(hasta))))
+            return df.iloc[a:b]
+        df = self.datos
+        if parada is not None:
+            df = df[df['parada'] == parada]
+        return self._filtrar_fechas(df, desde, hasta)
+
+    @staticmethod
+    def _filtrar_fechas(df, desde, hasta):
+        if desde is not None:
+            df = df[df['fecha'] >= pd.Timestamp(desde)]
+        if hasta is not None:
+            df = df[df['fecha'] < pd.Timestamp(hasta)]
+        return df
+
+    def agregar(self, por, datos=None):
+        """
+        Número de multas, monto total y monto medio por cada combinación de las
+        columnas 'por' (ver AGRUPACIONES), sobre 'datos' (por defecto toda la tabla;
+        p. ej. el resultado de seleccionar).
+        """
+        por = [por] if isinstance(por, str) else list(por)
+        desconocidas = [c for c in por if c not in AGRUPACIONES]
+        if desconocidas:
+            raise ValueError(f"Columnas de agrupación desconocidas: {desconocidas}. Opciones: {AGRUPACIONES}")
+        datos = self.datos if datos is None else datos
+        return (datos.groupby(por, observed=True)['monto']
+                .agg(n_multas='size', monto_total='sum', monto_medio='mean'))
+
+    def por_parada(self, datos=None):
+        return self.agregar('parada', datos).sort_values('n_multas', ascending=False)
+
+    def por_hora(self, datos=None):
+        return self.agregar('hora', datos)
+
+    def por_servicio(self, datos=None):
+        return self.agregar('servicio', datos)
+
+    def distribucion_montos(self, datos=None):
+        """Montos distintos (ascendentes) y la fracción de multas de cada uno."""
+        datos = self.datos if datos is None else datos
+        conteos = datos['monto'].value_counts().sort_index()
+        return conteos.index.to_numpy(), (conteos / conteos.sum()).to_numpy()
+
+
+@lru_cache(maxsize=None)
+def cargar_multas(file_multas=ARCHIVO_MULTAS):
+    """Lee la Base de Multas (con la caché del DataLoader) una sola vez por proceso."""
+    data_loader = DataLoader(file_multas=file_multas)
+    data_loader.set_print_options(print_data=False)
+    libro = data_loader.get_multas_data()
+    return TablaMultas(libro[next(iter(libro))])
+
+
+def escala_multas(montos, probabilidades, atrasos):
+    """
+    Escala por tramos de atraso que asigna los montos (ascendentes) a los
+    atrasos 'atrasos' por cuantiles: la fracción de atrasos que recibe cada
+    monto es su fracción en 'probabilidades', y a mayor atraso mayor monto.
+    """
+    atrasos = np.asarray(atrasos, dtype=float)
+    if len(atrasos) == 0:
+        raise ValueError("No hay atrasos para calibrar la escala de multas")
+    acumulada = np.cumsum(probabilidades)[:-1]
+    umbrales = np.quantile(atrasos, acumulada, method='inverted_cdf')
+    return {'umbrales': umbrales.tolist(), 'montos': [int(m) for m in montos]}
+
+
+def atrasos_simulados(config, semilla=None):
+    """Atrasos (s) de cada multa de una corrida de config."""
+    registro = RegistroMemoria(tablas=['multas'])
+    simular(config, semilla, registro=registro, guardar_esperas=False)
+    return registro.a_dataframe('multas')['tiempo_atraso'].to_numpy()
+
+
+def calibrar_costo_multa(config, tabla, semilla=None, servicio=None, parada=None):
+    """
+    Escala de multas por tramos de atraso (para config['costo_multa']) que
+    reproduce la distribución de montos reales de 'tabla' (opcionalmente de un
+    servicio y/o parada de la base).
+
+    Los atrasos vienen de una corrida piloto de config: como el atraso no
+    depende del costo de la multa, una corrida con la misma semilla y la escala
+    calibrada tiene exactamente la distribución de montos real.
+    """
+    montos, probabilidades = tabla.distribucion_montos(tabla.seleccionar(servicio, parada))
+    return escala_multas(montos, probabilidades, atrasos_simulados(config, semilla))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregaciones de las multas reales y calibración del costo de multa.")
+    parser.add_argument('--por', nargs='+', default=['parada'], choices=AGRUPACIONES,
+                        help="columnas de agrupación")
+    parser.add_argument('--servicio-multas', default=None, help="recorrido de la base ('Destino')")
+    parser.add_argument('--parada-multas', default=None, help="punto de control de la base ('Control')")
+    parser.add_argument('--calibrar', action='store_true',
+                        help="calibrar la escala de multas con una corrida piloto")
+    parser.add_argument('--escenario', choices=ESCENARIOS, default='base')
+    parser.add_argument('--servicio', default='80J')
+    parser.add_argument('--dias', type=float, default=7)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    tabla = cargar_multas()
+    datos = tabla.seleccionar(args.servicio_multas, args.parada_multas)
+    df = tabla.agregar(args.por, datos)
+    os.makedirs("escenarios/multas", exist_ok=True)
+    df.to_csv(f"escenarios/multas/multas_por_{'_'.join(args.por)}.csv")
+    print(f"Multas reales: {len(datos)} de {len(tabla)}, por {', '.join(args.por)}")
+    print(df.to_string())
+
+    if args.calibrar:
+        config = construir_configuracion(cargar_servicio(args.servicio), args.escenario,
+                                         tiempo_simulacion=args.dias * 24 * 3600,
+                                         modo_detencion='lote', modo_llegadas='vectorizado')
+        escala = calibrar_costo_multa(config, tabla, args.semilla, args.servicio_multas, args.parada_multas)
+        df_escala = pd.DataFrame({'atraso_hasta_s': escala['umbrales'] + [np.inf], 'monto': escala['montos']})
+        df_escala.to_csv("escenarios/multas/escala_multas.csv", index=False)
+        print(f"\nEscala de multas por atraso ({args.escenario}, {args.dias:g} días):")
+        print(df_escala.to_string(index=False))
+        print(f"Monto medio real: {datos['monto'].mean():.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from inspect import GEN_CREATED, getgeneratorstate
+
+import pandas as pd
+import simpy
+
+from simulation import ESCENARIOS, cargar_servicio, construir_configuracion, simular
+
+# ----------------------------------------------------------
+# INSTRUMENTACIÓN DE LA CORRIDA
+#
+# env.run(until=...) es una caja negra: no muestra avance y no dice en qué se
+# va el tiempo. Instrumentacion reemplaza esa llamada (argumento
+# instrumentacion= de simular) por un ciclo de env.step() que:
+# - cada intervalo_reporte segundos simulados informa el avance del tiempo
+#   simulado, los eventos por segundo y el largo de la cola de eventos;
+# - cuenta los eventos según el proceso que reanudan (CATEGORIAS), mirando el
+#   generador más interno de cada proceso (p. ej. Bus._subir_en_lote dentro
+#   de Bus.recorrer_ruta);
+# - opcionalmente perfila la corrida con cProfile ('cprofile') o con un
+#   muestreador de pila en un hilo aparte ('muestreo', casi sin sobrecosto).
+#
+# Los reportes van a 'salida' (por defecto sys.__stderr__, porque main.py
+# redirige stdout a log.txt).
+#
+# Uso:
+#   python instrumentation.py --dias 7 --perfil muestreo
+# ----------------------------------------------------------
+
+# Generador más interno del proceso reanudado -> categoría del evento
+CATEGORIAS = {
+    'Parada.generar_pasajeros': 'Parada: llegadas',
+    'Bus.recorrer_ruta': 'Bus: viaje',
+    'Bus._retener': 'Bus: retención',
+    'Bus._subir_por_pasajero': 'Bus: subidas',
+    'Bus._subir_en_lote': 'Bus: subidas',
+    'Bus._bajar_por_pasajero': 'Bus: bajadas',
+    'Bus._bajar_en_lote': 'Bus: bajadas',
+    'programa_buses': 'Despacho de buses',
+}
+PERFILES = ['cprofile', 'muestreo']
+
+
+def _formato_tiempo(segundos):
+    dias, resto = divmod(int(segundos), 24 * 3600)
+    return f"{dias}d {resto // 3600:02d}:{resto % 3600 // 60:02d}"
+
+
+def _cola_eventos(env):
+    """
+    Cola de eventos de SimPy (env._queue, sin API pública) o None si esta
+    versión no la expone. Sólo se usa para los diagnósticos opcionales (largo
+    de la cola y eventos por categoría); el ciclo avanza con env.peek().
+    """
+    cola = getattr(env, '_queue', None)
+    return cola if isinstance(cola, list) else None
+
+
+def categoria_evento(evento):
+    """Categoría del proceso que reanuda el evento (o 'Otros')."""
+    if isinstance(evento, simpy.Process) and not evento.callbacks:
+        return 'Fin de procesos'
+    for callback in evento.callbacks or ():
+        proceso = getattr(callback, '__self__', None)
+        if isinstance(proceso, simpy.Process):
+            generador = proceso._generator
+            if getgeneratorstate(generador) == GEN_CREATED:
+                return 'Inicio de procesos'
+            while generador.gi_yieldfrom is not None:
+                generador = generador.gi_yieldfrom
+            return CATEGORIAS.get(generador.__qualname__, generador.__qualname__)
+    return 'Otros'
+
+
+class MuestreadorPila:
+    """
+    Perfilador por muestreo: un hilo aparte mira cada 'intervalo' segundos la
+    pila del hilo que corre la simulación y cuenta, por función, las muestras
+    en que está en la cima (tiempo propio) o en cualquier parte de la pila
+    (tiempo acumulado).
+    """
+    def __init__(self, intervalo=0.005):
+        self.intervalo = intervalo
+        self.muestras = 0
+        self.propio = Counter()
+        self.acumulado = Counter()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @staticmethod
+    def _nombre(frame):
+        codigo = frame.f_code
+        return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+    def _muestrear(self, objetivo):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(objetivo)
+            if frame is None:
+                continue
+            self.muestras += 1
+            self.propio[self._nombre(frame)] += 1
+            vistos = set()
+            while frame is not None:
+                vistos.add(self._nombre(frame))
+                frame = frame.f_back
+            self.acumulado.update(vistos)
+
+    def iniciar(self):
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._muestrear, args=(threading.get_ident(),), daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def resumen(self, n=20):
+        """Las n funciones con más tiempo propio, como fracción de las muestras."""
+        filas = [{'funcion': f, 'propio': c / self.muestras, 'acumulado': self.acumulado[f] / self.muestras}
+                 for f, c in self.propio.most_common(n)] if self.muestras else []
+        return pd.DataFrame(filas, columns=['funcion', 'propio', 'acumulado'])
+
+
+class Instrumentacion:
+    """
+    Ejecuta la simulación paso a paso informando avance y contando eventos.
+
+    intervalo_reporte: segundos simulados entre reportes (None: sin reportes).
+    contar_eventos: clasificar cada evento con categoria_evento (tiene costo;
+    con False sólo se cuentan). Se desactiva solo si SimPy no expone su cola
+    de eventos.
+    perfil: None, 'cprofile' o 'muestreo'.
+    """
+    def __init__(self, intervalo_reporte=24 * 3600, salida=None, contar_eventos=True, perfil=None,
+                 intervalo_muestreo=0.005):
+        if perfil not in (None, *PERFILES):
+            raise ValueError(f"perfil desconocido: {perfil}. Opciones: {PERFILES}")
+        self.intervalo_reporte = intervalo_reporte
+        self.salida = salida if salida is not None else sys.__stderr__
+        self.contar_eventos = contar_eventos
+        self.perfil = perfil
+        self.intervalo_muestreo = intervalo_muestreo
+        self.eventos = 0
+        self.eventos_por_categoria = Counter()
+        self.cola_maxima = 0
+        self.segundos = 0.0
+        self.perfilador = None
+
+    def _reportar(self, env, hasta, inicio):
+        transcurrido = time.perf_counter() - inicio
+        velocidad = self.eventos / transcurrido if transcurrido > 0 else 0.0
+        cola = _cola_eventos(env)
+        largo = len(cola) if cola is not None else '?'
+        print(f"[{env.now / hasta:6.1%}] t={_formato_tiempo(env.now)} | {transcurrido:7.1f} s"
+              f" | {velocidad:10,.0f} eventos/s | cola {largo}",
+              file=self.salida, flush=True)
+
+    def _ciclo(self, env, hasta):
+        inicio = time.perf_counter()
+        cola = _cola_eventos(env)
+        if cola is None:
+            self.contar_eventos = False
+        proximo_reporte = self.intervalo_reporte if self.intervalo_reporte else float('inf')
+        while env.peek() < hasta:
+            if cola is not None:
+                if self.contar_eventos:
+                    self.eventos_por_categoria[categoria_evento(cola[0][3])] += 1
+                if len(cola) > self.cola_maxima:
+                    self.cola_maxima = len(cola)
+            env.step()
+            self.eventos += 1
+            if env.now >= proximo_reporte:
+                self._reportar(env, hasta, inicio)
+                proximo_reporte += self.intervalo_reporte
+        # Avanza el reloj hasta 'hasta' como env.run(until=hasta)
+        if env.now < hasta:
+            env.run(until=hasta)
+        self.segundos = time.perf_counter() - inicio
+        if self.intervalo_reporte:
+            self._reportar(env, hasta, inicio)
+
+    def ejecutar(self, env, hasta):
+        """Equivalente a env.run(until=hasta), instrumentado."""
+        if self.perfil == 'cprofile':
+            self.perfilador = cProfile.Profile()
+            self.perfilador.runcall(self._ciclo, env, hasta)
+        elif self.perfil == 'muestreo':
+            self.perfilador = MuestreadorPila(self.intervalo_muestreo)
+            self.perfilador.iniciar()
+            try:
+                self._ciclo(env, hasta)
+            finally:
+                self.perfilador.detener()
+        else:
+            self._ciclo(env, hasta)
+
+    def resumen_eventos(self):
+        """Eventos por categoría, con su fracción del total."""
+        df = pd.DataFrame(self.eventos_por_categoria.most_common(), columns=['categoria', 'eventos'])
+        df['fraccion'] = df['eventos'] / self.eventos if self.eventos else 0.0
+        return df
+
+    def informe(self, n=20):
+        """Texto con el resumen de la corrida, los eventos por categoría y el perfil."""
+        velocidad = self.eventos / self.segundos if self.segundos > 0 else 0.0
+        lineas = [f"Eventos: {self.eventos:,} en {self.segundos:.2f} s ({velocidad:,.0f} eventos/s),"
+                  f" cola máxima {self.cola_maxima}"]
+        if self.contar_eventos:
+            lineas += ["", "Eventos por categoría:", self.resumen_eventos().to_string(index=False)]
+        if self.perfil == 'cprofile':
+            texto = io.StringIO()
+            pstats.Stats(self.perfilador, stream=texto).sort_stats('tottime').print_stats(n)
+            lineas += ["", "Perfil (cProfile, por tiempo propio):", texto.getvalue()]
+        elif self.perfil == 'muestreo':
+            lineas += ["", f"Perfil (muestreo, {self.perfilador.muestras} muestras):",
+                       self.perfilador.resumen(n).to_string(index=False)]
+        return "\n".join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corrida instrumentada: avance, eventos por categoría y perfil.")
+    parser.add_argument('--escenario', choices=ESCENARIOS, default='base')
+    parser.add_argument('--servicio', default='80J')
+    parser.add_argument('--dias', type=float, default=7)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--modo-detencion', choices=['pasajero', 'lote'], default='pasajero')
+    parser.add_argument('--modo-llegadas', choices=['proceso', 'vectorizado'], default='proceso')
+    parser.add_argument('--perfil', choices=PERFILES, default=None)
+    parser.add_argument('--reporte-horas', type=float, default=24,
+                        help="horas simuladas entre reportes de avance")
+    args = parser.parse_args()
+
+    config = construir_configuracion(cargar_servicio(args.servicio), args.escenario,
+                                     tiempo_simulacion=args.dias * 24 * 3600,
+                                     modo_detencion=args.modo_detencion, modo_llegadas=args.modo_llegadas)
+    instrumentacion = Instrumentacion(args.reporte_horas * 3600, perfil=args.perfil)
+    simular(config, args.semilla, instrumentacion=instrumentacion)
+    print(instrumentacion.informe())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,21 @@
-import simpy
 import matplotlib
 matplotlib.use('Agg')  # Para no abrir ventanas de matplotlib
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
-import random
+import pandas as pd
 import os
 import sys
 
 from data_loader import DataLoader
-from entities import Parada, Bus
-from utils import es_horario_punta
+from entities import TablaPasajeros
+from event_log import RegistroEventos
+from fines import calibrar_costo_multa, cargar_multas
+from instrumentation import Instrumentacion
+from metrics import MetricasEnLinea
+from results_io import crear_registro, guardar_pasajeros, guardar_tabla, leer_tabla
+from simulation import construir_configuracion, construir_red, frecuencias_servicio, simular
+from steady_state import analizar_estado_estacionario, series_simulacion
+from travel_time import ModeloViaje, franjas_punta
 
 # ----------------------------------------------------------
 # CONFIGURACIONES DE ESCENARIO
@@ -53,9 +58,7 @@ sys.stdout = log_file
 # Simulamos una semana (7 días)
 # ----------------------------------------------------------
 TIEMPO_SIMULACION = 7 * 24 * 3600  # 7 días
-
-random.seed(42)
-np.random.seed(42)
+SEMILLA = 42
 
 # Archivos reales (ajusta las rutas de los archivos si es necesario)
 file_multas = 'Base de Multas Septiembre-Octubre 2024 depurada para estudiantes.xlsx'
@@ -64,161 +67,190 @@ file_rutas = 'Rutas_Operacion.xlsx'
 
 data_loader = DataLoader(file_multas, file_pot, file_rutas)
 data_loader.set_print_options(print_data=False, print_all=False, print_limit=5)
-data_loader.load_all_data()
-
-pot_parsed = data_loader.get_pot_parsed()
+# Carga perezosa: sólo se lee la hoja que se usa (Servicios de Rutas_Operacion).
+# Para cargar e imprimir todo, usar data_loader.load_all_data().
 rutas_data = data_loader.get_rutas_data()
 
 # Selección de un servicio (ejemplo: 80J IDA)
 servicio_select = '80J'
 rutas_servicios = rutas_data["Servicios"]
 serv = rutas_servicios[rutas_servicios['Servicio'] == servicio_select].iloc[0]
-origen = serv['Origen']
-destino = serv['Destino']
-distancia = serv['Distancia (km)']
 
 # Supuestos de demanda según EOD: ALTA
 tipo_demanda_ej = 'ALTA'
-mapeo_demanda = {'BAJA': 0.5, 'MEDIA': 1.0, 'ALTA': 1.5}
 base_tasa = 0.013  # Supuesto
 
-tasa_llegada = base_tasa * mapeo_demanda[tipo_demanda_ej]
-
 # Frecuencia base ALTA = 6 buses/hr
 frecuencia_buses_hr = 6
-intervalo_salida = 3600 / frecuencia_buses_hr
+
+# Programa de salidas: 'fijo' (cada 3600/frecuencia_buses_hr s) o 'pot'
+# (frecuencias por periodo y tipo de día del POT del servicio; parte un lunes).
+PROGRAMA_SALIDAS = 'fijo'
+
+# Red completa: todos los servicios de Rutas_Operacion en una misma simulación,
+# con las paradas terminales compartidas entre líneas (ver construir_red).
+# No aplica al escenario ruta_alternativa.
+SIMULAR_RED = False
+
+# Demanda: 'constante' (tasa fija todo el día, modelo original) o 'pot' (tasa
+# por hora según la categoría ALTA/MEDIA/BAJA del POT para cada hora y tipo de
+# día; sin llegadas en las horas sin servicio). Ver simulation.perfil_semanal.
+DEMANDA = 'constante'
+
+tablas_pot = None
+if PROGRAMA_SALIDAS == 'pot' or DEMANDA == 'pot':
+    programas = data_loader.get_pot_parsed()["Programas"]
+    if SIMULAR_RED:
+        tablas_pot = {s: frecuencias_servicio(programas, s) for s in rutas_servicios['Servicio']}
+    else:
+        tablas_pot = frecuencias_servicio(programas, servicio_select)
+frecuencias_pot = tablas_pot if PROGRAMA_SALIDAS == 'pot' else None
+perfil_pot = tablas_pot if DEMANDA == 'pot' else None
 
 # Parámetros generales
 CAPACIDAD_BUS = 50
 TIEMPO_SUBIDA = 2
 TIEMPO_BAJADA = 1
 COSTO_MULTA = 1000
+# True: el costo fijo COSTO_MULTA se reemplaza por una escala de montos por
+# tramos de atraso calibrada con la Base de Multas (ver fines.py; agrega una
+# corrida piloto para conocer los atrasos).
+MULTAS_CALIBRADAS = False
 HORARIOS_PUNTA = [(7*3600, 9*3600), (17*3600, 19*3600)]
 tiempo_por_km = 60
 n_tramos = 3
-tramo_s = (distancia * tiempo_por_km) / n_tramos
-
-# Ruta base
-RUTA_PARADAS = []
-for i in range(n_tramos+1):
-    nombre_parada = f"Parada {i+1} ({origen if i==0 else (destino if i==n_tramos else 'Intermedia')})"
-    next_time = tramo_s if i < n_tramos else 0
-    RUTA_PARADAS.append({'nombre': nombre_parada, 'tiempo_hasta_siguiente': next_time})
-
-# Ruta alternativa (ej: aeropuerto)
-RUTA_ALTERNATIVA = [
-    {'nombre': f"Parada 1 ({origen})", 'tiempo_hasta_siguiente': tramo_s},
-    {'nombre': 'Parada Aeropuerto', 'tiempo_hasta_siguiente': tramo_s+200},
-    {'nombre': f"Parada Final ({destino})", 'tiempo_hasta_siguiente': 0}
-]
-
-DEMANDA_PARADAS = {}
-for p in RUTA_PARADAS:
-    if 'Intermedia' in p['nombre']:
-        factor = mapeo_demanda['MEDIA']
-    elif 'Dest' in p['nombre']:
-        factor = mapeo_demanda['BAJA']
-    else:
-        factor = mapeo_demanda[tipo_demanda_ej]
-    DEMANDA_PARADAS[p['nombre']] = {
-        'llegada': tasa_llegada * factor,
-        'destinos': [RUTA_PARADAS[-1]['nombre']] if p != RUTA_PARADAS[-1] else []
-    }
-
-DEMANDA_PARADAS_ALTERNATIVA = {}
-for p in RUTA_ALTERNATIVA:
-    if 'Aeropuerto' in p['nombre']:
-        factor = mapeo_demanda['MEDIA']
-    elif 'Final' in p['nombre']:
-        factor = mapeo_demanda['BAJA']
-    else:
-        factor = mapeo_demanda[tipo_demanda_ej]
 
-    DEMANDA_PARADAS_ALTERNATIVA[p['nombre']] = {
-        'llegada': tasa_llegada * factor,
-        'destinos': [RUTA_ALTERNATIVA[-1]['nombre']] if p != RUTA_ALTERNATIVA[-1] else []
-    }
-
-if ESCENARIO_RUTA_ALTERNATIVA:
-    ruta_sim = RUTA_ALTERNATIVA
-    demanda_sim = DEMANDA_PARADAS_ALTERNATIVA
+# 'pasajero': un evento por cada subida/bajada (modelo original).
+# 'lote': un evento por tanda en cada parada (más rápido, mismos registros).
+MODO_DETENCION = 'pasajero'
+# 'proceso': un proceso SimPy genera cada llegada (modelo original).
+# 'vectorizado': llegadas pregeneradas con NumPy, sin eventos por pasajero.
+MODO_LLEGADAS = 'proceso'
+# Tiempos de viaje por tramo: 'original' (±20% y retraso ocasional, igual a
+# toda hora) o 'franjas' (distribuciones precalculadas por franja horaria, más
+# lentas y variables en horario punta; ver travel_time.py).
+MODELO_VIAJE = 'original'
+# Control de intervalos entre buses (ver control.py): None (sin control),
+# 'ninguna' (sólo mide los intervalos), 'retencion', 'salto' o 'retencion_salto'.
+CONTROL_INTERVALOS = None
+# Paciencia media (min) de los pasajeros antes de abandonar la parada
+# (exponencial; ver entities.Paciencia). None: nadie abandona.
+PACIENCIA_MIN = None
+
+# Formato de los resultados en escenarios/<scenario>: 'csv', 'parquet' o 'arrow'
+# (los dos últimos requieren pyarrow; ver results_io.py).
+FORMATO_SALIDA = 'csv'
+
+# True: los eventos de los buses se guardan en escenarios/<scenario>/datos_* y
+# las estadísticas se calculan al final con pandas sobre los registros completos.
+# False: no se guardan registros crudos (ni la lista de esperas); ocupación por
+# parada, estadísticas de espera (cuantiles P² aproximados) y multas por parada
+# salen de las métricas en línea de metrics.py, en memoria constante.
+# En ambos casos se guarda metricas_por_hora (llegadas, abordajes, espera y
+# ocupación por hora del día).
+REGISTRO_DETALLADO = True
+
+# Descartar el calentamiento (MSER-5, ver steady_state.py) de las estadísticas
+# de espera y ocupación, y agregar intervalos por medias de lotes. Pensado para
+# corridas largas (subir TIEMPO_SIMULACION); los archivos de datos_* no cambian.
+# Requiere REGISTRO_DETALLADO.
+DESCARTAR_CALENTAMIENTO = False
+N_LOTES = 20
+
+# Instrumentación (ver instrumentation.py): avance de la corrida en la terminal
+# (stdout va a log.txt) y, en el log, eventos por categoría y perfil de la
+# corrida si PERFIL es 'cprofile' o 'muestreo'.
+INSTRUMENTAR = False
+PERFIL = None
+
+# La construcción de la ruta, la demanda por parada y el despacho de buses
+# viven en simulation.py, para poder reutilizarlos en réplicas en paralelo.
+parametros = dict(
+    escenario=scenario, tiempo_simulacion=TIEMPO_SIMULACION,
+    tipo_demanda=tipo_demanda_ej, base_tasa=base_tasa,
+    frecuencia_buses_hr=frecuencia_buses_hr, capacidad_bus=CAPACIDAD_BUS,
+    tiempo_subida=TIEMPO_SUBIDA, tiempo_bajada=TIEMPO_BAJADA, costo_multa=COSTO_MULTA,
+    horarios_punta=HORARIOS_PUNTA, tiempo_por_km=tiempo_por_km, n_tramos=n_tramos,
+    modo_detencion=MODO_DETENCION, modo_llegadas=MODO_LLEGADAS,
+    frecuencias=frecuencias_pot, perfil_demanda=perfil_pot,
+    modelo_viaje=ModeloViaje.parametrico(franjas_punta(HORARIOS_PUNTA)) if MODELO_VIAJE == 'franjas' else None,
+    control={'estrategia': CONTROL_INTERVALOS} if CONTROL_INTERVALOS is not None else None,
+    paciencia={'media': PACIENCIA_MIN * 60} if PACIENCIA_MIN is not None else None)
+if SIMULAR_RED:
+    config = construir_red(rutas_servicios, **parametros)
+else:
+    config = construir_configuracion(serv, **parametros)
+if MULTAS_CALIBRADAS:
+    config['costo_multa'] = calibrar_costo_multa(config, cargar_multas(file_multas), SEMILLA)
+
+# Los eventos de los buses (ocupación, subidas, bajadas, multas) se escriben por
+# bloques en escenarios/<scenario>/datos_* mientras corre la simulación.
+tabla_pasajeros = TablaPasajeros()
+if REGISTRO_DETALLADO:
+    registro = crear_registro(FORMATO_SALIDA, f"escenarios/{scenario}",
+                              formato_pasajero=tabla_pasajeros.etiquetas, tabla_pasajeros=tabla_pasajeros)
 else:
-    ruta_sim = RUTA_PARADAS
-    demanda_sim = DEMANDA_PARADAS
-
-env = simpy.Environment()
-paradas_dict = {}
-for p in demanda_sim.keys():
-    paradas_dict[p] = Parada(env, p, demanda_sim)
-
-tiempos_espera = []
-lista_buses = []
-
-def programa_buses(env):
-    tiempo_actual = 0
-    bus_id = 0
-    while tiempo_actual < TIEMPO_SIMULACION:
-        if ESCENARIO_BASE:
-            buses_adicionales = 0
-        elif ESCENARIO_FLOTA_AUMENTADA:
-            if es_horario_punta(tiempo_actual, HORARIOS_PUNTA):
-                buses_adicionales = 2
-            else:
-                buses_adicionales = 1
-        else:
-            if es_horario_punta(tiempo_actual, HORARIOS_PUNTA):
-                buses_adicionales = 2
-            else:
-                buses_adicionales = 1
-
-        for _ in range(1 + buses_adicionales):
-            bus = Bus(env, bus_id, ruta_sim, CAPACIDAD_BUS, tiempo_actual, paradas_dict, tiempos_espera,
-                      COSTO_MULTA, TIEMPO_SUBIDA, TIEMPO_BAJADA)
-            lista_buses.append(bus)
-            bus_id += 1
-
-        tiempo_actual += intervalo_salida
-        yield env.timeout(0)
-
-env.process(programa_buses(env))
-env.run(until=TIEMPO_SIMULACION)
-
-# Análisis de resultados
-datos_ocupacion = []
-datos_subidas = []
-datos_bajadas = []
-datos_multas = []
-total_multas = 0
-for bus in lista_buses:
-    datos_ocupacion.extend(bus.registro_ocupacion)
-    datos_subidas.extend(bus.registro_subidas)
-    datos_bajadas.extend(bus.registro_bajadas)
-    datos_multas.extend(bus.registro_multas)
-    total_multas += bus.multas_acumuladas
-
-df_ocupacion = pd.DataFrame(datos_ocupacion)
-df_subidas = pd.DataFrame(datos_subidas)
-df_bajadas = pd.DataFrame(datos_bajadas)
-df_multas = pd.DataFrame(datos_multas)
+    registro = RegistroEventos()
+metricas = MetricasEnLinea()
+instrumentacion = Instrumentacion(salida=orig_stdout, perfil=PERFIL) if INSTRUMENTAR else None
+
+resultado = simular(config, semilla=SEMILLA, registro=registro, tabla=tabla_pasajeros,
+                    metricas=metricas, guardar_esperas=REGISTRO_DETALLADO, instrumentacion=instrumentacion)
+paradas_dict = resultado['paradas']
+total_multas = int(registro.suma('multas', 'costo_multa'))
 
 print("\n=== RESULTADOS DE LA SIMULACIÓN ===")
 print(f"Escenario: {scenario}")
-print(f"Total de pasajeros atendidos: {len(tiempos_espera)}")
-tiempos_espera_min = [t/60 for t in tiempos_espera]
+print(f"Total de pasajeros atendidos: {metricas.espera.n}")
+tandas_compartidas = sum(p.tandas_compartidas for p in paradas_dict.values())
+if tandas_compartidas:
+    print(f"Aviso: {tandas_compartidas} tandas del modo 'lote' con otro bus en la parada "
+          "(el reparto de la cola difiere del modo 'pasajero')")
 pasajeros_no_atendidos = {p.nombre: p.pasajeros_no_atendidos for p in paradas_dict.values()}
-
-# Guardar datos en CSV
-df_ocupacion.to_csv(f"escenarios/{scenario}/datos_ocupacion.csv", index=False)
-df_subidas.to_csv(f"escenarios/{scenario}/datos_subidas.csv", index=False)
-df_bajadas.to_csv(f"escenarios/{scenario}/datos_bajadas.csv", index=False)
-df_multas.to_csv(f"escenarios/{scenario}/datos_multas.csv", index=False)
-
-# También guardar tiempos_espera y pasajeros_no_atendidos
-pd.DataFrame({'tiempo_espera_min': tiempos_espera_min}).to_csv(f"escenarios/{scenario}/tiempos_espera.csv", index=False)
-pd.DataFrame(list(pasajeros_no_atendidos.items()), columns=['parada','no_atendidos']).to_csv(f"escenarios/{scenario}/pasajeros_no_atendidos.csv", index=False)
-
-if not df_ocupacion.empty:
-    ocupacion_promedio = df_ocupacion.groupby('parada')['ocupacion'].mean()
+rechazos = {p.nombre: p.rechazos for p in paradas_dict.values()}
+abandonos = {p.nombre: p.abandonos for p in paradas_dict.values()}
+
+if REGISTRO_DETALLADO:
+    # Análisis de resultados: sólo se leen del disco las columnas que usan los gráficos
+    df_ocupacion = leer_tabla(f"escenarios/{scenario}", 'ocupacion', FORMATO_SALIDA, ['parada', 'ocupacion'])
+    df_multas = leer_tabla(f"escenarios/{scenario}", 'multas', FORMATO_SALIDA, ['parada'])
+    tiempos_espera_min = [t/60 for t in resultado['tiempos_espera']]
+
+    if DESCARTAR_CALENTAMIENTO:
+        df_ocupacion = leer_tabla(f"escenarios/{scenario}", 'ocupacion', FORMATO_SALIDA,
+                                  ['tiempo', 'parada', 'ocupacion'])
+        series = series_simulacion(tabla_pasajeros, df_ocupacion)
+        estacionario = analizar_estado_estacionario(series, N_LOTES)
+        print("\nEstado estacionario (calentamiento MSER-5 descartado, medias de lotes 95%):")
+        print(estacionario.to_string())
+        # Las estadísticas y gráficos siguientes usan sólo lo posterior al calentamiento
+        df_ocupacion = df_ocupacion[df_ocupacion['tiempo'] >= estacionario.loc['ocupacion', 'fin_calentamiento_h'] * 3600]
+        tiempos_espera_min = list(series['espera_min'][1][estacionario.loc['espera_min', 'descartadas']:])
+
+    ocupacion_promedio = df_ocupacion.groupby('parada', observed=True)['ocupacion'].mean()
+    desc_espera = pd.Series(tiempos_espera_min).describe() if tiempos_espera_min else None
+    multas_por_parada = df_multas['parada'].astype(str).value_counts()
+    # tiempos_espera se guarda aparte (el resto ya está en disco)
+    guardar_tabla(pd.DataFrame({'tiempo_espera_min': tiempos_espera_min}),
+                  f"escenarios/{scenario}", 'tiempos_espera', FORMATO_SALIDA)
+else:
+    ocupacion_promedio = metricas.ocupacion_por_parada()
+    desc_espera = metricas.describir_espera() if metricas.espera.n else None
+    multas_por_parada = metricas.multas_por_parada()
+
+guardar_tabla(pd.DataFrame({'parada': list(pasajeros_no_atendidos), 'no_atendidos': list(pasajeros_no_atendidos.values()),
+                            'rechazos': list(rechazos.values()), 'abandonos': list(abandonos.values())}),
+              f"escenarios/{scenario}", 'pasajeros_no_atendidos', FORMATO_SALIDA)
+guardar_tabla(metricas.por_hora(), f"escenarios/{scenario}", 'metricas_por_hora', FORMATO_SALIDA)
+if PACIENCIA_MIN is not None:
+    guardar_tabla(pd.DataFrame([{'parada': p.nombre, 'hora': hora, 'abandonos': n}
+                                for p in paradas_dict.values() for hora, n in enumerate(p.abandonos_hora)]),
+                  f"escenarios/{scenario}", 'abandonos_por_hora', FORMATO_SALIDA)
+if FORMATO_SALIDA != 'csv' and REGISTRO_DETALLADO:
+    # En formatos columnares pasajero_id queda entero; la tabla de pasajeros permite cruzarlo
+    guardar_pasajeros(tabla_pasajeros, f"escenarios/{scenario}", FORMATO_SALIDA)
+
+if not ocupacion_promedio.empty:
     print("\nOcupación promedio por parada (%):")
     print(ocupacion_promedio)
     plt.figure()
@@ -230,12 +262,16 @@ if not df_ocupacion.empty:
     plt.savefig(f"escenarios/{scenario}/ocupacion_promedio_por_parada.png", bbox_inches='tight')
     plt.close()
 
-if tiempos_espera_min:
+if desc_espera is not None:
     print("\nEstadísticas de tiempos de espera (min):")
-    desc_espera = pd.Series(tiempos_espera_min).describe()
     print(desc_espera)
     plt.figure()
-    plt.hist(tiempos_espera_min, bins=50, edgecolor='black')
+    if REGISTRO_DETALLADO:
+        plt.hist(tiempos_espera_min, bins=50, edgecolor='black')
+    else:
+        histograma = metricas.histograma_espera
+        plt.bar(histograma.bordes()[:-1], histograma.conteos, width=histograma.ancho,
+                align='edge', edgecolor='black')
     plt.xlabel('Tiempo de espera (min)')
     plt.ylabel('Número de pasajeros')
     plt.title('Distribución de tiempos de espera')
@@ -243,8 +279,7 @@ if tiempos_espera_min:
     plt.savefig(f"escenarios/{scenario}/distribucion_tiempos_espera.png", bbox_inches='tight')
     plt.close()
 
-if not df_multas.empty:
-    multas_por_parada = df_multas['parada'].value_counts()
+if not multas_por_parada.empty:
     print("\nMultas por atraso por parada:")
     print(multas_por_parada)
     plt.figure()
@@ -261,7 +296,28 @@ else:
 print(f"\nTotal de multas acumuladas: {total_multas} unidades monetarias")
 print("Pasajeros no atendidos por parada:")
 for parada, cantidad in pasajeros_no_atendidos.items():
-    print(f"{parada}: {cantidad}")
+    print(f"{parada}: {cantidad} ({rechazos[parada]} rechazos, {abandonos[parada]} abandonos)")
+
+# Un pasajero puede quedar abajo de varios buses llenos antes de subir
+buses_perdidos = pd.Series(np.frombuffer(tabla_pasajeros.buses_perdidos, dtype=np.intc))
+if buses_perdidos.any():
+    print("Pasajeros según buses llenos que los dejaron:")
+    print(buses_perdidos[buses_perdidos > 0].value_counts().sort_index().to_string())
+esperas_censuradas_min = resultado['esperas_censuradas'] / 60
+if len(esperas_censuradas_min):
+    print(f"Pasajeros esperando al terminar: {len(esperas_censuradas_min)}"
+          f" (espera acumulada media {esperas_censuradas_min.mean():.2f} min, máxima {esperas_censuradas_min.max():.2f} min)")
+
+if resultado['control'] is not None:
+    df_control = resultado['control'].resumen()
+    print("\n=== CONTROL DE INTERVALOS ===")
+    print(f"Estrategia: {CONTROL_INTERVALOS} | retenciones: {df_control.attrs['retenciones']}"
+          f" ({df_control.attrs['tiempo_retenido_min']:.0f} min) | paradas saltadas: {df_control.attrs['saltos']}")
+    print(df_control.to_string(index=False))
+
+if instrumentacion is not None:
+    print("\n=== INSTRUMENTACIÓN ===")
+    print(instrumentacion.informe())
 
 print("\n=== FIN DE LA SIMULACIÓN ===")
 print("Nota: Todos los supuestos y simplificaciones han sido documentados en el código.")
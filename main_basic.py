@@ -5,7 +5,7 @@ import numpy as np
 import random
 
 from data_loader import DataLoader
-from entities import Parada, Bus
+from entities import Parada, Bus, TablaPasajeros
 from utils import es_horario_punta
 
 # ----------------------------------------------------------
@@ -139,9 +139,10 @@ else:
     demanda_sim = DEMANDA_PARADAS
 
 env = simpy.Environment()
+tabla_pasajeros = TablaPasajeros()  # compartida por todas las paradas y buses
 paradas_dict = {}
 for p in demanda_sim.keys():
-    paradas_dict[p] = Parada(env, p, demanda_sim)
+    paradas_dict[p] = Parada(env, p, demanda_sim, tabla=tabla_pasajeros)
 
 tiempos_espera = []
 lista_buses = []
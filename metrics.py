@@ -0,0 +1,247 @@
+import math
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------
+# MÉTRICAS EN LÍNEA
+#
+# Buses y paradas actualizan estas métricas a medida que ocurre cada evento,
+# de modo que los resúmenes que main.py calculaba al final con pandas
+# (ocupación media por parada, describe() de la espera, multas por parada)
+# están disponibles sin guardar los registros completos:
+# - Welford: conteo, media, varianza, mínimo y máximo en memoria constante.
+# - CuantilP2: cuantil aproximado con el algoritmo P² (Jain y Chlamtac),
+#   cinco marcadores por cuantil.
+# - Histograma: conteos en intervalos de ancho fijo (para graficar).
+# - MetricasEnLinea: las anteriores por parada y por hora del día.
+# ----------------------------------------------------------
+
+HORAS_DIA = 24
+
+
+class Welford:
+    """Media y varianza en una pasada (algoritmo de Welford)."""
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self._m2 = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def agregar(self, x):
+        self.n += 1
+        delta = x - self.media
+        self.media += delta / self.n
+        self._m2 += delta * (x - self.media)
+        if x < self.minimo:
+            self.minimo = x
+        if x > self.maximo:
+            self.maximo = x
+
+    @property
+    def varianza(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else float('nan')
+
+    @property
+    def desv_estandar(self):
+        return math.sqrt(self.varianza)
+
+    def valor_media(self):
+        return self.media if self.n else float('nan')
+
+
+class CuantilP2:
+    """
+    Cuantil p estimado en línea con el algoritmo P²: mantiene cinco marcadores
+    (mínimo, p/2, p, (1+p)/2, máximo) cuyas alturas se ajustan con
+    interpolación parabólica. Con menos de cinco observaciones es exacto.
+    """
+    def __init__(self, p):
+        self.p = p
+        self._iniciales = []
+        self._q = None
+        # Posición deseada de cada marcador con N observaciones: (N - 1) * fraccion
+        self._fracciones = (0, p/2, p, (1 + p)/2, 1)
+
+    def agregar(self, x):
+        if self._q is None:
+            self._iniciales.append(x)
+            if len(self._iniciales) == 5:
+                self._q = sorted(self._iniciales)
+                self._n = [0, 1, 2, 3, 4]
+            return
+
+        q, n = self._q, self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+
+        ultima = n[4]
+        for i in (1, 2, 3):
+            d = ultima * self._fracciones[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolica = q[i] + d / (n[i+1] - n[i-1]) * (
+                    (n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                    + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1]))
+                if q[i-1] < parabolica < q[i+1]:
+                    q[i] = parabolica
+                else:
+                    q[i] = q[i] + d * (q[i+d] - q[i]) / (n[i+d] - n[i])
+                n[i] += d
+
+    def valor(self):
+        if self._q is not None:
+            return self._q[2]
+        if not self._iniciales:
+            return float('nan')
+        return float(np.percentile(self._iniciales, self.p * 100))
+
+
+class Histograma:
+    """Conteos en intervalos [k*ancho, (k+1)*ancho) de valores no negativos."""
+    def __init__(self, ancho):
+        self.ancho = ancho
+        self._conteos = []
+
+    def agregar(self, x):
+        indice = int(x // self.ancho)
+        if indice >= len(self._conteos):
+            self._conteos.extend([0] * (indice + 1 - len(self._conteos)))
+        self._conteos[indice] += 1
+
+    @property
+    def conteos(self):
+        return np.asarray(self._conteos, dtype=np.int64)
+
+    def bordes(self):
+        return np.arange(len(self._conteos) + 1) * self.ancho
+
+
+def _horas(tiempos):
+    return (np.asarray(tiempos, dtype=float) // 3600).astype(np.int64) % HORAS_DIA
+
+
+class MetricasEnLinea:
+    """
+    Métricas de una corrida, actualizadas por Bus (esperas, ocupación, multas)
+    y Parada (llegadas) a medida que ocurren. Memoria constante en el número de
+    pasajeros y eventos: sólo crece con el número de paradas.
+
+    cuantiles: cuantiles de la espera estimados con P² (por defecto los de
+    describe() y el p95 de los KPIs). ancho_histograma: en minutos.
+    """
+    def __init__(self, cuantiles=(0.25, 0.5, 0.75, 0.95), ancho_histograma=0.5):
+        self.espera = Welford()
+        self.cuantiles_espera = {p: CuantilP2(p) for p in cuantiles}
+        self.histograma_espera = Histograma(ancho_histograma)
+        self.ocupacion = Welford()
+        self.atraso = Welford()
+        self.multas_total = 0
+
+        self.espera_parada = {}
+        self.ocupacion_parada = {}
+        self.multas_parada = {}
+        self.llegadas_parada = {}
+
+        self.llegadas_hora = np.zeros(HORAS_DIA, dtype=np.int64)
+        self.abordajes_hora = np.zeros(HORAS_DIA, dtype=np.int64)
+        self.espera_hora = np.zeros(HORAS_DIA)
+        self.ocupacion_hora = [Welford() for _ in range(HORAS_DIA)]
+
+    def registrar_llegada(self, parada, tiempo):
+        self.llegadas_hora[int(tiempo // 3600) % HORAS_DIA] += 1
+        self.llegadas_parada[parada] = self.llegadas_parada.get(parada, 0) + 1
+
+    def registrar_llegadas(self, parada, tiempos):
+        """Pasajeros que llegan a 'parada' en los instantes 'tiempos' (s)."""
+        horas = np.bincount(_horas(tiempos), minlength=HORAS_DIA)
+        self.llegadas_hora += horas
+        self.llegadas_parada[parada] = self.llegadas_parada.get(parada, 0) + int(horas.sum())
+
+    def registrar_espera(self, parada, tiempo, espera):
+        """Un pasajero que sube en 'parada' en el instante 'tiempo' tras esperar 'espera' (s)."""
+        espera_min = espera / 60
+        self.espera.agregar(espera_min)
+        for cuantil in self.cuantiles_espera.values():
+            cuantil.agregar(espera_min)
+        self.histograma_espera.agregar(espera_min)
+        if parada not in self.espera_parada:
+            self.espera_parada[parada] = Welford()
+        self.espera_parada[parada].agregar(espera_min)
+        hora = int(tiempo // 3600) % HORAS_DIA
+        self.abordajes_hora[hora] += 1
+        self.espera_hora[hora] += espera_min
+
+    def registrar_esperas(self, parada, tiempo, esperas):
+        """Una tanda de pasajeros que sube en 'parada' a partir del instante 'tiempo'."""
+        # Las tandas son de pocos pasajeros: el camino escalar es más rápido que NumPy
+        for espera in esperas:
+            self.registrar_espera(parada, tiempo, espera)
+
+    def registrar_ocupacion(self, parada, tiempo, ocupacion):
+        self.ocupacion.agregar(ocupacion)
+        if parada not in self.ocupacion_parada:
+            self.ocupacion_parada[parada] = Welford()
+        self.ocupacion_parada[parada].agregar(ocupacion)
+        self.ocupacion_hora[int(tiempo // 3600) % HORAS_DIA].agregar(ocupacion)
+
+    def registrar_multa(self, parada, atraso, costo):
+        self.atraso.agregar(atraso)
+        self.multas_total += costo
+        self.multas_parada[parada] = self.multas_parada.get(parada, 0) + 1
+
+    # --- Resúmenes ---
+
+    def resumen(self):
+        """KPIs de simulation.KPIS que dependen de los buses (sin no_atendidos)."""
+        return {
+            'pasajeros_atendidos': self.espera.n,
+            'espera_media_min': float(self.espera.valor_media()),
+            'espera_p95_min': self.cuantiles_espera[0.95].valor() if 0.95 in self.cuantiles_espera else float('nan'),
+            'multas_total': int(self.multas_total),
+            'n_multas': self.atraso.n,
+            'ocupacion_media': self.ocupacion.valor_media(),
+        }
+
+    def describir_espera(self):
+        """Equivalente a pd.Series(esperas_min).describe(), con cuantiles P²."""
+        datos = {'count': float(self.espera.n), 'mean': self.espera.valor_media(),
+                 'std': self.espera.desv_estandar, 'min': self.espera.minimo}
+        for p, cuantil in self.cuantiles_espera.items():
+            datos[f'{p:.0%}'] = cuantil.valor()
+        datos['max'] = self.espera.maximo
+        return pd.Series(datos)
+
+    def ocupacion_por_parada(self):
+        """Ocupación media (%) por parada, como groupby('parada')['ocupacion'].mean()."""
+        serie = pd.Series({p: w.media for p, w in self.ocupacion_parada.items()}, name='ocupacion')
+        serie.index.name = 'parada'
+        return serie.sort_index()
+
+    def multas_por_parada(self):
+        """Número de multas por parada, de mayor a menor (como value_counts())."""
+        serie = pd.Series(self.multas_parada, name='count', dtype='int64').sort_values(ascending=False)
+        serie.index.name = 'parada'
+        return serie
+
+    def por_hora(self):
+        """Llegadas, abordajes, espera media y ocupación media por hora del día."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            espera_media = self.espera_hora / self.abordajes_hora
+        return pd.DataFrame({
+            'hora': np.arange(HORAS_DIA),
+            'llegadas': self.llegadas_hora,
+            'abordajes': self.abordajes_hora,
+            'espera_media_min': espera_media,
+            'ocupacion_media': [w.valor_media() for w in self.ocupacion_hora],
+        })
@@ -0,0 +1,51 @@
+import zlib
+
+import numpy as np
+
+# ----------------------------------------------------------
+# FLUJOS ALEATORIOS POR ENTIDAD
+#
+# Con el módulo random global, agregar un bus (escenario flota_aumentada)
+# desplaza todos los sorteos posteriores, y dos escenarios con la misma
+# semilla dejan de ver las mismas llegadas y los mismos viajes.
+#
+# FlujosAleatorios deriva de una SeedSequence raíz un numpy Generator
+# independiente por entidad, identificado por una clave estable:
+# - cada parada, por su nombre (llegadas y destinos de sus pasajeros);
+# - cada bus, por su servicio, su hora de salida y su índice dentro de esa
+#   salida (0 = bus regular, 1.. = adicionales);
+# - la paciencia de los pasajeros de cada parada, en un flujo aparte de sus
+#   llegadas (activar los abandonos no cambia quién llega ni cuándo).
+# Así, la misma entidad recibe los mismos números en todos los escenarios
+# (números aleatorios comunes) y las comparaciones entre escenarios necesitan
+# muchas menos réplicas para la misma precisión.
+# ----------------------------------------------------------
+
+FLUJO_PARADA = 0
+FLUJO_BUS = 1
+FLUJO_PACIENCIA = 2
+
+
+def _codigo(texto):
+    """Entero estable (entre ejecuciones y procesos) para usar en una clave."""
+    return zlib.crc32(str(texto).encode('utf-8'))
+
+
+class FlujosAleatorios:
+    """Fábrica de numpy Generators por entidad a partir de una semilla raíz."""
+    def __init__(self, semilla):
+        self.raiz = np.random.SeedSequence(semilla)
+
+    def generador(self, *clave):
+        """Generator de la clave (tupla de enteros no negativos)."""
+        semilla = np.random.SeedSequence(self.raiz.entropy, spawn_key=clave)
+        return np.random.Generator(np.random.PCG64(semilla))
+
+    def parada(self, nombre):
+        return self.generador(FLUJO_PARADA, _codigo(nombre))
+
+    def paciencia(self, nombre):
+        return self.generador(FLUJO_PACIENCIA, _codigo(nombre))
+
+    def bus(self, servicio, hora_salida, indice):
+        return self.generador(FLUJO_BUS, _codigo(servicio), int(round(hora_salida)), indice)
@@ -0,0 +1,260 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from control import ESTRATEGIAS
+from simulation import (ESCENARIOS, KPIS, MODOS_ALEATORIOS, cargar_frecuencias, cargar_servicio,
+                        cargar_servicios, construir_configuracion, construir_red, run_replication)
+from utils import cuantil_t
+
+# ----------------------------------------------------------
+# RÉPLICAS INDEPENDIENTES EN PARALELO
+#
+# Ejecuta N copias del escenario con semillas distintas repartidas en un
+# ProcessPoolExecutor y resume cada KPI con su intervalo de confianza t.
+#
+# Uso:
+#   python replications.py --escenario base --replicas 200 --workers 8
+#   python replications.py --escenario base --comparar flota_aumentada --replicas 30
+#   python replications.py --escenario base --precision espera_media_min=0.05 multas_total=5000
+# ----------------------------------------------------------
+
+
+def generar_semillas(n_replicas, semilla_base=42):
+    """
+    Deriva n semillas independientes (enteros de 32 bits) desde una semilla base,
+    de modo que la réplica i siempre reciba la misma semilla.
+    """
+    estado = np.random.SeedSequence(semilla_base).generate_state(n_replicas)
+    return [int(s) for s in estado]
+
+
+def intervalos_confianza(df, columnas=KPIS, nivel=0.95):
+    """
+    Intervalo de confianza t para la media de cada columna de df
+    (una fila por réplica). Devuelve un DataFrame indexado por KPI.
+    """
+    filas = []
+    for col in columnas:
+        valores = df[col].dropna().to_numpy(dtype=float)
+        n = len(valores)
+        media = valores.mean() if n else float('nan')
+        desv = valores.std(ddof=1) if n > 1 else float('nan')
+        semi_ancho = cuantil_t(0.5 + nivel/2, n - 1) * desv / np.sqrt(n) if n > 1 else float('nan')
+        filas.append({
+            'kpi': col,
+            'n': n,
+            'media': media,
+            'desv_estandar': desv,
+            'semi_ancho': semi_ancho,
+            'limite_inferior': media - semi_ancho,
+            'limite_superior': media + semi_ancho,
+        })
+    return pd.DataFrame(filas).set_index('kpi')
+
+
+def run_replications(config, n_replicas, semilla_base=42, max_workers=None, nivel=0.95):
+    """
+    Ejecuta n_replicas del escenario en paralelo.
+
+    Devuelve (df_replicas, df_resumen): una fila de KPIs por réplica y los
+    intervalos de confianza al nivel indicado.
+    """
+    semillas = generar_semillas(n_replicas, semilla_base)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunksize = max(1, n_replicas // (4 * max_workers))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        resultados = list(executor.map(run_replication, repeat(config), semillas,
+                                       chunksize=chunksize))
+
+    df_replicas = pd.DataFrame(resultados)
+    df_resumen = intervalos_confianza(df_replicas, KPIS, nivel)
+    return df_replicas, df_resumen
+
+
+def _validar_objetivos(objetivos):
+    desconocidos = set(objetivos) - set(KPIS)
+    if desconocidos:
+        raise ValueError(f"KPIs desconocidos: {sorted(desconocidos)}. Opciones: {KPIS}")
+
+
+def leer_objetivos(textos):
+    """Objetivos de --precision ('KPI=SEMI_ANCHO') como dict KPI -> semi-ancho."""
+    objetivos = {}
+    for texto in textos:
+        kpi, igual, valor = texto.partition('=')
+        if not igual:
+            raise ValueError(f"Objetivo mal formado: {texto} (se espera KPI=SEMI_ANCHO)")
+        objetivos[kpi] = float(valor)
+    _validar_objetivos(objetivos)
+    return objetivos
+
+
+def _semi_anchos_cumplen(df_resumen, objetivos, relativa):
+    """Marca en df_resumen el objetivo de cada KPI y si su semi-ancho lo cumple."""
+    df_resumen = df_resumen.copy()
+    df_resumen['objetivo'] = pd.Series(objetivos, dtype=float)
+    semi_ancho = df_resumen['semi_ancho']
+    if relativa:
+        # Un intervalo de ancho cero cumple aunque la media sea 0 (p. ej.
+        # abandonos sin paciencia), donde el cociente daría 0/0
+        semi_ancho = (semi_ancho / df_resumen['media'].abs()).where(semi_ancho != 0, 0.0)
+    df_resumen['cumple'] = (semi_ancho <= df_resumen['objetivo']) | df_resumen['objetivo'].isna()
+    return df_resumen
+
+
+def run_secuencial(config, objetivos, n_inicial=10, tamano_lote=None, n_max=1000,
+                   semilla_base=42, max_workers=None, nivel=0.95, relativa=False):
+    """
+    Regla de detención secuencial: lanza réplicas en lotes paralelos hasta que
+    el semi-ancho del intervalo de confianza de cada KPI de 'objetivos'
+    (dict KPI -> semi-ancho máximo, en las unidades del KPI o, con
+    relativa=True, como fracción de la media) queda bajo su objetivo, o hasta
+    n_max réplicas. Con relativa=True, un KPI de semi-ancho 0 cumple aunque su
+    media sea 0.
+
+    Parte con n_inicial réplicas (pocas réplicas dan desviaciones poco
+    confiables) y luego agrega lotes de tamano_lote (por defecto, una réplica
+    por proceso). La réplica i recibe la misma semilla que en
+    run_replications, así que el resultado no depende del tamaño de los lotes.
+
+    Devuelve (df_replicas, df_resumen) como run_replications, con las columnas
+    'objetivo' y 'cumple' en df_resumen.
+    """
+    _validar_objetivos(objetivos)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if tamano_lote is None:
+        tamano_lote = max_workers
+    semillas = generar_semillas(n_max, semilla_base)
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        n_objetivo = min(n_inicial, n_max)
+        while True:
+            nuevas = semillas[len(resultados):n_objetivo]
+            resultados.extend(executor.map(run_replication, repeat(config), nuevas))
+            df_replicas = pd.DataFrame(resultados)
+            df_resumen = _semi_anchos_cumplen(intervalos_confianza(df_replicas, KPIS, nivel),
+                                              objetivos, relativa)
+            if df_resumen['cumple'].all() or len(resultados) >= n_max:
+                return df_replicas, df_resumen
+            n_objetivo = min(len(resultados) + tamano_lote, n_max)
+
+
+def run_comparacion(config_a, config_b, n_replicas, semilla_base=42, max_workers=None, nivel=0.95):
+    """
+    Compara dos escenarios con réplicas pareadas (la réplica i de ambos usa la
+    misma semilla). Con modo_aleatorio='por_entidad' los dos ven las mismas
+    llegadas y los mismos viajes (números aleatorios comunes), y el intervalo
+    de la diferencia se estrecha con muchas menos réplicas.
+
+    Devuelve (df_diferencias, df_resumen): KPIs de b menos los de a por
+    réplica, y el intervalo de confianza de cada diferencia.
+    """
+    df_a, _ = run_replications(config_a, n_replicas, semilla_base, max_workers, nivel)
+    df_b, _ = run_replications(config_b, n_replicas, semilla_base, max_workers, nivel)
+    df_diferencias = df_b[KPIS] - df_a[KPIS]
+    df_diferencias['semilla'] = df_a['semilla']
+    return df_diferencias, intervalos_confianza(df_diferencias, KPIS, nivel)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplicas independientes de la simulación en paralelo.")
+    parser.add_argument('--escenario', choices=ESCENARIOS, default='base')
+    parser.add_argument('--servicio', default='80J')
+    parser.add_argument('--replicas', type=int, default=100)
+    parser.add_argument('--dias', type=float, default=7)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--nivel', type=float, default=0.95)
+    parser.add_argument('--modo-detencion', choices=['pasajero', 'lote'], default='lote')
+    parser.add_argument('--modo-llegadas', choices=['proceso', 'vectorizado'], default='vectorizado')
+    parser.add_argument('--salidas', choices=['fijo', 'pot'], default='fijo',
+                        help="'fijo': cada 10 min; 'pot': frecuencias del POT por periodo")
+    parser.add_argument('--demanda', choices=['constante', 'pot'], default='constante',
+                        help="'pot': tasa por hora según la categoría de demanda del POT")
+    parser.add_argument('--control', choices=ESTRATEGIAS, default=None,
+                        help="control de intervalos entre buses (ver control.py)")
+    parser.add_argument('--paciencia', type=float, default=None, metavar='MIN',
+                        help="paciencia media (min) antes de abandonar la parada (ver entities.Paciencia)")
+    parser.add_argument('--red', action='store_true',
+                        help="simular todos los servicios de Rutas_Operacion juntos (ignora --servicio)")
+    parser.add_argument('--aleatorio', choices=MODOS_ALEATORIOS, default='por_entidad',
+                        help="'por_entidad': números aleatorios comunes entre escenarios")
+    parser.add_argument('--comparar', choices=ESCENARIOS, default=None,
+                        help="escenario a comparar con --escenario (réplicas pareadas)")
+    parser.add_argument('--precision', nargs='+', default=None, metavar='KPI=SEMI_ANCHO',
+                        help="réplicas hasta que el semi-ancho de cada KPI quede bajo el valor "
+                             "(--replicas pasa a ser el máximo)")
+    parser.add_argument('--relativa', action='store_true',
+                        help="--precision como fracción de la media (p. ej. 0.05 = ±5%%)")
+    parser.add_argument('--replicas-iniciales', type=int, default=10)
+    args = parser.parse_args()
+    if args.precision is not None:
+        try:
+            objetivos = leer_objetivos(args.precision)
+        except ValueError as error:
+            parser.error(str(error))
+
+    parametros = dict(tiempo_simulacion=args.dias * 24 * 3600, modo_detencion=args.modo_detencion,
+                      modo_llegadas=args.modo_llegadas, modo_aleatorio=args.aleatorio,
+                      control={'estrategia': args.control} if args.control else None,
+                      paciencia={'media': args.paciencia * 60} if args.paciencia is not None else None)
+    if args.red:
+        servicios = cargar_servicios()
+        tablas = None
+        if 'pot' in (args.salidas, args.demanda):
+            tablas = {s: cargar_frecuencias(s) for s in servicios['Servicio']}
+        def configurar(escenario):
+            return construir_red(servicios, escenario, frecuencias=tablas if args.salidas == 'pot' else None,
+                                 perfil_demanda=tablas if args.demanda == 'pot' else None, **parametros)
+    else:
+        serv = cargar_servicio(args.servicio)
+        tablas = cargar_frecuencias(args.servicio) if 'pot' in (args.salidas, args.demanda) else None
+        def configurar(escenario):
+            return construir_configuracion(serv, escenario, frecuencias=tablas if args.salidas == 'pot' else None,
+                                           perfil_demanda=tablas if args.demanda == 'pot' else None,
+                                           **parametros)
+
+    config = configurar(args.escenario)
+    if args.comparar is not None:
+        df_diferencias, df_resumen = run_comparacion(config, configurar(args.comparar), args.replicas,
+                                                     args.semilla, args.workers, args.nivel)
+        directorio = f"escenarios/{args.comparar}"
+        os.makedirs(directorio, exist_ok=True)
+        df_diferencias.to_csv(f"{directorio}/comparacion_{args.escenario}.csv", index=False)
+        df_resumen.to_csv(f"{directorio}/comparacion_{args.escenario}_resumen.csv")
+        print(f"{args.comparar} - {args.escenario}: {args.replicas} réplicas pareadas")
+        print(f"Intervalos de confianza de la diferencia ({args.nivel:.0%}):")
+        print(df_resumen.to_string())
+        return
+
+    if args.precision is not None:
+        df_replicas, df_resumen = run_secuencial(config, objetivos, args.replicas_iniciales,
+                                                 n_max=args.replicas, semilla_base=args.semilla,
+                                                 max_workers=args.workers, nivel=args.nivel,
+                                                 relativa=args.relativa)
+        if not df_resumen['cumple'].all():
+            print(f"Aviso: se alcanzó el máximo de {args.replicas} réplicas sin la precisión pedida.")
+    else:
+        df_replicas, df_resumen = run_replications(config, args.replicas, args.semilla,
+                                                   args.workers, args.nivel)
+
+    os.makedirs(f"escenarios/{args.escenario}", exist_ok=True)
+    df_replicas.to_csv(f"escenarios/{args.escenario}/replicas_kpis.csv", index=False)
+    df_resumen.to_csv(f"escenarios/{args.escenario}/replicas_resumen.csv")
+
+    print(f"Escenario: {args.escenario} - {len(df_replicas)} réplicas")
+    print(f"Intervalos de confianza ({args.nivel:.0%}):")
+    print(df_resumen.to_string())
+
+
+if __name__ == '__main__':
+    main()
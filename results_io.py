@@ -0,0 +1,252 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from event_log import COLUMNAS, ESQUEMAS, RegistroCSV, RegistroEventos
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sólo se necesita para 'parquet' y 'arrow'
+    pa = None
+    pq = None
+
+# ----------------------------------------------------------
+# FORMATOS DE SALIDA DE RESULTADOS
+#
+# - 'csv': texto, como siempre (no requiere pyarrow).
+# - 'parquet': columnar comprimido; 'parada' codificada como diccionario y
+#   bus_id entero. Un grupo de filas por bloque del registro.
+# - 'arrow': Arrow IPC (archivo .arrow sin compresión), que se puede abrir
+#   con memory map sin copiar los datos.
+#
+# crear_registro(...) entrega el sumidero de eventos para el formato,
+# guardar_tabla(...) escribe las tablas resumen (tiempos de espera, no
+# atendidos) y abrir_resultados / leer_tabla las vuelven a leer.
+# ----------------------------------------------------------
+
+FORMATOS = ['csv', 'parquet', 'arrow']
+EXTENSIONES = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+TIPOS_ENTEROS = {'bus_id': 'int32', 'pasajeros_a_bordo': 'int32',
+                 'pasajero_id': 'int64', 'costo_multa': 'int64', 'correlativo': 'int32'}
+# pasajero_id es la fila del pasajero en la TablaPasajeros de la corrida: con
+# llegadas vectorizadas depende de cuándo se materializa cada parada, así que
+# sólo vale dentro de una corrida. Con la tabla de pasajeros, subidas y bajadas
+# llevan además la clave estable (parada de origen, correlativo en esa parada),
+# que se puede cruzar entre corridas y modos con la misma semilla.
+CLAVE_PASAJERO = [('origen', 'parada'), ('correlativo', 'i')]
+
+
+def _requiere_pyarrow(formato):
+    if pa is None:
+        raise ImportError(f"El formato '{formato}' requiere pyarrow (pip install pyarrow).")
+
+
+def ruta_tabla(directorio, nombre, formato):
+    """Ruta del archivo de la tabla: 'datos_<tabla>' para eventos, '<nombre>' para el resto."""
+    archivo = f"datos_{nombre}" if nombre in ESQUEMAS else nombre
+    return os.path.join(directorio, f"{archivo}.{EXTENSIONES[formato]}")
+
+
+def _columnas(tabla, clave_pasajero):
+    columnas = ESQUEMAS[tabla]
+    if clave_pasajero and any(col == 'pasajero_id' for col, _ in columnas):
+        columnas = columnas + CLAVE_PASAJERO
+    return columnas
+
+
+def _esquema_arrow(tabla, clave_pasajero=False):
+    campos = []
+    for col, tipo in _columnas(tabla, clave_pasajero):
+        if tipo == 'parada':
+            campos.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        elif tipo == 'd':
+            campos.append(pa.field(col, pa.float64()))
+        else:
+            campos.append(pa.field(col, pa.from_numpy_dtype(np.dtype(TIPOS_ENTEROS[col]))))
+    return pa.schema(campos)
+
+
+class _RegistroArrowBase(RegistroEventos):
+    """
+    Convierte cada bloque del registro en una tabla Arrow tipada. Con
+    tabla_pasajeros, subidas y bajadas llevan la clave estable del pasajero
+    (ver CLAVE_PASAJERO).
+    """
+    def __init__(self, directorio, formato, tamano_bloque=65536, tabla_pasajeros=None):
+        _requiere_pyarrow(formato)
+        super().__init__(tamano_bloque)
+        self.directorio = directorio
+        self.tabla_pasajeros = tabla_pasajeros
+        os.makedirs(directorio, exist_ok=True)
+        self.rutas = {tabla: ruta_tabla(directorio, tabla, formato) for tabla in ESQUEMAS}
+        self.esquemas = {tabla: _esquema_arrow(tabla, tabla_pasajeros is not None) for tabla in ESQUEMAS}
+        self._escritores = {}
+        self._cerrado = False
+
+    def _bloque_a_arrow(self, tabla, bloque):
+        diccionario = pa.array(self.nombres_paradas, type=pa.string())
+        arreglos = []
+        for (col, tipo), columna, campo in zip(ESQUEMAS[tabla], bloque, self.esquemas[tabla]):
+            if tipo == 'parada':
+                codigos = pa.array(np.frombuffer(columna, dtype=np.intc), type=pa.int32())
+                arreglos.append(pa.DictionaryArray.from_arrays(codigos, diccionario))
+            else:
+                valores = np.frombuffer(columna, dtype=columna.typecode)
+                arreglos.append(pa.array(valores, type=campo.type))
+        if len(arreglos) < len(self.esquemas[tabla]):
+            arreglos += self._clave_pasajero(bloque[[col for col, _ in ESQUEMAS[tabla]].index('pasajero_id')])
+        return pa.Table.from_arrays(arreglos, schema=self.esquemas[tabla])
+
+    def _clave_pasajero(self, ids):
+        tabla = self.tabla_pasajeros
+        ids = np.frombuffer(ids, dtype=ids.typecode)
+        # Copias por índice: la tabla sigue creciendo durante la corrida
+        origen = np.frombuffer(tabla.origen, dtype=np.intc)[ids]
+        correlativo = np.frombuffer(tabla.correlativo, dtype=np.intc)[ids]
+        nombres = pa.array(tabla.nombres_paradas, type=pa.string())
+        return [pa.DictionaryArray.from_arrays(pa.array(origen, type=pa.int32()), nombres),
+                pa.array(correlativo, type=pa.int32())]
+
+    def _volcar_bloque(self, tabla, bloque):
+        self._escritor(tabla).write_table(self._bloque_a_arrow(tabla, bloque))
+
+    def cerrar(self):
+        if self._cerrado:
+            return
+        super().cerrar()
+        self._cerrado = True
+        for tabla in ESQUEMAS:
+            if tabla not in self._escritores:
+                # Tabla sin filas: se deja el archivo con el esquema
+                self._escritor(tabla)
+            self._escritores[tabla].close()
+
+
+class RegistroParquet(_RegistroArrowBase):
+    """Escribe cada tabla de eventos en '<directorio>/datos_<tabla>.parquet'."""
+    def __init__(self, directorio, tamano_bloque=65536, compresion='zstd', tabla_pasajeros=None):
+        super().__init__(directorio, 'parquet', tamano_bloque, tabla_pasajeros)
+        self.compresion = compresion
+
+    def _escritor(self, tabla):
+        if tabla not in self._escritores:
+            self._escritores[tabla] = pq.ParquetWriter(self.rutas[tabla], self.esquemas[tabla],
+                                                       compression=self.compresion)
+        return self._escritores[tabla]
+
+
+class RegistroArrow(_RegistroArrowBase):
+    """Escribe cada tabla de eventos en '<directorio>/datos_<tabla>.arrow' (Arrow IPC)."""
+    def __init__(self, directorio, tamano_bloque=65536, tabla_pasajeros=None):
+        super().__init__(directorio, 'arrow', tamano_bloque, tabla_pasajeros)
+
+    def _escritor(self, tabla):
+        if tabla not in self._escritores:
+            # El diccionario de paradas crece entre bloques: se emiten deltas
+            opciones = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._escritores[tabla] = pa.ipc.new_file(self.rutas[tabla], self.esquemas[tabla],
+                                                      options=opciones)
+        return self._escritores[tabla]
+
+
+def crear_registro(formato, directorio, tamano_bloque=65536, formato_pasajero=None, tabla_pasajeros=None):
+    """
+    Sumidero de eventos que escribe en 'directorio' con el formato indicado.
+    formato_pasajero sólo se usa en 'csv' (p. ej. TablaPasajeros.etiquetas,
+    estables entre corridas). En los formatos columnares pasajero_id queda
+    como entero, válido sólo dentro de la corrida (ver guardar_pasajeros); con
+    tabla_pasajeros se agregan las columnas estables origen y correlativo.
+    """
+    if formato == 'csv':
+        return RegistroCSV(directorio, tamano_bloque, formato_pasajero=formato_pasajero)
+    if formato == 'parquet':
+        return RegistroParquet(directorio, tamano_bloque, tabla_pasajeros=tabla_pasajeros)
+    if formato == 'arrow':
+        return RegistroArrow(directorio, tamano_bloque, tabla_pasajeros=tabla_pasajeros)
+    raise ValueError(f"Formato desconocido: {formato}. Opciones: {FORMATOS}")
+
+
+def guardar_tabla(df, directorio, nombre, formato='csv'):
+    """Guarda un DataFrame resumen (p. ej. tiempos_espera) en el formato indicado."""
+    ruta = ruta_tabla(directorio, nombre, formato)
+    if formato == 'csv':
+        df.to_csv(ruta, index=False)
+        return ruta
+    _requiere_pyarrow(formato)
+    df = df.copy()
+    for col in df.columns:
+        if col == 'parada':
+            df[col] = df[col].astype('category')
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    if formato == 'parquet':
+        pq.write_table(tabla, ruta, compression='zstd')
+    else:
+        with pa.ipc.new_file(ruta, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    return ruta
+
+
+def guardar_pasajeros(tabla_pasajeros, directorio, formato='parquet'):
+    """
+    Guarda la TablaPasajeros (una fila por pasajero, con su id entero) para
+    cruzar con pasajero_id de las tablas de subidas y bajadas de la misma
+    corrida. Entre corridas, la clave es (origen, correlativo).
+    """
+    nombres = pd.Index(tabla_pasajeros.nombres_paradas)
+    df = pd.DataFrame({
+        'pasajero_id': np.arange(len(tabla_pasajeros), dtype=np.int64),
+        'origen': pd.Categorical.from_codes(np.frombuffer(tabla_pasajeros.origen, dtype=np.intc), nombres),
+        'destino': pd.Categorical.from_codes(np.frombuffer(tabla_pasajeros.destino, dtype=np.intc), nombres),
+        'correlativo': np.frombuffer(tabla_pasajeros.correlativo, dtype=np.intc),
+        'llegada': np.frombuffer(tabla_pasajeros.llegada, dtype=np.float64),
+        'abordaje': np.frombuffer(tabla_pasajeros.abordaje, dtype=np.float64),
+        'buses_perdidos': np.frombuffer(tabla_pasajeros.buses_perdidos, dtype=np.intc),
+    })
+    return guardar_tabla(df, directorio, 'pasajeros', formato)
+
+
+def abrir_tabla(directorio, nombre, formato='arrow', columnas=None):
+    """
+    Abre una tabla de resultados como pyarrow.Table usando memory map.
+    En 'arrow' no se copian los datos (los buffers apuntan al archivo mapeado);
+    en 'parquet' se decodifica sólo lo pedido en 'columnas'.
+    """
+    _requiere_pyarrow(formato)
+    ruta = ruta_tabla(directorio, nombre, formato)
+    if formato == 'parquet':
+        return pq.read_table(ruta, columns=columnas, memory_map=True)
+    if formato == 'arrow':
+        tabla = pa.ipc.open_file(pa.memory_map(ruta, 'r')).read_all()
+        return tabla.select(columnas) if columnas is not None else tabla
+    raise ValueError(f"abrir_tabla no soporta el formato '{formato}'; use leer_tabla.")
+
+
+def abrir_resultados(directorio, formato='arrow', tablas=None):
+    """Abre todas las tablas de eventos de un escenario (dict nombre -> pyarrow.Table)."""
+    tablas = tablas if tablas is not None else list(ESQUEMAS)
+    return {nombre: abrir_tabla(directorio, nombre, formato) for nombre in tablas}
+
+
+def concatenar_corridas(directorios, nombre, formato='arrow', columnas=None):
+    """
+    Une la misma tabla de varias corridas (un directorio por corrida) en una
+    sola pyarrow.Table, con una columna 'corrida' (nombre del directorio).
+    """
+    partes = []
+    for directorio in directorios:
+        tabla = abrir_tabla(directorio, nombre, formato, columnas)
+        corrida = pa.array([os.path.basename(os.path.normpath(directorio))] * tabla.num_rows,
+                           type=pa.string()).dictionary_encode()
+        partes.append(tabla.append_column('corrida', corrida))
+    return pa.concat_tables(partes, promote_options='permissive')
+
+
+def leer_tabla(directorio, nombre, formato='csv', columnas=None):
+    """Lee una tabla de resultados como DataFrame de pandas, en cualquier formato."""
+    if formato == 'csv':
+        columnas_csv = columnas if columnas is not None else COLUMNAS.get(nombre)
+        return pd.read_csv(ruta_tabla(directorio, nombre, formato), usecols=columnas_csv)
+    return abrir_tabla(directorio, nombre, formato, columnas).to_pandas()
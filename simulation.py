@@ -0,0 +1,581 @@
+import random
+
+import numpy as np
+import pandas as pd
+import simpy
+
+from control import ControlIntervalos
+from data_loader import DataLoader
+from entities import Paciencia, Parada, Bus, TablaPasajeros
+from event_log import RegistroEventos, RegistroMemoria
+from random_streams import FlujosAleatorios
+from utils import es_horario_punta
+
+# ----------------------------------------------------------
+# MODELO REUTILIZABLE DE LA SIMULACIÓN
+#
+# Contiene la misma lógica de main.py pero sin estado global:
+# - construir_configuracion(...) arma la ruta, la demanda y los parámetros
+#   de un escenario en un diccionario (serializable, apto para multiproceso).
+# - horario_salidas(frecuencias, ...) compila las frecuencias del POT en los
+#   instantes de salida de los buses (opcional; si no, intervalo fijo).
+# - construir_red(servicios, ...) arma una configuración con todos los
+#   servicios de Rutas_Operacion en una sola red, con paradas compartidas.
+# - simular(config, semilla) ejecuta una réplica completa y devuelve sus
+#   entidades para el análisis detallado.
+# - run_replication(config, seed) ejecuta una réplica y devuelve sólo los KPIs.
+# ----------------------------------------------------------
+
+ARCHIVO_MULTAS = 'Base de Multas Septiembre-Octubre 2024 depurada para estudiantes.xlsx'
+ARCHIVO_POT = 'POT_VIII_GRAN+CONCEPCIÃ_N_UN80_NORMAL_2024_A1_5.xlsx'
+ARCHIVO_RUTAS = 'Rutas_Operacion.xlsx'
+
+ESCENARIOS = ['base', 'flota_aumentada', 'ruta_alternativa']
+
+MAPEO_DEMANDA = {'BAJA': 0.5, 'MEDIA': 1.0, 'ALTA': 1.5}
+HORARIOS_PUNTA = [(7*3600, 9*3600), (17*3600, 19*3600)]
+
+# Tipo de día del POT para cada día de la semana (0 = lunes)
+TIPOS_DIA = ['Laboral'] * 5 + ['Sábado', 'Domingo / Festivo']
+
+# 'global': módulo random / np.random sembrados una vez (modelo original).
+# 'por_entidad': un numpy Generator por parada y por bus (random_streams), para
+# comparar escenarios con números aleatorios comunes.
+MODOS_ALEATORIOS = ['global', 'por_entidad']
+
+# no_atendidos: pasajeros distintos que algún bus lleno dejó en la parada;
+# rechazos: veces que un bus lleno dejó a un pasajero; abandonos: pasajeros que
+# se fueron sin subir (ver entities.Paciencia); en_espera_final: pasajeros que
+# seguían esperando al terminar (espera censurada); tandas_compartidas: tandas
+# del modo 'lote' durante las que llegó otro bus a la parada (0 en el modo
+# 'pasajero'; si es > 0 el reparto de la cola difiere del modo 'pasajero').
+KPIS = ['pasajeros_atendidos', 'espera_media_min', 'espera_p95_min',
+        'no_atendidos', 'rechazos', 'abandonos', 'en_espera_final', 'espera_censurada_media_min',
+        'multas_total', 'n_multas', 'ocupacion_media', 'tandas_compartidas']
+
+
+def cargar_servicios(file_rutas=ARCHIVO_RUTAS):
+    """Lee sólo la hoja Servicios de Rutas_Operacion (una fila por servicio)."""
+    data_loader = DataLoader(file_rutas=file_rutas)
+    data_loader.set_print_options(print_data=False)
+    return data_loader.get_rutas_data()["Servicios"]
+
+
+def cargar_servicio(servicio_select='80J', file_rutas=ARCHIVO_RUTAS):
+    """Devuelve la fila del servicio seleccionado en la hoja Servicios de Rutas_Operacion."""
+    rutas_servicios = cargar_servicios(file_rutas)
+    return rutas_servicios[rutas_servicios['Servicio'] == servicio_select].iloc[0]
+
+
+def frecuencias_servicio(programas, servicio_select='80J', sentido=None):
+    """
+    Tabla de frecuencias del servicio en los Programas parseados del POT
+    (DataLoader.get_pot_parsed()["Programas"]). sentido ('IDA'/'REGRESO')
+    sólo hace falta si el servicio tiene más de un programa.
+    """
+    for programa in programas.values():
+        info = programa['info_servicio']
+        if info.get('Servicio') == servicio_select and sentido in (None, info.get('Sentido')):
+            return programa['frecuencias']
+    raise ValueError(f"El POT no tiene programa para el servicio {servicio_select}"
+                     + (f" ({sentido})" if sentido else ""))
+
+
+def cargar_frecuencias(servicio_select='80J', sentido=None, file_pot=ARCHIVO_POT):
+    """Lee el POT (con la caché del DataLoader) y devuelve las frecuencias del servicio."""
+    data_loader = DataLoader(file_pot=file_pot)
+    data_loader.set_print_options(print_data=False)
+    return frecuencias_servicio(data_loader.get_pot_parsed()['Programas'], servicio_select, sentido)
+
+
+def _segundos_del_dia(hora):
+    horas, minutos = hora.strip().split(':')
+    return int(horas) * 3600 + int(minutos) * 60
+
+
+def _periodos(frecuencias):
+    """Inicio y fin (s del día) de cada periodo de la columna Horario."""
+    rangos = frecuencias['Horario'].str.split('-', expand=True)
+    inicio = np.array([_segundos_del_dia(h) for h in rangos[0]], dtype=float)
+    # El periodo incluye su último minuto ('07:00-07:59' dura una hora)
+    fin = np.array([_segundos_del_dia(h) for h in rangos[1]], dtype=float) + 60
+    return inicio, fin
+
+
+def horario_salidas(frecuencias, tiempo_simulacion, dia_inicio=0):
+    """
+    Compila la tabla de frecuencias del POT en los instantes de salida (s),
+    ordenados, dentro de [0, tiempo_simulacion).
+
+    En cada periodo (columna Horario, p. ej. '07:00-07:59') salen
+    '<tipo de día>_Frecuencia (buses/hr)' buses, espaciados en 3600/frecuencia s
+    desde el inicio del periodo; los periodos sin frecuencia no tienen salidas.
+    El tipo de día sale de TIPOS_DIA, con dia_inicio el día de la semana en
+    t=0 (0 = lunes). Los festivos no se distinguen de los días de su semana.
+    """
+    inicio, fin = _periodos(frecuencias)
+
+    salidas_dia = {}
+    for tipo in set(TIPOS_DIA):
+        frecuencia = frecuencias[f'{tipo}_Frecuencia (buses/hr)'].fillna(0).to_numpy(dtype=float)
+        partes = [np.arange(a, b, 3600 / f) for a, b, f in zip(inicio, fin, frecuencia) if f > 0]
+        salidas_dia[tipo] = np.concatenate(partes) if partes else np.empty(0)
+
+    n_dias = int(np.ceil(tiempo_simulacion / (24*3600)))
+    salidas = np.sort(np.concatenate(
+        [dia * 24*3600 + salidas_dia[TIPOS_DIA[(dia_inicio + dia) % 7]] for dia in range(n_dias)]))
+    return salidas[salidas < tiempo_simulacion]
+
+
+def perfil_semanal(frecuencias, tipo_referencia='ALTA', dia_inicio=0):
+    """
+    Perfil horario de la demanda para una semana que parte en t=0 (dia_inicio:
+    día de la semana en t=0, 0 = lunes): lista de 7*24 multiplicadores de la
+    tasa de llegada, uno por hora.
+
+    La hora h de un día toma la categoría '<tipo de día>_Tipo Demanda' (ALTA,
+    MEDIA, BAJA) de la tabla de frecuencias del POT y su multiplicador es
+    MAPEO_DEMANDA[categoría] / MAPEO_DEMANDA[tipo_referencia], de modo que una
+    hora de la categoría de referencia mantiene la tasa constante original.
+    Las horas sin categoría (sin servicio, p. ej. de noche) no tienen llegadas.
+    """
+    inicio, fin = _periodos(frecuencias)
+    horas_inicio = (inicio // 3600).astype(int)
+    horas_fin = np.ceil(fin / 3600).astype(int)
+
+    perfil_dia = {}
+    for tipo in set(TIPOS_DIA):
+        perfil = np.zeros(24)
+        for a, b, categoria in zip(horas_inicio, horas_fin, frecuencias[f'{tipo}_Tipo Demanda']):
+            if pd.notna(categoria) and categoria in MAPEO_DEMANDA:
+                perfil[a:b] = MAPEO_DEMANDA[categoria] / MAPEO_DEMANDA[tipo_referencia]
+        perfil_dia[tipo] = perfil
+    return np.concatenate([perfil_dia[TIPOS_DIA[(dia_inicio + dia) % 7]] for dia in range(7)]).tolist()
+
+
+def construir_configuracion(serv, escenario='base', tiempo_simulacion=7 * 24 * 3600,
+                            tipo_demanda='ALTA', base_tasa=0.013, frecuencia_buses_hr=6,
+                            capacidad_bus=50, tiempo_subida=2, tiempo_bajada=1,
+                            costo_multa=1000, horarios_punta=None, tiempo_por_km=60,
+                            n_tramos=3, modo_detencion='pasajero',
+                            modo_llegadas='proceso', frecuencias=None, dia_inicio=0,
+                            modo_aleatorio='global', perfil_demanda=None, modelo_viaje=None,
+                            control=None, paciencia=None):
+    """
+    Construye el diccionario de configuración de un escenario a partir de la
+    fila del servicio (Origen, Destino, Distancia (km)) de Rutas_Operacion.
+
+    escenario:
+    - 'base': frecuencia normal, sin buses adicionales.
+    - 'flota_aumentada': 2 buses adicionales en punta y 1 en no punta.
+    - 'ruta_alternativa': ruta por el aeropuerto (mismos buses adicionales
+      que en main.py para este caso).
+
+    modo_detencion: 'pasajero' (un timeout por pasajero, modelo original) o
+    'lote' (un timeout por tanda en cada parada); ver entities.Bus.
+    modo_llegadas: 'proceso' (un proceso SimPy por parada, modelo original) o
+    'vectorizado' (llegadas pregeneradas con NumPy); ver entities.Parada.
+    frecuencias: tabla de frecuencias del POT (ver frecuencias_servicio). Si
+    se entrega, los buses salen según horario_salidas(frecuencias, ...,
+    dia_inicio) en vez de cada 3600/frecuencia_buses_hr s.
+    modo_aleatorio: ver MODOS_ALEATORIOS.
+    costo_multa: monto por llegada atrasada a una parada, o escala por tramos
+    de atraso calibrada con las multas reales (ver fines.calibrar_costo_multa).
+    perfil_demanda: tabla de frecuencias del POT cuyas columnas
+    '<tipo de día>_Tipo Demanda' dan la categoría de demanda de cada hora (ver
+    perfil_semanal). Si se entrega, las llegadas son un proceso de Poisson no
+    homogéneo: la tasa de cada parada se multiplica por el perfil semanal
+    (clave 'perfil' de cada parada); sin ella la tasa es constante.
+    modelo_viaje: estrategia de tiempos de viaje por tramo y franja horaria
+    (ver travel_time.ModeloViaje); None mantiene el modelo original de Bus.
+    control: parámetros de control.ControlIntervalos (p. ej. {'estrategia':
+    'retencion', 'alfa': 0.8}); cada corrida arma su propio control. None: sin control.
+    paciencia: parámetros de entities.Paciencia (p. ej. {'media': 900}): los
+    pasajeros abandonan la parada si esperan más que su tolerancia. None: nadie abandona.
+    """
+    if horarios_punta is None:
+        horarios_punta = HORARIOS_PUNTA
+
+    origen = serv['Origen']
+    destino = serv['Destino']
+    distancia = serv['Distancia (km)']
+
+    tasa_llegada = base_tasa * MAPEO_DEMANDA[tipo_demanda]
+    tramo_s = (distancia * tiempo_por_km) / n_tramos
+
+    # Ruta base
+    ruta_paradas = []
+    for i in range(n_tramos+1):
+        nombre_parada = f"Parada {i+1} ({origen if i==0 else (destino if i==n_tramos else 'Intermedia')})"
+        next_time = tramo_s if i < n_tramos else 0
+        ruta_paradas.append({'nombre': nombre_parada, 'tiempo_hasta_siguiente': next_time})
+
+    # Ruta alternativa (ej: aeropuerto)
+    ruta_alternativa = [
+        {'nombre': f"Parada 1 ({origen})", 'tiempo_hasta_siguiente': tramo_s},
+        {'nombre': 'Parada Aeropuerto', 'tiempo_hasta_siguiente': tramo_s+200},
+        {'nombre': f"Parada Final ({destino})", 'tiempo_hasta_siguiente': 0}
+    ]
+
+    if escenario == 'ruta_alternativa':
+        ruta = ruta_alternativa
+        clave_media, clave_baja = 'Aeropuerto', 'Final'
+    else:
+        ruta = ruta_paradas
+        clave_media, clave_baja = 'Intermedia', 'Dest'
+
+    perfil = None
+    if perfil_demanda is not None:
+        perfil = perfil_semanal(perfil_demanda, tipo_demanda, dia_inicio)
+
+    demanda = {}
+    for p in ruta:
+        if clave_media in p['nombre']:
+            factor = MAPEO_DEMANDA['MEDIA']
+        elif clave_baja in p['nombre']:
+            factor = MAPEO_DEMANDA['BAJA']
+        else:
+            factor = MAPEO_DEMANDA[tipo_demanda]
+        demanda[p['nombre']] = {
+            'llegada': tasa_llegada * factor,
+            'destinos': [ruta[-1]['nombre']] if p != ruta[-1] else []
+        }
+        if perfil is not None:
+            demanda[p['nombre']]['perfil'] = perfil
+
+    if escenario == 'base':
+        buses_adicionales_punta, buses_adicionales_no_punta = 0, 0
+    else:
+        buses_adicionales_punta, buses_adicionales_no_punta = 2, 1
+
+    salidas = None
+    if frecuencias is not None:
+        salidas = horario_salidas(frecuencias, tiempo_simulacion, dia_inicio).tolist()
+
+    return {
+        'escenario': escenario,
+        'tiempo_simulacion': tiempo_simulacion,
+        'ruta': ruta,
+        'demanda': demanda,
+        'capacidad_bus': capacidad_bus,
+        'tiempo_subida': tiempo_subida,
+        'tiempo_bajada': tiempo_bajada,
+        'costo_multa': costo_multa,
+        'intervalo_salida': 3600 / frecuencia_buses_hr,
+        'salidas': salidas,
+        'horarios_punta': horarios_punta,
+        'buses_adicionales_punta': buses_adicionales_punta,
+        'buses_adicionales_no_punta': buses_adicionales_no_punta,
+        'modo_detencion': modo_detencion,
+        'modo_llegadas': modo_llegadas,
+        'modo_aleatorio': modo_aleatorio,
+        'modelo_viaje': modelo_viaje,
+        'control': control,
+        'paciencia': paciencia,
+    }
+
+
+def construir_red(servicios, escenario='base', frecuencias=None,
+                  tiempo_simulacion=7 * 24 * 3600, tipo_demanda='ALTA', base_tasa=0.013,
+                  frecuencia_buses_hr=6, capacidad_bus=50, tiempo_subida=2, tiempo_bajada=1,
+                  costo_multa=1000, horarios_punta=None, tiempo_por_km=60, n_tramos=3,
+                  modo_detencion='pasajero', modo_llegadas='proceso', dia_inicio=0,
+                  modo_aleatorio='global', perfil_demanda=None, modelo_viaje=None, control=None,
+                  paciencia=None):
+    """
+    Configuración con todos los servicios de 'servicios' (hoja Servicios de
+    Rutas_Operacion) en una sola red, para simularlos en un mismo Environment.
+
+    Las paradas terminales se nombran por su lugar ('Parada SAN VICENTE') y
+    son compartidas por todas las líneas que parten o terminan ahí; las
+    intermedias son propias de cada servicio ('Parada 80J-2 (Intermedia)').
+    Cada línea aporta a sus paradas la misma demanda que en
+    construir_configuracion (tipo_demanda en el origen, MEDIA en las
+    intermedias) hacia su terminal de destino; en una parada compartida las
+    tasas se suman y el destino se sortea en proporción a ellas ('pesos').
+
+    frecuencias: dict servicio -> tabla de frecuencias del POT (opcional,
+    ver frecuencias_servicio); sin ella, cada línea sale cada
+    3600/frecuencia_buses_hr s. escenario: 'base' o 'flota_aumentada' (la
+    ruta alternativa es propia del 80J y no aplica a la red).
+    perfil_demanda: dict servicio -> tabla de frecuencias del POT para el
+    perfil horario de cada línea (ver perfil_semanal). En una parada
+    compartida el perfil es el de la suma de las tasas de sus líneas; el
+    destino se sigue sorteando con los pesos de la hora de referencia.
+    modelo_viaje, control, paciencia: como en construir_configuracion.
+    """
+    if escenario not in ('base', 'flota_aumentada'):
+        raise ValueError(f"Escenario no disponible para la red: {escenario}")
+    if horarios_punta is None:
+        horarios_punta = HORARIOS_PUNTA
+
+    tasa_llegada = base_tasa * MAPEO_DEMANDA[tipo_demanda]
+    lineas = []
+    tasas = {}  # parada -> {destino: tasa}
+    tasas_horarias = {}  # parada -> tasa por hora de la semana (con perfil_demanda)
+    for _, serv in servicios.iterrows():
+        servicio = serv['Servicio']
+        tramo_s = (serv['Distancia (km)'] * tiempo_por_km) / n_tramos
+        nombres = ([f"Parada {serv['Origen']}"]
+                   + [f"Parada {servicio}-{i+1} (Intermedia)" for i in range(1, n_tramos)]
+                   + [f"Parada {serv['Destino']}"])
+        ruta = [{'nombre': nombre, 'tiempo_hasta_siguiente': tramo_s if i < n_tramos else 0}
+                for i, nombre in enumerate(nombres)]
+        perfil = None
+        if perfil_demanda is not None:
+            perfil = np.asarray(perfil_semanal(perfil_demanda[servicio], tipo_demanda, dia_inicio))
+
+        for i, nombre in enumerate(nombres):
+            destinos = tasas.setdefault(nombre, {})
+            if i == n_tramos:
+                continue
+            factor = MAPEO_DEMANDA[tipo_demanda] if i == 0 else MAPEO_DEMANDA['MEDIA']
+            destinos[nombres[-1]] = destinos.get(nombres[-1], 0) + tasa_llegada * factor
+            if perfil is not None:
+                tasas_horarias[nombre] = tasas_horarias.get(nombre, 0) + tasa_llegada * factor * perfil
+
+        salidas = None
+        if frecuencias is not None:
+            salidas = horario_salidas(frecuencias[servicio], tiempo_simulacion, dia_inicio).tolist()
+        lineas.append({'servicio': servicio, 'ruta': ruta, 'salidas': salidas,
+                       'intervalo_salida': 3600 / frecuencia_buses_hr})
+
+    demanda = {}
+    for nombre, destinos in tasas.items():
+        demanda[nombre] = {
+            'llegada': sum(destinos.values()),
+            'destinos': list(destinos),
+            'pesos': list(destinos.values()),
+        }
+        if nombre in tasas_horarias:
+            demanda[nombre]['perfil'] = (tasas_horarias[nombre] / demanda[nombre]['llegada']).tolist()
+
+    if escenario == 'base':
+        buses_adicionales_punta, buses_adicionales_no_punta = 0, 0
+    else:
+        buses_adicionales_punta, buses_adicionales_no_punta = 2, 1
+
+    return {
+        'escenario': escenario,
+        'tiempo_simulacion': tiempo_simulacion,
+        'lineas': lineas,
+        'demanda': demanda,
+        'capacidad_bus': capacidad_bus,
+        'tiempo_subida': tiempo_subida,
+        'tiempo_bajada': tiempo_bajada,
+        'costo_multa': costo_multa,
+        'intervalo_salida': 3600 / frecuencia_buses_hr,
+        'horarios_punta': horarios_punta,
+        'buses_adicionales_punta': buses_adicionales_punta,
+        'buses_adicionales_no_punta': buses_adicionales_no_punta,
+        'modo_detencion': modo_detencion,
+        'modo_llegadas': modo_llegadas,
+        'modo_aleatorio': modo_aleatorio,
+        'modelo_viaje': modelo_viaje,
+        'control': control,
+        'paciencia': paciencia,
+    }
+
+
+def lineas_configuracion(config):
+    """
+    Líneas del escenario: config['lineas'] en una red (construir_red), o la
+    única ruta de construir_configuracion.
+    """
+    if 'lineas' in config:
+        return config['lineas']
+    return [{'servicio': None, 'ruta': config['ruta'], 'salidas': config.get('salidas'),
+             'intervalo_salida': config['intervalo_salida']}]
+
+
+def salidas_programadas(config, linea=None):
+    """
+    Instantes de salida (s) de la línea (por defecto, la ruta de config): los
+    del POT o cada intervalo_salida.
+    """
+    linea = linea if linea is not None else config
+    if linea.get('salidas') is not None:
+        return np.asarray(linea['salidas'], dtype=float)
+    return np.arange(0, config['tiempo_simulacion'], linea['intervalo_salida'])
+
+
+def _intervalos_programados(linea, horas):
+    """Intervalo (s) entre cada salida de la línea y la siguiente (la última repite el anterior)."""
+    if len(horas) == 0:
+        return horas
+    ultimo = horas[-1] - horas[-2] if len(horas) > 1 else linea['intervalo_salida']
+    return np.diff(horas, append=horas[-1] + ultimo)
+
+
+def programa_buses(env, config, paradas_dict, tiempos_espera, tabla, registro, servicio_bus=None,
+                   flujos=None, metricas=None, control=None):
+    """
+    Despacha los buses de todas las líneas con un solo temporizador, en el
+    orden de salidas_programadas: cada Bus se crea recién a su hora de salida,
+    de modo que la cola de eventos sólo contiene los buses en ruta y no toda
+    la semana. servicio_bus (opcional) recibe el servicio de cada bus_id.
+    flujos: FlujosAleatorios para dar a cada bus su propio generador, según su
+    servicio, hora de salida e índice en esa salida.
+    metricas: MetricasEnLinea que actualizan todos los buses.
+    control: ControlIntervalos (ver control.py); el intervalo objetivo de cada
+    bus es el intervalo programado de su línea dividido por los buses de esa salida.
+    """
+    lineas = lineas_configuracion(config)
+    horas = [salidas_programadas(config, linea) for linea in lineas]
+    intervalos = np.concatenate([_intervalos_programados(linea, h) for linea, h in zip(lineas, horas)])
+    numero_linea = np.concatenate([np.full(len(h), i) for i, h in enumerate(horas)])
+    horas = np.concatenate(horas)
+    orden = np.argsort(horas, kind='stable')
+
+    bus_id = 0
+    for hora_salida, i, intervalo in zip(horas[orden].tolist(), numero_linea[orden].tolist(),
+                                         intervalos[orden].tolist()):
+        if hora_salida > env.now:
+            yield env.timeout(hora_salida - env.now)
+
+        if es_horario_punta(hora_salida, config['horarios_punta']):
+            buses_adicionales = config['buses_adicionales_punta']
+        else:
+            buses_adicionales = config['buses_adicionales_no_punta']
+
+        control_bus = None
+        if control is not None:
+            control_bus = control.para_bus(lineas[i]['servicio'] or 'ruta', intervalo / (1 + buses_adicionales))
+        for k in range(1 + buses_adicionales):
+            rng = flujos.bus(lineas[i]['servicio'], hora_salida, k) if flujos is not None else None
+            # Los eventos van al sumidero compartido: no se guarda referencia al
+            # bus, que se libera al terminar su recorrido.
+            Bus(env, bus_id, lineas[i]['ruta'], config['capacidad_bus'], hora_salida,
+                paradas_dict, tiempos_espera, config['costo_multa'],
+                config['tiempo_subida'], config['tiempo_bajada'],
+                modo_detencion=config['modo_detencion'], tabla=tabla, registro=registro,
+                rng=rng, metricas=metricas, modelo_viaje=config.get('modelo_viaje'), control=control_bus)
+            if servicio_bus is not None:
+                servicio_bus.append(lineas[i]['servicio'])
+            bus_id += 1
+
+
+def simular(config, semilla=None, registro=None, tabla=None, metricas=None, guardar_esperas=True,
+            instrumentacion=None):
+    """
+    Ejecuta una réplica del escenario y devuelve un diccionario con
+    'paradas' (nombre -> Parada), 'registro' (sumidero de eventos de los buses),
+    'tiempos_espera' (s), 'tabla' (TablaPasajeros con todos los pasajeros),
+    'servicio_bus' (servicio de cada bus_id; None fuera de una red),
+    'control' (el ControlIntervalos de la corrida si config['control'], si no None),
+    'en_espera' (ids de los pasajeros que seguían esperando al final) y
+    'esperas_censuradas' (s, sus esperas hasta el final). Los buses llenos que
+    dejaron a cada pasajero quedan en tabla.buses_perdidos.
+
+    registro: sumidero de event_log (por defecto RegistroMemoria). Se cierra
+    al terminar la simulación.
+    tabla: TablaPasajeros a usar (por defecto una nueva).
+    metricas: MetricasEnLinea (ver metrics.py) que buses y paradas actualizan
+    durante la corrida; se devuelve en 'metricas'.
+    guardar_esperas: con False no se guarda la lista de esperas
+    ('tiempos_espera' es None) y los KPIs salen de metricas.
+    instrumentacion: Instrumentacion (ver instrumentation.py) que ejecuta la
+    corrida informando avance y contando eventos, en vez de env.run.
+    """
+    if semilla is not None:
+        random.seed(semilla)
+        np.random.seed(semilla)
+    modo_aleatorio = config.get('modo_aleatorio', 'global')
+    if modo_aleatorio not in MODOS_ALEATORIOS:
+        raise ValueError(f"modo_aleatorio desconocido: {modo_aleatorio}")
+    flujos = FlujosAleatorios(semilla) if modo_aleatorio == 'por_entidad' else None
+    if registro is None:
+        registro = RegistroMemoria()
+
+    if tabla is None:
+        tabla = TablaPasajeros()
+
+    env = simpy.Environment()
+    paciencia = flujos_paciencia = None
+    if config.get('paciencia') is not None:
+        paciencia = Paciencia(**config['paciencia'])
+        # La paciencia usa siempre flujos propios: activarla no cambia las llegadas ni los viajes
+        flujos_paciencia = flujos if flujos is not None else FlujosAleatorios(semilla)
+    paradas_dict = {}
+    for p in config['demanda'].keys():
+        paradas_dict[p] = Parada(env, p, config['demanda'], modo_llegadas=config['modo_llegadas'],
+                                 rng=flujos.parada(p) if flujos is not None else None, tabla=tabla,
+                                 metricas=metricas, paciencia=paciencia,
+                                 rng_paciencia=flujos_paciencia.paciencia(p) if paciencia is not None else None)
+
+    tiempos_espera = [] if guardar_esperas else None
+    servicio_bus = []
+    control = ControlIntervalos(**config['control']) if config.get('control') is not None else None
+    env.process(programa_buses(env, config, paradas_dict, tiempos_espera, tabla, registro,
+                               servicio_bus, flujos, metricas, control))
+    if instrumentacion is None:
+        env.run(until=config['tiempo_simulacion'])
+    else:
+        instrumentacion.ejecutar(env, config['tiempo_simulacion'])
+    # Llegadas pregeneradas que ningún bus alcanzó a ver
+    en_espera = []
+    for parada in paradas_dict.values():
+        # Las tandas en curso suben sólo a quienes el bus alcanzó a tomar
+        parada.cerrar_tandas(config['tiempo_simulacion'])
+    for parada in paradas_dict.values():
+        parada.actualizar(config['tiempo_simulacion'])
+        en_espera.extend(parada.cerrar())
+    registro.cerrar()
+    # Esperas censuradas: quienes no alcanzaron a subir esperaron al menos hasta el final
+    llegadas = np.frombuffer(tabla.llegada, dtype=np.float64)
+    esperas_censuradas = config['tiempo_simulacion'] - llegadas[np.asarray(en_espera, dtype=np.int64)]
+
+    return {
+        'paradas': paradas_dict,
+        'registro': registro,
+        'tiempos_espera': tiempos_espera,
+        'tabla': tabla,
+        'servicio_bus': servicio_bus,
+        'metricas': metricas,
+        'control': control,
+        'en_espera': en_espera,
+        'esperas_censuradas': esperas_censuradas,
+    }
+
+
+def resumir_kpis(resultado):
+    """
+    Resume una réplica en los KPIs de KPIS (tiempos en minutos). Si la
+    réplica no guardó las esperas, los KPIs salen de sus métricas en línea
+    (espera_p95_min es entonces la estimación P²).
+    """
+    censuradas_min = np.asarray(resultado['esperas_censuradas'], dtype=float) / 60
+    de_paradas = {
+        'no_atendidos': sum(p.pasajeros_no_atendidos for p in resultado['paradas'].values()),
+        'rechazos': sum(p.rechazos for p in resultado['paradas'].values()),
+        'abandonos': sum(p.abandonos for p in resultado['paradas'].values()),
+        'en_espera_final': len(censuradas_min),
+        'espera_censurada_media_min': float(censuradas_min.mean()) if len(censuradas_min) else float('nan'),
+        'tandas_compartidas': sum(p.tandas_compartidas for p in resultado['paradas'].values()),
+    }
+    if resultado['tiempos_espera'] is None:
+        kpis = {**resultado['metricas'].resumen(), **de_paradas}
+        return {kpi: kpis[kpi] for kpi in KPIS}
+    esperas_min = np.asarray(resultado['tiempos_espera'], dtype=float) / 60
+    registro = resultado['registro']
+    n_ocupacion = registro.filas['ocupacion']
+    return {
+        'pasajeros_atendidos': len(esperas_min),
+        'espera_media_min': float(esperas_min.mean()) if len(esperas_min) else float('nan'),
+        'espera_p95_min': float(np.percentile(esperas_min, 95)) if len(esperas_min) else float('nan'),
+        **de_paradas,
+        'multas_total': int(registro.suma('multas', 'costo_multa')),
+        'n_multas': registro.filas['multas'],
+        'ocupacion_media': float(registro.suma('ocupacion', 'ocupacion') / n_ocupacion) if n_ocupacion else float('nan'),
+    }
+
+
+def run_replication(config, seed):
+    """
+    Ejecuta una réplica con la semilla indicada y devuelve sus KPIs.
+    Es una función de módulo para poder enviarse a un ProcessPoolExecutor.
+    """
+    # Sólo KPIs: el sumidero base no conserva las filas de los eventos
+    kpis = resumir_kpis(simular(config, seed, registro=RegistroEventos()))
+    kpis['semilla'] = seed
+    return kpis
@@ -0,0 +1,181 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from event_log import RegistroMemoria
+from simulation import (ESCENARIOS, MODOS_ALEATORIOS, cargar_frecuencias, cargar_servicio,
+                        construir_configuracion, simular)
+from utils import cuantil_t
+
+# ----------------------------------------------------------
+# ESTADO ESTACIONARIO EN UNA CORRIDA LARGA
+#
+# La simulación parte vacía en t=0 y las primeras horas sesgan la espera y la
+# ocupación. En vez de repetir N corridas de una semana (cada una pagando su
+# transiente), se hace una sola corrida larga:
+# 1. MSER-5 detecta el periodo de calentamiento de cada serie (espera de cada
+#    pasajero ordenada por instante de abordaje, ocupación de cada bus en cada
+#    parada) y lo descarta.
+# 2. Con el resto se calcula el intervalo de confianza por medias de lotes:
+#    n_lotes lotes contiguos cuyas medias son aproximadamente independientes.
+#    La autocorrelación lag-1 de las medias indica si los lotes son muy cortos.
+#
+# Uso:
+#   python steady_state.py --dias 60 --lotes 20
+# ----------------------------------------------------------
+
+SERIES = ['espera_min', 'ocupacion']
+
+
+def mser(valores, m=5):
+    """
+    Regla MSER-m (m=5: MSER-5): agrupa la serie en medias de m observaciones
+    z_1..z_k y elige el truncamiento d que minimiza
+        sum_{j>d} (z_j - media(z_{d+1..k}))^2 / (k - d)^2,
+    con d <= k/2. Devuelve (observaciones a descartar, en_limite); en_limite
+    indica que el mínimo quedó en k/2, es decir, la corrida es demasiado corta
+    para que el calentamiento se detecte con confianza.
+    """
+    x = np.asarray(valores, dtype=float)
+    k = len(x) // m
+    if k < 2:
+        return 0, False
+    z = x[:k * m].reshape(k, m).mean(axis=1)
+    # Sumas de las colas z_d..z_k para todos los d a la vez
+    suma = np.cumsum(z[::-1])[::-1]
+    suma2 = np.cumsum(z[::-1] ** 2)[::-1]
+    restantes = np.arange(k, 0, -1)
+    estadistico = (suma2 - suma ** 2 / restantes) / restantes ** 2
+    limite = k // 2
+    d = int(np.argmin(estadistico[:limite + 1]))
+    return d * m, d == limite
+
+
+def medias_por_lotes(valores, n_lotes=20, nivel=0.95):
+    """
+    Intervalo de confianza t por medias de lotes no traslapados. Si la serie
+    no se divide exacto, se descartan las observaciones sobrantes del inicio
+    (las más cercanas al calentamiento). Devuelve un diccionario con las
+    columnas de replications.intervalos_confianza (n = número de lotes),
+    'tamano_lote' y 'autocorrelacion_lag1' de las medias.
+    """
+    x = np.asarray(valores, dtype=float)
+    tamano = len(x) // n_lotes
+    if n_lotes < 2 or tamano == 0:
+        nan = float('nan')
+        return {'n': 0, 'tamano_lote': tamano, 'media': nan, 'desv_estandar': nan,
+                'semi_ancho': nan, 'limite_inferior': nan, 'limite_superior': nan,
+                'autocorrelacion_lag1': nan}
+    medias = x[len(x) - n_lotes * tamano:].reshape(n_lotes, tamano).mean(axis=1)
+    media = medias.mean()
+    desv = medias.std(ddof=1)
+    semi_ancho = cuantil_t(0.5 + nivel/2, n_lotes - 1) * desv / np.sqrt(n_lotes)
+    centradas = medias - media
+    varianza = (centradas ** 2).sum()
+    autocorrelacion = (centradas[:-1] * centradas[1:]).sum() / varianza if varianza > 0 else float('nan')
+    return {
+        'n': n_lotes,
+        'tamano_lote': tamano,
+        'media': media,
+        'desv_estandar': desv,
+        'semi_ancho': semi_ancho,
+        'limite_inferior': media - semi_ancho,
+        'limite_superior': media + semi_ancho,
+        'autocorrelacion_lag1': autocorrelacion,
+    }
+
+
+def series_simulacion(tabla, df_ocupacion):
+    """
+    Series de SERIES como nombre -> (tiempos, valores), en orden de tiempo:
+    - 'espera_min': espera de cada pasajero que subió (tabla: TablaPasajeros),
+      en el instante en que sube;
+    - 'ocupacion': ocupación (%) de cada bus al salir de cada parada
+      (df_ocupacion con columnas 'tiempo' y 'ocupacion').
+    """
+    llegada = np.frombuffer(tabla.llegada, dtype=np.float64)
+    abordaje = np.frombuffer(tabla.abordaje, dtype=np.float64)
+    subieron = ~np.isnan(abordaje)
+    orden = np.argsort(abordaje[subieron], kind='stable')
+    tiempos_espera = abordaje[subieron][orden]
+    esperas = (abordaje[subieron] - llegada[subieron])[orden] / 60
+
+    orden = np.argsort(df_ocupacion['tiempo'].to_numpy(), kind='stable')
+    return {
+        'espera_min': (tiempos_espera, esperas),
+        'ocupacion': (df_ocupacion['tiempo'].to_numpy(dtype=float)[orden],
+                      df_ocupacion['ocupacion'].to_numpy(dtype=float)[orden]),
+    }
+
+
+def analizar_estado_estacionario(series, n_lotes=20, nivel=0.95, m=5):
+    """
+    Descarta el calentamiento de cada serie (mser) y calcula su intervalo por
+    medias de lotes (medias_por_lotes). series: nombre -> (tiempos, valores)
+    ordenados por tiempo, como los de series_simulacion.
+
+    Devuelve un DataFrame indexado por serie con 'descartadas' (observaciones),
+    'fin_calentamiento_h' (instante de la primera observación conservada),
+    'calentamiento_en_limite' y las columnas de medias_por_lotes.
+    """
+    filas = []
+    for nombre, (tiempos, valores) in series.items():
+        descartadas, en_limite = mser(valores, m)
+        fila = {
+            'serie': nombre,
+            'descartadas': descartadas,
+            'fin_calentamiento_h': tiempos[descartadas] / 3600 if descartadas < len(tiempos) else float('nan'),
+            'calentamiento_en_limite': en_limite,
+        }
+        fila.update(medias_por_lotes(valores[descartadas:], n_lotes, nivel))
+        filas.append(fila)
+    return pd.DataFrame(filas).set_index('serie')
+
+
+def run_estacionario(config, semilla=42, n_lotes=20, nivel=0.95, m=5):
+    """
+    Ejecuta una corrida larga del escenario y devuelve el análisis de
+    analizar_estado_estacionario. Sólo se conserva en memoria la tabla de
+    ocupación; las esperas salen de la tabla de pasajeros.
+    """
+    registro = RegistroMemoria(tablas=['ocupacion'])
+    resultado = simular(config, semilla, registro=registro)
+    series = series_simulacion(resultado['tabla'], registro.a_dataframe('ocupacion'))
+    return analizar_estado_estacionario(series, n_lotes, nivel, m)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Corrida larga con calentamiento (MSER-5) y medias de lotes.")
+    parser.add_argument('--escenario', choices=ESCENARIOS, default='base')
+    parser.add_argument('--servicio', default='80J')
+    parser.add_argument('--dias', type=float, default=60)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--lotes', type=int, default=20)
+    parser.add_argument('--nivel', type=float, default=0.95)
+    parser.add_argument('--modo-detencion', choices=['pasajero', 'lote'], default='lote')
+    parser.add_argument('--modo-llegadas', choices=['proceso', 'vectorizado'], default='vectorizado')
+    parser.add_argument('--salidas', choices=['fijo', 'pot'], default='fijo')
+    parser.add_argument('--aleatorio', choices=MODOS_ALEATORIOS, default='por_entidad')
+    args = parser.parse_args()
+
+    serv = cargar_servicio(args.servicio)
+    frecuencias = cargar_frecuencias(args.servicio) if args.salidas == 'pot' else None
+    config = construir_configuracion(serv, args.escenario, tiempo_simulacion=args.dias * 24 * 3600,
+                                     modo_detencion=args.modo_detencion, modo_llegadas=args.modo_llegadas,
+                                     frecuencias=frecuencias, modo_aleatorio=args.aleatorio)
+    df_resumen = run_estacionario(config, args.semilla, args.lotes, args.nivel)
+
+    os.makedirs(f"escenarios/{args.escenario}", exist_ok=True)
+    df_resumen.to_csv(f"escenarios/{args.escenario}/estacionario_resumen.csv")
+
+    print(f"Escenario: {args.escenario} - una corrida de {args.dias:g} días, {args.lotes} lotes")
+    print(f"Intervalos de confianza por medias de lotes ({args.nivel:.0%}):")
+    print(df_resumen.to_string())
+    if df_resumen['calentamiento_en_limite'].any():
+        print("Aviso: el calentamiento llegó al límite de MSER (mitad de la serie); alargar la corrida.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from replications import generar_semillas, intervalos_confianza
+from simulation import (KPIS, MODOS_ALEATORIOS, cargar_frecuencias, cargar_servicio,
+                        construir_configuracion, run_replication)
+
+# ----------------------------------------------------------
+# BARRIDO DE PARÁMETROS (DISEÑO DE EXPERIMENTOS)
+#
+# En vez de editar main.py y volver a correrlo por cada combinación, se
+# define un diseño (grilla completa o hipercubo latino) sobre PARAMETROS y se
+# ejecutan todas las réplicas de todos los puntos en un solo
+# ProcessPoolExecutor. Los datos (servicio, frecuencias del POT) se leen una
+# vez; a los procesos sólo viaja el diccionario de configuración de cada punto.
+#
+# Uso:
+#   python sweep.py --grilla capacidad_bus=40,50,60 frecuencia_buses_hr=4,6,8 --replicas 10
+#   python sweep.py --lhs 30 --rango capacidad_bus=40:80 base_tasa=0.008:0.02 variante=base,ruta_alternativa
+# ----------------------------------------------------------
+
+# Parámetro -> tipo. 'variante' es la ruta: 'base' o 'ruta_alternativa'.
+PARAMETROS = {
+    'capacidad_bus': int,
+    'frecuencia_buses_hr': float,
+    'buses_adicionales_punta': int,
+    'buses_adicionales_no_punta': int,
+    'tiempo_subida': float,
+    'base_tasa': float,
+    'variante': str,
+}
+VARIANTES = ['base', 'ruta_alternativa']
+
+
+def _validar(nombres):
+    desconocidos = set(nombres) - set(PARAMETROS)
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {sorted(desconocidos)}. Opciones: {list(PARAMETROS)}")
+
+
+def diseno_grilla(niveles):
+    """
+    Grilla completa: niveles es un dict parámetro -> lista de valores.
+    Devuelve un DataFrame con una fila por combinación.
+    """
+    _validar(niveles)
+    combinaciones = list(itertools.product(*niveles.values()))
+    return pd.DataFrame(combinaciones, columns=list(niveles))
+
+
+def diseno_lhs(rangos, n_puntos, semilla=42):
+    """
+    Hipercubo latino de n_puntos: rangos es un dict parámetro -> (mínimo,
+    máximo) para parámetros numéricos o lista de valores para categóricos
+    (p. ej. variante). Cada parámetro cubre sus n_puntos estratos una vez;
+    los enteros se redondean.
+    """
+    _validar(rangos)
+    rng = np.random.default_rng(semilla)
+    columnas = {}
+    for nombre, rango in rangos.items():
+        u = (rng.permutation(n_puntos) + rng.random(n_puntos)) / n_puntos
+        if isinstance(rango, tuple):
+            minimo, maximo = rango
+            valores = minimo + u * (maximo - minimo)
+            if PARAMETROS[nombre] is int:
+                valores = np.rint(valores).astype(int)
+            columnas[nombre] = valores
+        else:
+            columnas[nombre] = np.asarray(rango, dtype=object)[(u * len(rango)).astype(int)]
+    return pd.DataFrame(columnas)
+
+
+def configuracion_punto(serv, punto, **parametros_base):
+    """
+    Configuración de un punto del diseño (dict parámetro -> valor) sobre
+    parametros_base (argumentos de construir_configuracion).
+
+    La variante de ruta no agrega buses por sí sola (a diferencia del
+    escenario 'ruta_alternativa' de main.py): los buses adicionales son 0
+    salvo que el punto fije buses_adicionales_punta / buses_adicionales_no_punta.
+    Con las frecuencias del POT (parametros_base['frecuencias']) las salidas
+    siguen el horario del POT y frecuencia_buses_hr no se puede barrer.
+    """
+    if 'frecuencia_buses_hr' in punto and parametros_base.get('frecuencias') is not None:
+        raise ValueError("frecuencia_buses_hr no tiene efecto con las frecuencias del POT "
+                         "(--salidas pot): las salidas siguen el horario del POT")
+    punto = {k: PARAMETROS[k](v) for k, v in punto.items()}
+    variante = punto.pop('variante', 'base')
+    if variante not in VARIANTES:
+        raise ValueError(f"Variante desconocida: {variante}. Opciones: {VARIANTES}")
+    adicionales_punta = punto.pop('buses_adicionales_punta', 0)
+    adicionales_no_punta = punto.pop('buses_adicionales_no_punta', 0)
+
+    config = construir_configuracion(serv, escenario=variante, **{**parametros_base, **punto})
+    config['buses_adicionales_punta'] = adicionales_punta
+    config['buses_adicionales_no_punta'] = adicionales_no_punta
+    return config
+
+
+def run_sweep(serv, diseno, n_replicas=5, semilla_base=42, max_workers=None, nivel=0.95,
+              **parametros_base):
+    """
+    Ejecuta n_replicas de cada punto del diseño en paralelo.
+
+    Todos los puntos usan las mismas semillas; con modo_aleatorio='por_entidad'
+    en parametros_base (el valor del CLI) cada parada y cada bus reciben los
+    mismos números en todos los puntos (números aleatorios comunes), de modo
+    que las diferencias entre puntos no se confunden con el azar de las réplicas.
+
+    Devuelve (df_replicas, df_resumen): una fila por punto y réplica, y la
+    tabla consolidada con una fila por punto (parámetros, y media y
+    semi-ancho del intervalo de confianza de cada KPI).
+    """
+    semillas = generar_semillas(n_replicas, semilla_base)
+    puntos = diseno.to_dict('records')
+    configs = [configuracion_punto(serv, punto, **parametros_base) for punto in puntos]
+
+    tareas = [(i, r) for i in range(len(puntos)) for r in range(n_replicas)]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunksize = max(1, len(tareas) // (4 * max_workers))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        resultados = list(executor.map(run_replication,
+                                       [configs[i] for i, _ in tareas],
+                                       [semillas[r] for _, r in tareas],
+                                       chunksize=chunksize))
+
+    filas = []
+    for (i, r), kpis in zip(tareas, resultados):
+        filas.append({'punto': i, **puntos[i], 'replica': r, **kpis})
+    df_replicas = pd.DataFrame(filas)
+
+    resumen = []
+    for i, punto in enumerate(puntos):
+        ic = intervalos_confianza(df_replicas[df_replicas['punto'] == i], KPIS, nivel)
+        fila = {'punto': i, **punto, 'replicas': n_replicas}
+        for kpi in KPIS:
+            fila[f'{kpi}_media'] = ic.loc[kpi, 'media']
+            fila[f'{kpi}_semi_ancho'] = ic.loc[kpi, 'semi_ancho']
+        resumen.append(fila)
+    return df_replicas, pd.DataFrame(resumen)
+
+
+def _leer_asignaciones(textos, rango):
+    """'nombre=a,b,c' -> lista de valores; con rango=True, 'nombre=min:max' -> tupla."""
+    resultado = {}
+    for texto in textos:
+        nombre, _, valores = texto.partition('=')
+        _validar([nombre])
+        tipo = PARAMETROS[nombre]
+        if rango and ':' in valores:
+            minimo, maximo = valores.split(':')
+            resultado[nombre] = (float(minimo), float(maximo))
+        else:
+            resultado[nombre] = [tipo(v) for v in valores.split(',')]
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Barrido de parámetros de la simulación en paralelo.")
+    diseno = parser.add_mutually_exclusive_group(required=True)
+    diseno.add_argument('--grilla', nargs='+', metavar='PARAM=V1,V2,...',
+                        help=f"grilla completa sobre {list(PARAMETROS)}")
+    diseno.add_argument('--lhs', type=int, metavar='N', help="hipercubo latino de N puntos (ver --rango)")
+    parser.add_argument('--rango', nargs='+', default=[], metavar='PARAM=MIN:MAX|V1,V2',
+                        help="rangos del hipercubo latino")
+    parser.add_argument('--servicio', default='80J')
+    parser.add_argument('--replicas', type=int, default=5)
+    parser.add_argument('--dias', type=float, default=7)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--nivel', type=float, default=0.95)
+    parser.add_argument('--modo-detencion', choices=['pasajero', 'lote'], default='lote')
+    parser.add_argument('--modo-llegadas', choices=['proceso', 'vectorizado'], default='vectorizado')
+    parser.add_argument('--salidas', choices=['fijo', 'pot'], default='fijo')
+    parser.add_argument('--aleatorio', choices=MODOS_ALEATORIOS, default='por_entidad')
+    parser.add_argument('--directorio', default='escenarios/barrido')
+    args = parser.parse_args()
+
+    if args.grilla:
+        df_diseno = diseno_grilla(_leer_asignaciones(args.grilla, rango=False))
+    else:
+        df_diseno = diseno_lhs(_leer_asignaciones(args.rango, rango=True), args.lhs, args.semilla)
+
+    serv = cargar_servicio(args.servicio)
+    frecuencias = cargar_frecuencias(args.servicio) if args.salidas == 'pot' else None
+    df_replicas, df_resumen = run_sweep(
+        serv, df_diseno, args.replicas, args.semilla, args.workers, args.nivel,
+        tiempo_simulacion=args.dias * 24 * 3600, modo_detencion=args.modo_detencion,
+        modo_llegadas=args.modo_llegadas, frecuencias=frecuencias, modo_aleatorio=args.aleatorio)
+
+    os.makedirs(args.directorio, exist_ok=True)
+    df_replicas.to_csv(os.path.join(args.directorio, 'barrido_replicas.csv'), index=False)
+    df_resumen.to_csv(os.path.join(args.directorio, 'barrido_resumen.csv'), index=False)
+
+    print(f"Barrido: {len(df_diseno)} puntos x {args.replicas} réplicas")
+    print(df_resumen.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
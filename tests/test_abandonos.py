@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pytest
+import simpy
+
+from entities import Bus, ColaParada, Parada, TablaPasajeros
+from event_log import RegistroMemoria
+
+TOLERANCIA = 300.0
+HORIZONTE = 3600
+
+
+class PacienciaFija:
+    """Todos los pasajeros toleran TOLERANCIA segundos."""
+    def muestrear(self, rng, n=None):
+        return TOLERANCIA if n is None else np.full(n, TOLERANCIA)
+
+
+def correr_linea(modo_detencion, modo_llegadas, buses_por_salida):
+    """
+    Línea A -> B con llegadas de Poisson a A (20 por minuto) y buses de
+    capacidad 3 cada 2 minutos, varios por salida (se detienen a la vez en A).
+    """
+    env = simpy.Environment()
+    tabla = TablaPasajeros()
+    demanda = {'A': {'llegada': 1 / 3, 'destinos': ['B']}, 'B': {'llegada': 0, 'destinos': []}}
+    paradas = {nombre: Parada(env, nombre, demanda, modo_llegadas=modo_llegadas,
+                              rng=np.random.default_rng(1), tabla=tabla, paciencia=PacienciaFija())
+               for nombre in demanda}
+    registro = RegistroMemoria()
+    ruta = [{'nombre': 'A', 'tiempo_hasta_siguiente': 100}, {'nombre': 'B', 'tiempo_hasta_siguiente': 0}]
+    id_bus = 0
+    for salida in range(60, HORIZONTE, 120):
+        for _ in range(buses_por_salida):
+            Bus(env, id_bus, ruta, 3, salida, paradas, [], modo_detencion=modo_detencion,
+                tabla=tabla, registro=registro, rng=np.random.default_rng(id_bus))
+            id_bus += 1
+    env.run(until=HORIZONTE)
+    # Cierre como en simulation.simular
+    origen = paradas['A']
+    origen.cerrar_tandas(HORIZONTE)
+    origen.actualizar(HORIZONTE)
+    return origen, tabla, origen.cerrar(), registro.a_dataframe('subidas')
+
+
+@pytest.mark.parametrize('buses_por_salida', [1, 2])
+@pytest.mark.parametrize('modo_llegadas', ['proceso', 'vectorizado'])
+@pytest.mark.parametrize('modo_detencion', ['pasajero', 'lote'])
+def test_abandona_una_vez_y_no_sube(modo_detencion, modo_llegadas, buses_por_salida):
+    origen, tabla, en_espera, subidas = correr_linea(modo_detencion, modo_llegadas, buses_por_salida)
+    llegada = np.frombuffer(tabla.llegada)
+    abordaje = np.frombuffer(tabla.abordaje)
+    subieron = ~np.isnan(abordaje)
+    esperando = np.zeros(len(tabla), dtype=bool)
+    esperando[en_espera] = True
+    abandonaron = ~subieron & ~esperando
+
+    assert origen.abandonos > 0 and subieron.any()
+    # Cada pasajero termina en un solo estado, y cada abandono se cuenta una vez
+    assert not (subieron & esperando).any()
+    assert origen.abandonos == abandonaron.sum()
+    assert sum(origen.abandonos_hora) == origen.abandonos
+    # Quien abandonó agotó su paciencia antes del final y nunca subió después
+    assert (llegada[abandonaron] + TOLERANCIA <= HORIZONTE).all()
+    assert not np.isin(subidas['pasajero_id'], np.flatnonzero(abandonaron)).any()
+    # Quien subió lo hizo antes de agotar su paciencia; quien espera aún la tiene
+    assert (abordaje[subieron] < llegada[subieron] + TOLERANCIA).all()
+    assert (llegada[esperando] + TOLERANCIA > HORIZONTE).all()
+    # Cada pasajero sube a lo más una vez
+    assert subidas['pasajero_id'].is_unique
+    assert len(subidas) <= subieron.sum()
+
+
+def test_modos_de_detencion_abandonan_a_los_mismos():
+    # Con un bus por salida ningún bus llega durante la tanda de otro
+    resultados = [correr_linea(modo, 'vectorizado', 1) for modo in ('pasajero', 'lote')]
+    (origen_p, tabla_p, espera_p, _), (origen_l, tabla_l, espera_l, _) = resultados
+    assert origen_l.tandas_compartidas == 0
+    assert origen_p.abandonos == origen_l.abandonos
+    assert espera_p == espera_l
+    np.testing.assert_array_equal(np.frombuffer(tabla_p.abordaje), np.frombuffer(tabla_l.abordaje))
+
+
+def test_tandas_compartidas_con_buses_simultaneos():
+    origen, _, _, _ = correr_linea('lote', 'vectorizado', 2)
+    assert origen.tandas_compartidas > 0
+    origen, _, _, _ = correr_linea('pasajero', 'vectorizado', 2)
+    assert origen.tandas_compartidas == 0
+
+
+def test_cola_abandonar_saca_al_pasajero_una_vez():
+    cola = ColaParada()
+    cola.extender(range(6))
+    cola.abandonar(1)
+    cola.abandonar(4)
+    assert len(cola) == 4
+    assert list(cola) == [0, 2, 3, 5]
+    assert cola.tomar(3) == [0, 2, 3]
+    # La mitad marcada compacta la cola sin volver a contar a nadie
+    cola.extender([6, 7])
+    cola.abandonar(6)
+    cola.abandonar(7)
+    assert len(cola) == 1
+    assert cola.tomar_uno() == 5
+    assert not cola and cola.tomar(2) == []
@@ -0,0 +1,22 @@
+from benchmarks import comparar
+
+
+def resultados(**segundos):
+    return {'casos': {nombre: {'segundos_min': s, 'rss_max_mb': 100.0} for nombre, s in segundos.items()}}
+
+
+def test_comparar_marca_regresiones_y_mejoras():
+    actual = resultados(a=1.5, b=0.5, c=1.0, solo_actual=1.0)
+    referencia = resultados(a=1.0, b=1.0, c=1.0, solo_referencia=1.0)
+    df = comparar(actual, referencia, umbral=0.10).set_index('caso')
+    assert list(df.index) == ['a', 'b', 'c']
+    assert list(df['estado']) == ['regresion', 'mejora', '']
+    assert list(df['rss_razon']) == [1.0, 1.0, 1.0]
+
+
+def test_comparar_sin_casos_comunes():
+    actual = {'casos': {'parseo/pot': {'segundos_min': 1.0}}}
+    referencia = {'casos': {'simulacion/80J/base/1d': {'segundos_min': 2.0}}}
+    df = comparar(actual, referencia)
+    assert df.empty
+    assert not (df['estado'] == 'regresion').any()
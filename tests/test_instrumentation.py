@@ -0,0 +1,41 @@
+import io
+
+import simpy
+
+import instrumentation
+from instrumentation import Instrumentacion
+
+
+def reloj(env):
+    for _ in range(5):
+        yield env.timeout(10)
+
+
+def correr(hasta):
+    env = simpy.Environment()
+    env.process(reloj(env))
+    instr = Instrumentacion(20, salida=io.StringIO())
+    instr.ejecutar(env, hasta)
+    return env, instr
+
+
+def test_equivale_a_run_until():
+    env, instr = correr(35)
+    referencia = simpy.Environment()
+    referencia.process(reloj(referencia))
+    referencia.run(until=35)
+    assert env.now == referencia.now == 35
+    assert env.peek() == referencia.peek()
+    assert instr.eventos == 4
+    assert sum(instr.eventos_por_categoria.values()) == instr.eventos
+    assert instr.cola_maxima >= 1
+
+
+def test_sin_cola_de_eventos_sigue_corriendo(monkeypatch):
+    monkeypatch.setattr(instrumentation, '_cola_eventos', lambda env: None)
+    env, instr = correr(35)
+    assert env.now == 35
+    assert instr.eventos == 4
+    assert not instr.contar_eventos
+    assert instr.cola_maxima == 0
+    assert 'cola ?' in instr.salida.getvalue()
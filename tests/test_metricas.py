@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from metrics import CuantilP2, Histograma, Welford
+
+
+@pytest.mark.parametrize('p', [0.25, 0.5, 0.75, 0.95])
+@pytest.mark.parametrize('distribucion', ['normal', 'exponential', 'uniform'])
+def test_p2_aproxima_cuantil_exacto(p, distribucion):
+    muestra = getattr(np.random.default_rng(7), distribucion)(size=20000)
+    cuantil = CuantilP2(p)
+    for x in muestra.tolist():
+        cuantil.agregar(x)
+    rango = np.quantile(muestra, 0.99) - np.quantile(muestra, 0.01)
+    assert abs(cuantil.valor() - np.quantile(muestra, p)) < 0.01 * rango
+
+
+def test_p2_exacto_con_menos_de_cinco():
+    cuantil = CuantilP2(0.5)
+    assert np.isnan(cuantil.valor())
+    for x in [4.0, 1.0, 3.0, 2.0]:
+        cuantil.agregar(x)
+    assert cuantil.valor() == np.percentile([4.0, 1.0, 3.0, 2.0], 50)
+
+
+def test_p2_secuencia_ordenada():
+    cuantil = CuantilP2(0.5)
+    for x in range(1001):
+        cuantil.agregar(float(x))
+    assert cuantil.valor() == pytest.approx(500, abs=5)
+
+
+def test_histograma_coincide_con_numpy():
+    muestra = np.random.default_rng(3).exponential(2.0, 5000)
+    histograma = Histograma(0.5)
+    for x in muestra.tolist():
+        histograma.agregar(x)
+    bordes = histograma.bordes()
+    assert bordes[0] == 0 and bordes[-1] > muestra.max()
+    np.testing.assert_array_equal(histograma.conteos, np.histogram(muestra, bordes)[0])
+    assert histograma.conteos.sum() == len(muestra)
+
+
+def test_histograma_intervalos_cerrados_a_la_izquierda():
+    histograma = Histograma(0.5)
+    for x in [0.0, 0.49, 0.5, 1.0, 1.0]:
+        histograma.agregar(x)
+    np.testing.assert_array_equal(histograma.conteos, [2, 1, 2])
+    np.testing.assert_array_equal(histograma.bordes(), [0.0, 0.5, 1.0, 1.5])
+
+
+def test_welford_coincide_con_numpy():
+    muestra = np.random.default_rng(11).normal(5, 2, 1000)
+    welford = Welford()
+    for x in muestra.tolist():
+        welford.agregar(x)
+    assert welford.n == len(muestra)
+    assert welford.media == pytest.approx(muestra.mean())
+    assert welford.varianza == pytest.approx(muestra.var(ddof=1))
+    assert (welford.minimo, welford.maximo) == (muestra.min(), muestra.max())
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import simpy
+
+from entities import Bus, ColaParada, Parada, TablaPasajeros
+
+
+def correr_linea(modo_detencion, llegadas, salidas, capacidad=1):
+    """
+    Línea A -> B sin llegadas aleatorias: los pasajeros de 'llegadas' (s)
+    esperan en A y un bus de 'capacidad' sale de A en cada instante de 'salidas'.
+    """
+    env = simpy.Environment()
+    tabla = TablaPasajeros()
+    demanda = {'A': {'llegada': 0, 'destinos': ['B']}, 'B': {'llegada': 0, 'destinos': []}}
+    paradas = {nombre: Parada(env, nombre, demanda, tabla=tabla) for nombre in demanda}
+    origen, destino = paradas['A'], paradas['B']
+
+    def llegar():
+        for llegada in llegadas:
+            yield env.timeout(llegada - env.now)
+            origen.colas[destino.indice].agregar(tabla.agregar(origen.indice, destino.indice, env.now))
+    env.process(llegar())
+
+    ruta = [{'nombre': 'A', 'tiempo_hasta_siguiente': 100}, {'nombre': 'B', 'tiempo_hasta_siguiente': 0}]
+    esperas = []
+    for id_bus, salida in enumerate(salidas):
+        Bus(env, id_bus, ruta, capacidad, salida, paradas, esperas,
+            modo_detencion=modo_detencion, rng=np.random.default_rng(id_bus))
+    env.run(until=1000)
+    en_espera = origen.cerrar()
+    return origen, tabla, en_espera, esperas
+
+
+@pytest.mark.parametrize('modo_detencion', ['pasajero', 'lote'])
+def test_dos_buses_de_capacidad_uno(modo_detencion):
+    origen, tabla, en_espera, esperas = correr_linea(modo_detencion, [0, 1, 2], [10, 20])
+    # El bus 0 sube a p0 y deja a p1 y p2; el bus 1 sube a p1 y deja a p2
+    assert origen.rechazos == 3
+    assert origen.pasajeros_no_atendidos == 2
+    assert list(tabla.buses_perdidos) == [0, 1, 2]
+    assert en_espera == [2]
+    assert esperas == [10, 19]
+
+
+@pytest.mark.parametrize('modo_detencion', ['pasajero', 'lote'])
+def test_llegadas_despues_de_un_bus_lleno_son_nuevas(modo_detencion):
+    origen, tabla, en_espera, _ = correr_linea(modo_detencion, [0, 1, 2, 15], [10, 20])
+    # El bus 0 deja a p1 y p2; p3 llega entre ambos buses y el bus 1 (que sube
+    # a p1) deja otra vez a p2 y por primera vez a p3
+    assert origen.rechazos == 4
+    assert origen.pasajeros_no_atendidos == 3
+    assert list(tabla.buses_perdidos) == [0, 1, 2, 1]
+    assert en_espera == [2, 3]
+
+
+@pytest.mark.parametrize('modo_detencion', ['pasajero', 'lote'])
+def test_sin_rechazos_si_cabe_todo(modo_detencion):
+    origen, tabla, en_espera, _ = correr_linea(modo_detencion, [0, 1, 2], [10, 20], capacidad=5)
+    assert origen.rechazos == 0
+    assert origen.pasajeros_no_atendidos == 0
+    assert list(tabla.buses_perdidos) == [0, 0, 0]
+    assert en_espera == []
+
+
+def test_cola_dejar_cuenta_cada_pasajero_una_vez_como_nuevo():
+    perdidos = TablaPasajeros().buses_perdidos
+    perdidos.extend([0] * 4)
+    cola = ColaParada(perdidos)
+    cola.extender([0, 1])
+    assert cola.dejar() == (2, 2)
+    cola.agregar(2)
+    assert cola.dejar() == (3, 1)
+    assert cola.tomar(1) == [0]
+    cola.agregar(3)
+    assert cola.dejar() == (3, 1)
+    assert cola.cerrar() == [1, 2, 3]
+    assert list(perdidos) == [2, 3, 2, 1]
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import simpy
+
+from entities import Bus, Parada, TablaPasajeros
+from results_io import crear_registro, leer_tabla
+
+pytest.importorskip('pyarrow')
+
+
+def correr_a_disco(directorio, formato, modo_detencion):
+    """Dos paradas de origen con llegadas vectorizadas hacia una final; un bus por minuto."""
+    env = simpy.Environment()
+    tabla = TablaPasajeros()
+    demanda = {'A': {'llegada': 0.05, 'destinos': ['C']}, 'B': {'llegada': 0.05, 'destinos': ['C']},
+               'C': {'llegada': 0, 'destinos': []}}
+    paradas = {nombre: Parada(env, nombre, demanda, modo_llegadas='vectorizado',
+                              rng=np.random.default_rng(i), tabla=tabla)
+               for i, nombre in enumerate(demanda)}
+    registro = crear_registro(formato, str(directorio), tamano_bloque=64, tabla_pasajeros=tabla)
+    ruta = [{'nombre': 'A', 'tiempo_hasta_siguiente': 100}, {'nombre': 'B', 'tiempo_hasta_siguiente': 100},
+            {'nombre': 'C', 'tiempo_hasta_siguiente': 0}]
+    for id_bus, salida in enumerate(range(60, 3600, 60)):
+        Bus(env, id_bus, ruta, 10, salida, paradas, [], modo_detencion=modo_detencion,
+            tabla=tabla, registro=registro, rng=np.random.default_rng(100 + id_bus))
+    env.run(until=3600)
+    registro.cerrar()
+    return tabla
+
+
+@pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+def test_clave_estable_entre_modos_de_detencion(tmp_path, formato):
+    subidas = {}
+    for modo in ('pasajero', 'lote'):
+        tabla = correr_a_disco(tmp_path / modo, formato, modo)
+        df = leer_tabla(tmp_path / modo, 'subidas', formato)
+        # La clave estable apunta al mismo pasajero que pasajero_id dentro de la corrida
+        ids = df['pasajero_id'].to_numpy()
+        assert (df['origen'].astype(str).to_numpy()
+                == np.asarray(tabla.nombres_paradas)[np.asarray(tabla.origen)[ids]]).all()
+        assert (df['correlativo'].to_numpy() == np.asarray(tabla.correlativo)[ids]).all()
+        subidas[modo] = df
+    # Con varios buses en ruta las paradas se materializan en otro orden y
+    # pasajero_id cambia entre modos; la clave (origen, correlativo) no
+    assert (subidas['pasajero'].sort_values('tiempo')['pasajero_id'].to_numpy()
+            != subidas['lote'].sort_values('tiempo')['pasajero_id'].to_numpy()).any()
+    columnas = ['bus_id', 'tiempo', 'origen', 'correlativo']
+    claves = [df[columnas].astype({'origen': str}).sort_values(columnas).reset_index(drop=True)
+              for df in subidas.values()]
+    assert len(claves[0]) > 0
+    assert claves[0].equals(claves[1])
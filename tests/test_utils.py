@@ -0,0 +1,27 @@
+import pytest
+
+from utils import cuantil_t
+
+# Valores de tabla de la t de Student
+TABLA_T = {
+    (0.975, 1): 12.706204736175,
+    (0.975, 2): 4.302652729696,
+    (0.995, 3): 5.840909309733,
+    (0.995, 4): 4.604094871350,
+    (0.975, 3): 3.182446305284,
+    (0.975, 4): 2.776445105198,
+    (0.95, 5): 2.015048373333,
+    (0.975, 9): 2.262157162799,
+    (0.995, 29): 2.756385903670,
+    (0.975, 99): 1.984216951582,
+}
+
+
+@pytest.mark.parametrize('p, gl', list(TABLA_T))
+def test_cuantil_t_coincide_con_tabla(p, gl):
+    assert cuantil_t(p, gl) == pytest.approx(TABLA_T[p, gl], rel=1e-9)
+
+
+def test_cuantil_t_simetrico():
+    assert cuantil_t(0.025, 3) == pytest.approx(-cuantil_t(0.975, 3), rel=1e-12)
+    assert cuantil_t(0.5, 4) == pytest.approx(0.0, abs=1e-12)
@@ -0,0 +1,170 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from utils import es_horario_punta
+
+# ----------------------------------------------------------
+# TIEMPOS DE VIAJE POR TRAMO
+#
+# El modelo original de Bus sortea cada tramo por separado (base * U(0.8, 1.2)
+# y, con probabilidad 0.1, un retraso exponencial de media 60 s), igual a
+# cualquier hora. ModeloViaje es una estrategia que se entrega a Bus
+# (modelo_viaje= en construir_configuracion) con distribuciones precalculadas
+# del factor tiempo real / tiempo base por tramo y franja horaria:
+# - ModeloViaje.parametrico(...): por franja, factor lognormal (congestión)
+#   más un retraso ocasional exponencial (incidentes); por defecto 'punta'
+#   más lenta y variable que 'valle', que reproduce la media del modelo original.
+# - ModeloViaje.desde_observaciones(df): cuantiles empíricos de tiempos
+#   observados (p. ej. GPS) por tramo y franja.
+# Cada distribución se guarda como una grilla de cuantiles; un bus sortea todos
+# sus tramos de una vez al salir (un vector de uniformes e interpolación en la
+# grilla), ubicando cada tramo en la franja de su hora programada.
+#
+# Uso:
+#   modelo = ModeloViaje.parametrico(franjas_punta(HORARIOS_PUNTA))
+#   config = construir_configuracion(serv, modelo_viaje=modelo)
+# ----------------------------------------------------------
+
+N_CUANTILES = 201
+# Factor tiempo real / tiempo base por franja: media y coeficiente de variación
+# de la parte lognormal, probabilidad y media (s) del retraso por incidente
+PARAMETROS_FRANJA = {
+    'valle': {'media': 1.0, 'cv': 0.12, 'p_retraso': 0.1, 'retraso_medio': 60},
+    'punta': {'media': 1.2, 'cv': 0.2, 'p_retraso': 0.2, 'retraso_medio': 120},
+}
+
+
+def franjas_punta(horarios_punta):
+    """Franja de cada hora del día: 'punta' si la hora empieza en horario punta, si no 'valle'."""
+    return ['punta' if es_horario_punta(hora * 3600, horarios_punta) else 'valle' for hora in range(24)]
+
+
+class ModeloViaje:
+    """
+    Tiempos de viaje por tramo y franja horaria a partir de grillas de cuantiles.
+
+    cuantiles: dict (tramo, franja) -> cuantiles del factor tiempo real / tiempo
+    base en las probabilidades (k + 0.5) / n, k = 0..n-1; tramo None vale para todos
+    los tramos sin distribución propia. retrasos: dict (tramo, franja) ->
+    cuantiles del retraso aditivo (s), independiente del largo del tramo (opcional).
+    franja_hora: franja de cada hora del día (24) o de la semana (168, t=0 es
+    la hora 0 del primer día). El tramo es el nombre de su parada de inicio.
+    """
+    def __init__(self, cuantiles, franja_hora, retrasos=None):
+        self.franja_hora = list(franja_hora)
+        self.franjas = sorted(set(self.franja_hora))
+        claves = sorted(cuantiles, key=lambda c: (c[0] is not None, str(c[0]), c[1]))
+        self._fila = {clave: i for i, clave in enumerate(claves)}
+        self._factores = np.array([cuantiles[c] for c in claves], dtype=float)
+        retrasos = retrasos or {}
+        n = self._factores.shape[1]
+        self._retrasos = np.array([retrasos.get(c, np.zeros(n)) for c in claves], dtype=float)
+        self._factores_lista = self._factores.tolist()
+        self._retrasos_lista = self._retrasos.tolist()
+        self._cache_rutas = {}
+        faltantes = [f for f in self.franjas if (None, f) not in self._fila]
+        if faltantes:
+            raise ValueError(f"Faltan distribuciones generales (tramo None) para las franjas {faltantes}")
+
+    @classmethod
+    def parametrico(cls, franja_hora, parametros=None, n_cuantiles=N_CUANTILES):
+        """
+        Un factor lognormal (media, cv) y un retraso exponencial que ocurre con
+        probabilidad p_retraso por franja (PARAMETROS_FRANJA), iguales en todos los tramos.
+        """
+        parametros = PARAMETROS_FRANJA if parametros is None else parametros
+        probabilidades = _probabilidades(n_cuantiles)
+        cuantiles, retrasos = {}, {}
+        for franja in set(franja_hora):
+            p = parametros[franja]
+            sigma = np.sqrt(np.log1p(p['cv'] ** 2))
+            mu = np.log(p['media']) - sigma ** 2 / 2
+            cuantiles[(None, franja)] = np.exp(mu + sigma * _normal_inversa(probabilidades))
+            # Retraso: 0 con probabilidad 1 - p_retraso, exponencial en el resto
+            exceso = np.clip((probabilidades - (1 - p['p_retraso'])) / p['p_retraso'], 0, 1 - 1e-9)
+            retrasos[(None, franja)] = -p['retraso_medio'] * np.log1p(-exceso)
+        return cls(cuantiles, franja_hora, retrasos)
+
+    @classmethod
+    def desde_observaciones(cls, observaciones, franja_hora, min_observaciones=30,
+                            n_cuantiles=N_CUANTILES):
+        """
+        Cuantiles empíricos del factor tiempo / tiempo_base de 'observaciones'
+        (DataFrame con tramo, hora (0-23 o 0-167), tiempo y tiempo_base). Los
+        tramos con menos de min_observaciones en una franja usan la distribución
+        de la franja con todos los tramos.
+        """
+        franja_hora = list(franja_hora)
+        probabilidades = _probabilidades(n_cuantiles)
+        df = observaciones.assign(
+            factor=observaciones['tiempo'] / observaciones['tiempo_base'],
+            franja=[franja_hora[int(h) % len(franja_hora)] for h in observaciones['hora']])
+        cuantiles = {}
+        for franja, grupo in df.groupby('franja'):
+            cuantiles[(None, franja)] = np.quantile(grupo['factor'], probabilidades)
+            for tramo, datos in grupo.groupby('tramo'):
+                if len(datos) >= min_observaciones:
+                    cuantiles[(tramo, franja)] = np.quantile(datos['factor'], probabilidades)
+        return cls(cuantiles, franja_hora)
+
+    def _tramos(self, ruta):
+        """Por tramo de 'ruta': fila de su distribución para cada hora del periodo, tiempo base y desfase desde la salida."""
+        clave = id(ruta)
+        if clave not in self._cache_rutas:
+            tramos = []
+            desfase = 0.0
+            for p in ruta:
+                filas = [self._fila.get((p['nombre'], franja), self._fila[(None, franja)])
+                         for franja in self.franja_hora]
+                tramos.append((filas, p['tiempo_hasta_siguiente'], desfase))
+                desfase += p['tiempo_hasta_siguiente']
+            # Se guarda la ruta para que su id no se reutilice mientras exista la entrada
+            self._cache_rutas[clave] = (ruta, tramos)
+        return self._cache_rutas[clave][1]
+
+    def muestrear(self, rng, ruta, hora_salida):
+        """
+        Tiempos de viaje (s) de todos los tramos de 'ruta' para un bus que sale
+        a hora_salida, sorteados de una vez con rng (numpy Generator o np.random).
+        Cada tramo usa la franja de su hora programada de inicio.
+        """
+        tramos = self._tramos(ruta)
+        u = rng.random(2 * len(tramos)).tolist()
+        periodo = len(self.franja_hora)
+        tiempos = []
+        for k, (filas, tiempo_base, desfase) in enumerate(tramos):
+            fila = filas[int((hora_salida + desfase) // 3600) % periodo]
+            tiempos.append(tiempo_base * _inversa(self._factores_lista[fila], u[2*k])
+                           + _inversa(self._retrasos_lista[fila], u[2*k + 1]))
+        return tiempos
+
+    def resumen(self):
+        """Media y percentiles 50/95 del factor y media del retraso por (tramo, franja)."""
+        filas = []
+        for (tramo, franja), i in self._fila.items():
+            factores = self._factores[i]
+            filas.append({'tramo': tramo if tramo is not None else '(todos)', 'franja': franja,
+                          'factor_medio': factores.mean(), 'factor_p50': np.median(factores),
+                          'factor_p95': np.quantile(factores, 0.95),
+                          'retraso_medio_s': self._retrasos[i].mean()})
+        return pd.DataFrame(filas)
+
+
+def _inversa(cuantiles, u):
+    """Inversa de la distribución en u: interpolación lineal en la grilla de cuantiles."""
+    # Las rutas tienen pocos tramos: la aritmética escalar es más rápida que NumPy
+    posicion = u * (len(cuantiles) - 1)
+    indice = min(int(posicion), len(cuantiles) - 2)
+    return cuantiles[indice] + (cuantiles[indice + 1] - cuantiles[indice]) * (posicion - indice)
+
+
+def _probabilidades(n):
+    # Sin los extremos 0 y 1 (cuantiles infinitos en la lognormal y la exponencial)
+    return (np.arange(n) + 0.5) / n
+
+
+def _normal_inversa(p):
+    normal = NormalDist()
+    return np.array([normal.inv_cdf(x) for x in p])